@@ -127,6 +127,44 @@ LOGIN_REDIRECT_URL = '/'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Cache backend: 'locmem' (per process, the default), 'file' (CACHE_LOCATION is a directory shared by all processes)
+# or 'redis' (CACHE_LOCATION is a redis:// URL, needs the redis package).
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', BASE_DIR / '.django_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379'),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')]
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_DEFAULT_LOCATION),
+    }
+}
+
+# Seconds the home page counters are cached for; they are also dropped whenever a counted model changes.
+CATALOG_STATS_TTL = 60
+# Seconds a rendered detail page is kept; a new one is rendered whenever the object or anything it shows changes.
+DETAIL_CACHE_TTL = int(os.environ.get('DETAIL_CACHE_TTL', 24 * 60 * 60))
+
+# IMDb scraper: size of the fetch thread pool and how many requests may be open against one host at a time.
+SCRAPER_MAX_WORKERS = int(os.environ.get('SCRAPER_MAX_WORKERS', 8))
+SCRAPER_PER_HOST_LIMIT = int(os.environ.get('SCRAPER_PER_HOST_LIMIT', 4))
+# (connect, read) timeouts in seconds, retries with exponential backoff on errors/429/5xx and requests per second.
+SCRAPER_TIMEOUT = (5, 20)
+SCRAPER_RETRIES = int(os.environ.get('SCRAPER_RETRIES', 3))
+SCRAPER_BACKOFF = float(os.environ.get('SCRAPER_BACKOFF', 0.5))
+SCRAPER_RATE_LIMIT = float(os.environ.get('SCRAPER_RATE_LIMIT', 5))
+# Downloaded pages are kept on disk and revalidated after SCRAPER_CACHE_TTL seconds. An empty directory disables the
+# cache, SCRAPER_OFFLINE serves pages from the cache only.
+SCRAPER_CACHE_DIR = os.environ.get('SCRAPER_CACHE_DIR', BASE_DIR / '.scraper_cache')
+SCRAPER_CACHE_TTL = int(os.environ.get('SCRAPER_CACHE_TTL', 24 * 60 * 60))
+SCRAPER_CACHE_MAX_SIZE = int(os.environ.get('SCRAPER_CACHE_MAX_SIZE', 256 * 1024 * 1024))
+SCRAPER_OFFLINE = os.environ.get('SCRAPER_OFFLINE', '') == 'True'
+# Seconds a running scrape job may go without progress before its worker is presumed dead and the job is claimed
+# again by another worker.
+SCRAPE_JOB_TIMEOUT = int(os.environ.get('SCRAPE_JOB_TIMEOUT', 10 * 60))
+
 # Heroku: Update database configuration from $DATABASE_URL.
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.utils import timezone
 
+from . import loans
 from .models import Author, Genre, Book, BookInstance, Language, Director, Actor, Movie, Series, MovieSeriesGenre
-from .models import GameGenre, GameMode, Developer, Game, Profile
+from .models import GameGenre, GameMode, Developer, Game, Profile, ScrapeJob
 
 # admin.site.register(Author, AuthorAdmin)
 # admin.site.register(Book)
@@ -60,10 +63,18 @@ class BookAdmin(admin.ModelAdmin):
 admin.site.register(Book, BookAdmin)
 
 
+class BookInstanceChangeList(ChangeList):
+    """Change list loading only the columns of ``list_display``, with the book and borrower joined."""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_listing()
+
+
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
     list_filter = ('status', 'due_back')
+    actions = ('renew', 'mark_returned', 'send_to_maintenance')
 
     fieldsets = (
         (None, {
@@ -73,3 +84,40 @@ class BookInstanceAdmin(admin.ModelAdmin):
             'fields': ('status', 'due_back', 'borrower')
         }),
     )
+
+    def _apply(self, request, queryset, action, renewal_date=None):
+        changed = loans.apply(queryset, action, renewal_date)
+        self.message_user(request, f'{changed} cop{"y" if changed == 1 else "ies"} updated.')
+
+    @admin.action(description=f'Renew selected loans for {loans.RENEWAL_WEEKS} weeks',
+                  permissions=['mark_returned'])
+    def renew(self, request, queryset):
+        self._apply(request, queryset, 'renew', loans.default_renewal_date())
+
+    @admin.action(description='Mark selected copies returned', permissions=['mark_returned'])
+    def mark_returned(self, request, queryset):
+        self._apply(request, queryset, 'return')
+
+    @admin.action(description='Send selected copies to maintenance', permissions=['mark_returned'])
+    def send_to_maintenance(self, request, queryset):
+        self._apply(request, queryset, 'maintenance')
+
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm('polls.can_mark_returned')
+
+    def get_changelist(self, request, **kwargs):
+        return BookInstanceChangeList
+
+
+@admin.register(ScrapeJob)
+class ScrapeJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'requested_by', 'created_at', 'titles_done', 'titles_failed', 'titles_created')
+    list_filter = ('status',)
+    actions = ('cancel',)
+
+    @admin.action(description='Cancel selected queued or running jobs')
+    def cancel(self, request, queryset):
+        # A worker still running one of them drops its result, see run_job.
+        cancelled = queryset.filter(status__in=('q', 'r')).update(
+            status='f', worker='', error=f'Cancelled by {request.user}', finished_at=timezone.now())
+        self.message_user(request, f'{cancelled} job{"" if cancelled == 1 else "s"} cancelled.')
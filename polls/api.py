@@ -0,0 +1,125 @@
+"""Read-only JSON API over the catalogue.
+
+Rows are read with ``values()``, so no model instances are built, and pages
+are selected on the primary key with the cursors of ``polls.pagination``.
+Many-to-many relations asked for in ``?fields=`` are embedded with one query
+on the through table per relation and page, however many rows the page holds.
+Related people waiting for moderation are left out, as they are everywhere.
+Full exports walk the table in keyset batches and are streamed, so memory use
+does not grow with the table.
+"""
+from collections import defaultdict, namedtuple
+
+from django.core.exceptions import BadRequest, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404
+
+from .models import Book, BookInstance, Author, Movie, Series, Actor, Director, Game, Developer
+from .pagination import encode_cursor, decode_cursor
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+
+# model, columns, {many-to-many field: column of the related model embedded next to its id},
+# whether only verified rows are public
+Resource = namedtuple('Resource', 'model fields relations verified_only')
+
+RESOURCES = {
+    'books': Resource(Book, ('id', 'title', 'author', 'summary', 'isbn', 'language', 'updated_at'),
+                      {'genre': 'name'}, False),
+    'bookinstances': Resource(BookInstance, ('id', 'book', 'imprint', 'status', 'due_back'), {}, False),
+    'authors': Resource(Author, ('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death', 'updated_at'),
+                        {}, False),
+    'movies': Resource(Movie, ('id', 'title', 'imdb_id', 'date_of_release', 'running_time', 'summary', 'updated_at'),
+                       {'director': 'full_name', 'actors': 'full_name', 'genre': 'name', 'language': 'name'}, True),
+    'series': Resource(Series, ('id', 'title', 'imdb_id', 'date_of_release', 'number_of_seasons', 'summary',
+                                'updated_at'),
+                       {'director': 'full_name', 'actors': 'full_name', 'genre': 'name', 'language': 'name'}, True),
+    'actors': Resource(Actor, ('id', 'full_name', 'imdb_id', 'specialisation', 'date_of_birth', 'date_of_death',
+                               'updated_at'), {}, True),
+    'directors': Resource(Director, ('id', 'full_name', 'imdb_id', 'amount_of_films', 'date_of_birth',
+                                     'date_of_death', 'updated_at'), {}, True),
+    'games': Resource(Game, ('id', 'title', 'developer', 'date_of_release', 'summary', 'updated_at'),
+                      {'genre': 'name', 'mode': 'name'}, True),
+    'developers': Resource(Developer, ('id', 'company_name', 'date_of_foundation', 'updated_at'), {}, False),
+}
+
+
+def selected_fields(resource, fields=None):
+    """Split ``?fields=`` into columns and relations; the id is always included."""
+    if not fields:
+        return resource.fields, list(resource.relations)
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in resource.fields and name not in resource.relations]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    columns = ['id'] + [name for name in names if name in resource.fields and name != 'id']
+    return columns, [name for name in names if name in resource.relations]
+
+
+def queryset(resource):
+    manager = resource.model.objects
+    return (manager.verified() if resource.verified_only else manager.all()).order_by('pk')
+
+
+def _moderated(model):
+    return any(field.name == 'Verified' for field in model._meta.fields)
+
+
+def embed(resource, rows, relations):
+    """Add the related ``[{"id": ..., <column>: ...}]`` of every relation to ``rows``, one query each."""
+    pks = [row['id'] for row in rows]
+    for name in relations:
+        field = resource.model._meta.get_field(name)
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        column = resource.relations[name]
+        related = defaultdict(list)
+        links = field.remote_field.through.objects.filter(**{f'{source}__in': pks})
+        if _moderated(field.related_model):
+            links = links.filter(**{f'{target}__Verified': True})
+        links = (links.order_by(f'{target}__{column}', target)
+                 .values_list(f'{source}_id', f'{target}_id', f'{target}__{column}'))
+        for pk, related_pk, value in links:
+            related[pk].append({'id': related_pk, column: value})
+        for row in rows:
+            row[name] = related[row['id']]
+    return rows
+
+
+def page(resource, columns, relations, cursor=None, size=API_PAGE_SIZE):
+    """(rows, cursor of the next page or None) of the page after ``cursor``."""
+    rows = queryset(resource)
+    if cursor:
+        direction, values = decode_cursor(cursor)
+        if direction != 'next' or len(values) != 1 or values[0] is None:
+            raise Http404('Invalid cursor')
+        try:
+            last = resource.model._meta.pk.to_python(values[0])
+        except ValidationError:
+            raise Http404('Invalid cursor')
+        rows = rows.filter(pk__gt=last)
+    # One row more than asked for tells whether there is a next page.
+    rows = list(rows.values(*columns)[:size + 1])
+    next_cursor = encode_cursor('next', [rows[size - 1]['id']]) if len(rows) > size else None
+    return embed(resource, rows[:size], relations), next_cursor
+
+
+def export(resource, columns, relations, batch_size=EXPORT_BATCH_SIZE):
+    """Every public row as chunks of one JSON array, read ``batch_size`` rows at a time."""
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    yield '['
+    last = None
+    separator = ''
+    while True:
+        rows = queryset(resource)
+        if last is not None:
+            rows = rows.filter(pk__gt=last)
+        rows = embed(resource, list(rows.values(*columns)[:batch_size]), relations)
+        if rows:
+            yield separator + ','.join(encoder.encode(row) for row in rows)
+            separator = ','
+            last = rows[-1]['id']
+        if len(rows) < batch_size:
+            break
+    yield ']'
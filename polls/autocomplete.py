@@ -0,0 +1,57 @@
+"""Prefix search behind the autocomplete form widgets.
+
+Every lookup is a case-insensitive ``istartswith`` on one column, backed by an
+index that migration 0008 creates for the backend in use: ``COLLATE NOCASE``
+on SQLite, ``UPPER(column) text_pattern_ops`` on PostgreSQL. Those are the
+forms the planners need to turn the ``LIKE 'prefix%'`` into a range scan.
+
+No single ``Meta.indexes`` entry can express both, so the indexes are raw SQL
+the migration state does not know about, and SQLite drops them whenever a
+migration rebuilds one of these tables. ``polls.signals`` creates any that are
+missing after every ``migrate``.
+"""
+from .models import VerifiedQuerySet, Actor, Director, Language, MovieSeriesGenre, Developer, GameGenre, GameMode, Author, Genre
+
+AUTOCOMPLETE_LIMIT = 20
+
+# kind used in the URL: (model, column searched and sorted on)
+AUTOCOMPLETE = {
+    'actor': (Actor, 'full_name'),
+    'director': (Director, 'full_name'),
+    'language': (Language, 'name'),
+    'movie-genre': (MovieSeriesGenre, 'name'),
+    'developer': (Developer, 'company_name'),
+    'game-genre': (GameGenre, 'name'),
+    'game-mode': (GameMode, 'name'),
+    'author': (Author, 'last_name'),
+    'book-genre': (Genre, 'name'),
+}
+
+
+def prefix_index_name(model, field):
+    return f'{model._meta.db_table}_{field}_prefix_idx'
+
+
+def prefix_index_sql(vendor, model, field):
+    """CREATE INDEX statement that lets ``istartswith`` on ``field`` use an index, or None."""
+    table = model._meta.db_table
+    column = model._meta.get_field(field).column
+    name = prefix_index_name(model, field)
+    if vendor == 'sqlite':
+        return f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ("{column}" COLLATE NOCASE)'
+    if vendor == 'postgresql':
+        # Matches UPPER("column"::text) LIKE UPPER(%s), which is what istartswith compiles to.
+        return f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ((UPPER("{column}"::text)) text_pattern_ops)'
+    return None
+
+
+def lookup(kind, term, verified_only=True):
+    """Up to ``AUTOCOMPLETE_LIMIT`` objects of ``kind`` whose column starts with ``term``.
+
+    Of a moderated model only the verified objects are offered, unless ``verified_only`` is False.
+    """
+    model, field = AUTOCOMPLETE[kind]
+    queryset = model.objects.all()
+    if verified_only and isinstance(queryset, VerifiedQuerySet):
+        queryset = queryset.verified()
+    return queryset.filter(**{f'{field}__istartswith': term}).order_by(field, 'pk')[:AUTOCOMPLETE_LIMIT]
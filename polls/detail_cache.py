@@ -0,0 +1,113 @@
+"""Cached rendering of the catalogue detail pages.
+
+The part of a detail page that describes the object is rendered once and
+cached under the object's model, pk and ``updated_at``. ``updated_at`` is moved
+whenever the object, or anything the page shows about related objects, is
+saved, deleted or re-linked; see ``polls.signals``. Controls that depend on the
+user are rendered outside the cached fragment.
+
+The key is read from the database, with the same query ``polls.conditional``
+builds the ETag from, so a change made by another web worker or a management
+command is seen by every process at once, and the body and the ETag of a page
+always agree. Fragments of older versions are left to expire.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .models import Book, BookInstance, Author, Genre, Language, Game, Developer, GameGenre, GameMode
+from .models import Movie, Series, Actor, Director, MovieSeriesGenre
+
+PAGE_MODELS = {Movie, Series, Actor, Director, Game, Developer, Book, Author}
+
+# model: [(page model, lookup from the page model to it)], the pages that show a model's rows.
+SHOWN_IN = {
+    Actor: [(Movie, 'actors'), (Series, 'actors')],
+    Director: [(Movie, 'director'), (Series, 'director')],
+    Language: [(Movie, 'language'), (Series, 'language'), (Book, 'language')],
+    MovieSeriesGenre: [(Movie, 'genre'), (Series, 'genre')],
+    Genre: [(Book, 'genre')],
+    GameGenre: [(Game, 'genre')],
+    GameMode: [(Game, 'mode')],
+    Game: [(Developer, 'game')],
+    Developer: [(Game, 'developer')],
+    Book: [(Author, 'book')],
+    Author: [(Book, 'author')],
+    BookInstance: [(Book, 'bookinstance'), (Author, 'book__bookinstance')],
+}
+TRACKED_MODELS = PAGE_MODELS | set(SHOWN_IN)
+
+
+def fragment_key(model, pk, updated_at):
+    return f'polls:detail:{model._meta.label_lower}:{pk}:{updated_at.timestamp():.6f}'
+
+
+def touch(pages):
+    """Set ``updated_at`` of every (model, pk) page in ``pages`` to now, one UPDATE per model."""
+    by_model = defaultdict(list)
+    for model, pk in pages:
+        by_model[model].append(pk)
+    now = timezone.now()
+    for model, pks in by_model.items():
+        model.objects.filter(pk__in=pks).update(updated_at=now)
+
+
+def pages_showing(instance):
+    """(model, pk) of every detail page that shows ``instance``, including its own."""
+    model = type(instance)
+    pages = {(model, instance.pk)} if model in PAGE_MODELS else set()
+    for page_model, lookup in SHOWN_IN.get(model, ()):
+        pks = page_model.objects.filter(**{lookup: instance.pk}).values_list('pk', flat=True)
+        pages.update((page_model, pk) for pk in pks)
+    return pages
+
+
+def linked_pages(through, instance, model, pk_set=None):
+    """Pages on both sides of a many-to-many change between ``instance`` and ``model`` rows ``pk_set``.
+
+    Without ``pk_set`` (the relation is being cleared) the rows currently linked are looked up.
+    """
+    pages = {(type(instance), instance.pk)} if type(instance) in PAGE_MODELS else set()
+    if model in PAGE_MODELS:
+        if pk_set is None:
+            source, target = [field for field in through._meta.fields if field.is_relation]
+            if source.related_model is not type(instance):
+                source, target = target, source
+            pk_set = through.objects.filter(**{source.attname: instance.pk}).values_list(target.attname, flat=True)
+        pages.update((model, pk) for pk in pk_set)
+    return pages
+
+
+class CachedDetailMixin:
+    """``DetailView`` that takes the object part of the page from ``fragment_template_name``, cached per version.
+
+    Used with ``ConditionalGetMixin``, whose ``get_updated_at()`` gives the version: a cache hit costs that
+    one query, which the ETag is built from too. The object is then only loaded if ``needs_object()``, by
+    default for the superuser controls.
+    """
+    fragment_template_name = None
+
+    def needs_object(self):
+        return self.request.user.is_superuser
+
+    def get(self, request, *args, **kwargs):
+        updated_at = self.get_updated_at()
+        if updated_at is None:
+            raise Http404(f'No {self.model._meta.verbose_name} found matching the query')
+        key = fragment_key(self.model, self.kwargs[self.pk_url_kwarg], updated_at)
+        fragment = cache.get(key)
+        self.object = None
+        if fragment is None:
+            self.object = self.get_object()
+            name = self.get_context_object_name(self.object)
+            fragment = render_to_string(self.fragment_template_name, {'object': self.object, name: self.object})
+            cache.set(key, fragment, settings.DETAIL_CACHE_TTL)
+        elif self.needs_object():
+            self.object = self.get_object()
+        context = self.get_context_data(object=self.object, detail=mark_safe(fragment))
+        return self.render_to_response(context)
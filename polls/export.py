@@ -0,0 +1,93 @@
+"""Streaming export of the catalogue tables as CSV or JSON Lines.
+
+Every model table and every many-to-many link table can be exported. Rows
+are read with ``values_list().iterator()``, which uses a server-side cursor on
+PostgreSQL, encoded a chunk at a time and optionally gzipped on the fly, so
+the memory used does not depend on the size of the table. Used by the
+``exportcatalog`` command and the ``export`` view.
+"""
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Book, BookInstance, Genre, Language, Game, GameGenre, GameMode
+from .models import Movie, Series, Actor, Director, MovieSeriesGenre
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+
+EXPORTED_MODELS = (
+    ('movies', Movie), ('series', Series), ('actors', Actor), ('directors', Director),
+    ('games', Game), ('books', Book), ('bookinstances', BookInstance),
+    # The rows the links point to.
+    ('languages', Language), ('movie-genres', MovieSeriesGenre), ('book-genres', Genre),
+    ('game-genres', GameGenre), ('game-modes', GameMode),
+)
+
+
+def _tables():
+    tables = {}
+    for name, model in EXPORTED_MODELS:
+        tables[name] = (model, [field.attname for field in model._meta.concrete_fields])
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            tables[f'{name}-{field.name}'] = (through, [field.m2m_column_name(), field.m2m_reverse_name()])
+    return tables
+
+
+# name: (model or through model, columns)
+TABLES = _tables()
+
+
+class _Echo:
+    """File-like object for ``csv.writer`` that returns each line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def rows(table, chunk_size=EXPORT_CHUNK_SIZE):
+    model, columns = TABLES[table]
+    return model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def lines(table, format='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """The encoded table, as strings of up to ``chunk_size`` lines each."""
+    columns = TABLES[table][1]
+    if format == 'csv':
+        writer = csv.writer(_Echo())
+        encode = writer.writerow
+        yield encode(columns)
+    else:
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+        def encode(row):
+            return encoder.encode(dict(zip(columns, row))) + '\n'
+    chunk = []
+    for row in rows(table, chunk_size):
+        chunk.append(encode(row))
+        if len(chunk) == chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(table, format='csv', compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """The export of ``table`` as bytes."""
+    chunks = (chunk.encode() for chunk in lines(table, format, chunk_size))
+    return gzipped(chunks) if compress else chunks
+
+
+def filename(table, format='csv', compress=False):
+    return f'{table}.{format}' + ('.gz' if compress else '')
@@ -1,18 +1,56 @@
 from .models import Game
 import datetime  # for checking renewal date range.
+import uuid
 
 from django import forms
 from django.contrib.auth.forms import UserChangeForm, PasswordChangeForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
-from .models import Game, Profile
-from .models import Movie, Series, Actor, Director
+from . import loans
+from .models import Game, Profile, Book, BookInstance
+from .models import Movie, Series, Actor, Director, ScrapeJob
 
 class DateInput(forms.DateInput):
     input_type = 'date'
 
+
+class AutocompleteMixin:
+    """Render only the selected options, the rest are found through the ``autocomplete`` view as you type."""
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse('autocomplete', args=[self.kind])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        try:
+            selected = list(self.choices.queryset.filter(pk__in=[pk for pk in value if pk]))
+        except (ValueError, ValidationError):
+            selected = []
+        options = [self.create_option(name, *self.choices.choice(obj), True, index)
+                   for index, obj in enumerate(selected)]
+        if not self.allow_multiple_selected:
+            options.insert(0, self.create_option(name, '', self.choices.field.empty_label or '', not selected, 0))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
+
 class EditUserForm(UserChangeForm):
     email = forms.EmailField(widget=forms.EmailInput(attrs={'class': 'form-control'}))
     first_name = forms.CharField(max_length=100, widget=forms.TextInput(attrs={'class': 'form-control'}))
@@ -53,14 +91,44 @@ class GameForm(forms.ModelForm):
         # fields = ('title','developer','date_of_release')
 
         widgets = {'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'tytul'}),
-                   'developer': forms.Select(attrs={'class': 'form-control'}),
+                   'developer': AutocompleteSelect('developer', attrs={'class': 'form-control'}),
                    'date_of_release': DateInput(),
-                   'genre': forms.SelectMultiple(attrs={'class': 'form-control'}),
-                   'mode': forms.SelectMultiple(attrs={'class': 'form-control'}),
+                   'genre': AutocompleteSelectMultiple('game-genre', attrs={'class': 'form-control'}),
+                   'mode': AutocompleteSelectMultiple('game-mode', attrs={'class': 'form-control'}),
                    'summary': forms.Textarea(attrs={'class': 'form-control'}),
                    }
 
 
+class GameUpdateForm(GameForm):
+    class Meta(GameForm.Meta):
+        fields = GameForm.Meta.fields + ('Verified',)
+
+
+class BookForm(forms.ModelForm):
+    class Meta:
+        model = Book
+        fields = ('title', 'author', 'summary', 'isbn', 'genre', 'language')
+        widgets = {
+            'author': AutocompleteSelect('author'),
+            'genre': AutocompleteSelectMultiple('book-genre'),
+            'language': AutocompleteSelect('language'),
+        }
+
+
+# Copies one loan desk form may change, their ids all go into one IN (...) clause.
+LOAN_DESK_MAX_COPIES = 500
+
+
+def validate_renewal_date(data):
+    # Check date is not in past.
+    if data < datetime.date.today():
+        raise ValidationError(_('Invalid date - renewal in past'))
+    # Check date is in range librarian allowed to change (+4 weeks)
+    if data > datetime.date.today() + datetime.timedelta(weeks=loans.MAX_RENEWAL_WEEKS):
+        raise ValidationError(
+            _('Invalid date - renewal more than 4 weeks ahead'))
+
+
 class RenewBookForm(forms.Form):
     """Form for a librarian to renew books."""
     renewal_date = forms.DateField(
@@ -68,19 +136,55 @@ class RenewBookForm(forms.Form):
 
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
-
-        # Check date is not in past.
-        if data < datetime.date.today():
-            raise ValidationError(_('Invalid date - renewal in past'))
-        # Check date is in range librarian allowed to change (+4 weeks)
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
-            raise ValidationError(
-                _('Invalid date - renewal more than 4 weeks ahead'))
+        validate_renewal_date(data)
 
         # Remember to always return the cleaned data.
         return data
 
 
+class LoanDeskForm(forms.Form):
+    """Form for a librarian to renew, return or send to maintenance many copies at once."""
+    copies = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 10}),
+        help_text="Enter or scan the ids of the copies, one per line.")
+    action = forms.ChoiceField(choices=loans.LOAN_ACTIONS)
+    renewal_date = forms.DateField(
+        required=False, widget=DateInput,
+        help_text="Only for renewals. Enter a date between now and 4 weeks (default 3).")
+
+    def clean_copies(self):
+        ids = []
+        invalid = []
+        for value in self.cleaned_data['copies'].replace(',', ' ').split():
+            try:
+                ids.append(uuid.UUID(value))
+            except ValueError:
+                invalid.append(value)
+        if invalid:
+            raise ValidationError(_('Not a copy id: %(ids)s'), params={'ids': ', '.join(invalid)})
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > LOAN_DESK_MAX_COPIES:
+            raise ValidationError(_('At most %(max)d copies at a time'), params={'max': LOAN_DESK_MAX_COPIES})
+        known = set(BookInstance.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        unknown = [str(pk) for pk in ids if pk not in known]
+        if unknown:
+            raise ValidationError(_('No such copy: %(ids)s'), params={'ids': ', '.join(unknown)})
+        return ids
+
+    def clean_renewal_date(self):
+        data = self.cleaned_data['renewal_date']
+        if data is not None:
+            validate_renewal_date(data)
+        return data
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == 'renew' and not cleaned_data.get('renewal_date') \
+                and 'renewal_date' not in self.errors:
+            self.add_error('renewal_date', _('A renewal needs a date'))
+        return cleaned_data
+
+
 class PasswordChangingForm(PasswordChangeForm):
     old_password = forms.CharField(widget=forms.PasswordInput(attrs={'class': 'form-control', 'type': 'password'}))
     new_password1 = forms.CharField(max_length=100,
@@ -100,11 +204,11 @@ class MovieForm(forms.ModelForm):
         fields = ('title', 'actors', 'director', 'date_of_release', 'language', 'genre', 'running_time', 'summary')
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'title'}),
-            'actors': forms.SelectMultiple(attrs={'class': 'form-control'}),
-            'director': forms.SelectMultiple(attrs={'class': 'form-control'}),
+            'actors': AutocompleteSelectMultiple('actor', attrs={'class': 'form-control'}),
+            'director': AutocompleteSelectMultiple('director', attrs={'class': 'form-control'}),
             'date_of_release': DateInput(),
-            'language': forms.SelectMultiple(attrs={'class': 'form-control'}),
-            'genre': forms.SelectMultiple(attrs={'class': 'form-control'}),
+            'language': AutocompleteSelectMultiple('language', attrs={'class': 'form-control'}),
+            'genre': AutocompleteSelectMultiple('movie-genre', attrs={'class': 'form-control'}),
             'running_time': forms.NumberInput(
                 attrs={'class': 'form-control', 'placeholder': 'Movie length in minutes'}),
             'summary': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Description'}),
@@ -119,11 +223,11 @@ class SeriesForm(forms.ModelForm):
         fields = ('title', 'actors', 'director', 'date_of_release', 'language', 'genre', 'number_of_seasons', 'summary')
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'title'}),
-            'actors': forms.SelectMultiple(attrs={'class': 'form-control'}),
-            'director': forms.SelectMultiple(attrs={'class': 'form-control'}),
+            'actors': AutocompleteSelectMultiple('actor', attrs={'class': 'form-control'}),
+            'director': AutocompleteSelectMultiple('director', attrs={'class': 'form-control'}),
             'date_of_release': DateInput(),
-            'language': forms.SelectMultiple(attrs={'class': 'form-control'}),
-            'genre': forms.SelectMultiple(attrs={'class': 'form-control'}),
+            'language': AutocompleteSelectMultiple('language', attrs={'class': 'form-control'}),
+            'genre': AutocompleteSelectMultiple('movie-genre', attrs={'class': 'form-control'}),
             'number_of_seasons': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'number of seasons'}),
             'summary': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Description'}),
         }
@@ -157,3 +261,12 @@ class DirectorForm(forms.ModelForm):
             'date_of_death': DateInput(),
             'amount_of_films': forms.NumberInput(attrs={'class': 'form-control'}),
         }
+
+
+class ScrapeJobForm(forms.ModelForm):
+    class Meta:
+        model = ScrapeJob
+        fields = ('limit',)
+        widgets = {
+            'limit': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'all 250 titles', 'min': 1}),
+        }
@@ -0,0 +1,213 @@
+"""Bulk import of movies, series, actors and directors from CSV or JSON Lines.
+
+Files are read one record at a time and stored in batches, each in its own
+transaction. The records of a batch are validated against the model fields,
+every name they mention is turned into a pk by the scraper's
+``EntityResolver`` (one ``__in`` query per model, missing rows inserted with
+``bulk_create``), and the new rows and their many-to-many links are inserted
+with ``bulk_create``. Records that are already stored, by IMDb id or else by
+name, are skipped. If a batch fails the ones before it stay committed and the
+import can be resumed from its first record.
+"""
+import csv
+import gzip
+import json
+from contextlib import nullcontext
+from itertools import islice
+from time import time
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import search
+from .models import Movie, Series, Actor, Director, Language, MovieSeriesGenre
+from .scraper.resolver import EntityResolver
+from .stats import invalidate_catalog_stats
+
+IMPORT_BATCH_SIZE = 1000
+# Separates the names in a list column of a CSV file, e.g. "English|French".
+LIST_SEPARATOR = '|'
+
+# kind: (model, column records without an IMDb id are matched on, columns read)
+IMPORTED = {
+    'movie': (Movie, 'title', ('title', 'imdb_id', 'date_of_release', 'running_time', 'summary')),
+    'series': (Series, 'title', ('title', 'imdb_id', 'date_of_release', 'number_of_seasons', 'summary')),
+    'actor': (Actor, 'full_name', ('full_name', 'imdb_id', 'specialisation', 'date_of_birth', 'date_of_death')),
+    'director': (Director, 'full_name',
+                 ('full_name', 'imdb_id', 'amount_of_films', 'date_of_birth', 'date_of_death')),
+}
+# list column of a movie or series: (many-to-many field, model of the names, column the names are matched on)
+TITLE_LINKS = {
+    'languages': ('language', Language, 'name'),
+    'genres': ('genre', MovieSeriesGenre, 'name'),
+    'directors': ('director', Director, 'full_name'),
+    'actors': ('actors', Actor, 'full_name'),
+}
+
+
+def read_records(path, format=None):
+    """The records of a .csv or .jsonl file, which may be gzipped, one at a time.
+
+    CSV records are dicts. JSON Lines records are left as text, so a malformed
+    line is reported by validation like any other bad record.
+    """
+    name = path[:-len('.gz')] if path.endswith('.gz') else path
+    format = format or name.rsplit('.', 1)[-1]
+    if format not in ('csv', 'jsonl'):
+        raise ValueError(f'Unknown format {format!r}, expected csv or jsonl')
+    return _read(path, format)
+
+
+def _read(path, format):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as file:
+        if format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            yield from (line for line in file if line.strip())
+
+
+class ImportResult:
+    """Outcome of one import run, records are numbered from 0 in file order."""
+
+    def __init__(self, start=0):
+        self.start = start
+        self.read = 0
+        self.created = 0
+        self.skipped = 0
+        # (record number, message)
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def next_start(self):
+        """First record not stored yet, where a resumed import starts."""
+        return self.start + self.read
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+class CatalogImporter:
+    """Stores records of one ``kind`` of ``IMPORTED`` with a fixed number of queries per batch."""
+
+    def __init__(self, kind, verified=False, batch_size=IMPORT_BATCH_SIZE):
+        self.model, self.name_field, self.columns = IMPORTED[kind]
+        self.verified = verified
+        self.batch_size = batch_size
+        self.resolver = EntityResolver()
+        # The run in progress, or the last one.
+        self.result = None
+
+    def run(self, records, start=0, dry_run=False, progress=None):
+        """Import ``records`` from number ``start`` on. A dry run validates and stores everything, then rolls back."""
+        result = self.result = ImportResult(start)
+        began = time()
+        records = islice(records, start, None)
+        with transaction.atomic() if dry_run else nullcontext():
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.store(batch, result.next_start, result)
+                result.read += len(batch)
+                result.elapsed = time() - began
+                if progress:
+                    progress(result)
+            if dry_run:
+                transaction.set_rollback(True)
+        if result.created and not dry_run:
+            # bulk_create sends no post_save signals.
+            invalidate_catalog_stats()
+        result.elapsed = time() - began
+        return result
+
+    def clean(self, record):
+        """(unsaved instance, {list column: names}) of one record, or ValidationError."""
+        if isinstance(record, str):
+            try:
+                record = json.loads(record)
+            except ValueError as error:
+                raise ValidationError(f'Invalid JSON: {error}')
+            if not isinstance(record, dict):
+                raise ValidationError('Expected a JSON object')
+        values = {}
+        errors = []
+        for name in self.columns:
+            field = self.model._meta.get_field(name)
+            value = record.get(name)
+            if value in (None, ''):
+                value = field.get_default() if field.has_default() else (None if field.null else '')
+            try:
+                values[name] = field.clean(value, None)
+            except ValidationError as error:
+                errors.extend(f'{name}: {message}' for message in error.messages)
+        links = {}
+        if self.model in (Movie, Series):
+            for column, (_, model, field) in TITLE_LINKS.items():
+                names = record.get(column) or []
+                if isinstance(names, str):
+                    names = names.split(LIST_SEPARATOR)
+                links[column] = [str(name).strip() for name in names if str(name).strip()]
+                max_length = model._meta.get_field(field).max_length
+                errors.extend(f'{column}: {name!r} is longer than {max_length} characters'
+                              for name in links[column] if len(name) > max_length)
+        if errors:
+            raise ValidationError(errors)
+        return self.model(Verified=self.verified, **values), links
+
+    def store(self, batch, first, result):
+        rows = {}
+        for number, record in enumerate(batch, first):
+            try:
+                instance, links = self.clean(record)
+            except ValidationError as error:
+                result.errors.append((number, '; '.join(error.messages)))
+                continue
+            field = 'imdb_id' if instance.imdb_id else self.name_field
+            if (field, getattr(instance, field)) in rows:
+                result.skipped += 1
+            else:
+                rows[field, getattr(instance, field)] = instance, links
+
+        created = []
+        for field in ('imdb_id', self.name_field):
+            keys = [key for key_field, key in rows if key_field == field]
+            if not keys:
+                continue
+            known = self.resolver.known(self.model, keys, field)
+            pks = self.resolver.resolve(self.model, keys, field, build=lambda key, field=field: rows[field, key][0])
+            for key in keys:
+                if key not in known:
+                    instance = rows[field, key][0]
+                    instance.pk = pks[key]
+                    created.append((instance, rows[field, key][1]))
+        result.created += len(created)
+        result.skipped += len(rows) - len(created)
+        search.index_objects(self.model, [instance for instance, _ in created])
+        if created and self.model in (Movie, Series):
+            self.link(created)
+
+    def link(self, created):
+        """Insert the many-to-many links of new titles, adding the languages, genres and people they name."""
+        for column, (field_name, model, field) in TITLE_LINKS.items():
+            names = [name for _, links in created for name in links[column]]
+            if not names:
+                continue
+            new_people = []
+
+            def build(name):
+                instance = model(**{field: name})
+                if model in (Actor, Director):
+                    instance.Verified = self.verified
+                    new_people.append(instance)
+                return instance
+
+            pks = self.resolver.resolve(model, names, field, build=build)
+            for person in new_people:
+                person.pk = pks[person.full_name]
+            search.index_objects(model, new_people)
+            self.resolver.link(self.model._meta.get_field(field_name),
+                               [(instance.pk, pks[name]) for instance, links in created for name in links[column]])
@@ -0,0 +1,79 @@
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Model
+from django.db.models.signals import post_save
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from polls.models import Profile
+from polls.signals import save_user_profile
+
+PASSWORD = 'benchmark-password'
+
+
+def legacy_save_user_profile(sender, instance, **kwargs):
+    # The profile handling compared against: load the profile and write every column on each User save.
+    Model.save(instance.profile)
+
+
+def time_logins(usernames, repeat):
+    """(logins per second, queries per login) of the fastest of ``repeat`` runs."""
+    runs = []
+    for _ in range(repeat):
+        client = Client()
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            for username in usernames:
+                client.login(username=username, password=PASSWORD)
+            elapsed = perf_counter() - start
+        runs.append((len(usernames) / elapsed, len(queries) / len(usernames)))
+    return max(runs)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+def run_login_benchmark(users=200, repeat=3):
+    """Log ``users`` new users in with the old and the current profile handling.
+
+    Returns {'before': (logins/sec, queries/login), 'after': ...}. A fast password
+    hasher is used, so the numbers are the database work of a login.
+    """
+    password = make_password(PASSWORD)
+    created = User.objects.bulk_create(
+        [User(username=f'bench{number}', password=password) for number in range(users)])
+    Profile.objects.bulk_create([Profile(user=user) for user in created])
+    usernames = [user.username for user in created]
+
+    post_save.disconnect(save_user_profile, sender=User)
+    post_save.connect(legacy_save_user_profile, sender=User)
+    try:
+        before = time_logins(usernames, repeat)
+    finally:
+        post_save.disconnect(legacy_save_user_profile, sender=User)
+        post_save.connect(save_user_profile, sender=User)
+    return {'before': before, 'after': time_logins(usernames, repeat)}
+
+
+class Command(BaseCommand):
+    help = ('Benchmark logins with the profile written only when it changed, against loading and saving it on '
+            'every User save as before.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Number of users logging in once per run.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of runs, the best one is reported.')
+
+    def handle(self, *args, **options):
+        # Always work on a throwaway database.
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            result = run_login_benchmark(options['users'], options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for label in ('before', 'after'):
+            per_second, queries = result[label]
+            self.stdout.write(f'{label}:  {per_second:8.1f} logins/sec  {queries:.1f} queries/login')
+        self.stdout.write(f"speedup: {result['after'][0] / result['before'][0]:.2f}x")
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from polls.scraper.benchmark import run_benchmark
+from polls.scraper.replay import DEFAULT_CORPUS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the IMDb scraper against recorded pages, without network access.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='Directory with the recorded pages.')
+        parser.add_argument('--workers', type=int, help='Size of the fetch pool (SCRAPER_MAX_WORKERS by default).')
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Simulated network latency per request, in seconds.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of runs, the best one is reported.')
+        parser.add_argument('--min-titles-per-second', type=float,
+                            help='Fail when throughput drops below this value (for CI).')
+        parser.add_argument('--max-queries-per-title', type=float,
+                            help='Fail when a title costs more database queries than this (for CI).')
+
+    def handle(self, *args, **options):
+        # Always work on a throwaway database, so stored titles are neither skipped nor touched.
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            runs = [run_benchmark(options['corpus'], options['workers'], options['latency'])
+                    for _ in range(options['repeat'])]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        best = max(runs, key=lambda run: run['titles_per_second'])
+        self.stdout.write(f"titles:            {best['titles']} ({best['failed']} failed)")
+        self.stdout.write(f"titles/sec:        {best['titles_per_second']:.2f}")
+        self.stdout.write(f"elapsed:           {best['elapsed']:.3f}s")
+        self.stdout.write(f"queries/title:     {best['queries_per_title']:.1f} ({best['queries']} total)")
+        self.stdout.write(f"fetch time:        {best['fetch_time']:.3f}s over {best['requests']} requests")
+        self.stdout.write(f"parse time/title:  {best['parse_time_per_title'] * 1000:.2f}ms")
+        self.stdout.write(f"store time:        {best['store_time']:.3f}s")
+        for line in best['latency']:
+            self.stdout.write(f'  {line}')
+
+        if best['failed']:
+            raise CommandError(f"{best['failed']} titles failed to import")
+        minimum = options['min_titles_per_second']
+        if minimum is not None and best['titles_per_second'] < minimum:
+            raise CommandError(f"Throughput {best['titles_per_second']:.2f} titles/sec is below {minimum}")
+        maximum = options['max_queries_per_title']
+        if maximum is not None and best['queries_per_title'] > maximum:
+            raise CommandError(f"{best['queries_per_title']:.1f} queries per title is above {maximum}")
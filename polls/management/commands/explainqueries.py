@@ -0,0 +1,119 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from polls.models import Book, Author, Developer, Movie, Series, Actor, Director, Language, MovieSeriesGenre
+from polls.scraper.resolver import EntityResolver
+
+LIST_VIEWS = ['books', 'authors', 'my-borrowed', 'all-borrowed', 'games', 'developers',
+              'movies', 'series', 'actors', 'directors']
+DETAIL_VIEWS = [('book-detail', Book), ('author-detail', Author), ('developer-detail', Developer),
+                ('movie-detail', Movie), ('series-detail', Series)]
+# Lookups the scraper makes for every imported batch, by the column each one filters on.
+SCRAPER_LOOKUPS = [(Language, 'name'), (MovieSeriesGenre, 'name'), (Movie, 'title'),
+                   (Actor, 'full_name'), (Director, 'full_name')]
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def sequential_scans(plan):
+    """Tables read in full according to ``plan``, a list of EXPLAIN output lines."""
+    tables = []
+    for line in plan:
+        match = POSTGRES_SCAN.search(line) if connection.vendor == 'postgresql' else SQLITE_SCAN.match(line)
+        if match and 'USING' not in line:
+            tables.append(match.group(1))
+    return tables
+
+
+def probe_host():
+    """A host the views accept, for the absolute URLs of login redirects."""
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip('.')
+        if host and host != '*':
+            return host
+    return 'localhost'
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    help = ("Run EXPLAIN on the queries behind the catalogue views and the scraper's lookups, "
+            "and flag the ones that read a whole table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to request the views as (the first superuser by default).')
+        parser.add_argument('--disable-seqscan', action='store_true',
+                            help='PostgreSQL only: report whether an index can be used at all. Without this '
+                                 'a small development table is always scanned, since that is cheapest.')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if any scan is flagged (for CI).')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.get(username=options['user'])
+        else:
+            user = User.objects.filter(is_superuser=True).first() or AnonymousUser()
+
+        flagged = 0
+        with transaction.atomic():
+            if options['disable_seqscan'] and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for label, probe in self.probes(user):
+                with CaptureQueriesContext(connection) as queries:
+                    if probe() is False:
+                        self.stdout.write(f'{label}: skipped')
+                        continue
+                self.stdout.write(f'{label}:')
+                for query in queries:
+                    if not query['sql'].startswith('SELECT'):
+                        continue
+                    plan = explain(query['sql'])
+                    tables = sequential_scans(plan)
+                    flagged += bool(tables)
+                    status = self.style.ERROR(f"SEQUENTIAL SCAN on {', '.join(tables)}") if tables else 'ok'
+                    self.stdout.write(f'  {status}: {query["sql"][:100]}')
+                    if tables or options['verbosity'] > 1:
+                        for line in plan:
+                            self.stdout.write(f'      {line}')
+
+        if flagged and options['fail']:
+            raise CommandError(f'{flagged} queries read a whole table')
+
+    def probes(self, user):
+        """(label, callable) pairs, each callable runs the queries of one view or lookup."""
+        factory = RequestFactory(HTTP_HOST=probe_host())
+
+        def view(url):
+            def probe():
+                request = factory.get(url)
+                request.user = user
+                response = resolve(url).func(request, **resolve(url).kwargs)
+                # Templates are not rendered, only the view's own queries run. Views the user may
+                # not see (login redirects, 403s) are reported as skipped.
+                return response.status_code == 200
+            return probe
+
+        for name in LIST_VIEWS:
+            yield name, view(reverse(name))
+        for name, model in DETAIL_VIEWS:
+            pk = model.objects.values_list('pk', flat=True).first()
+            if pk is not None:
+                yield name, view(reverse(name, args=[pk]))
+        for model, field in SCRAPER_LOOKUPS:
+            yield f'scraper: {model.__name__} by {field}', \
+                lambda model=model, field=field: EntityResolver().known(model, ['Unknown'], field=field)
@@ -0,0 +1,48 @@
+import os
+import sys
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls import export
+
+
+class Command(BaseCommand):
+    help = ('Export catalogue tables and their many-to-many links as CSV or JSON Lines, '
+            'one file per table, in constant memory.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', metavar='table',
+                            help=f"Tables to export (all by default): {', '.join(export.TABLES)}.")
+        parser.add_argument('--format', choices=export.FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the files.')
+        parser.add_argument('--directory', default='.', help='Where to write the files.')
+        parser.add_argument('--to-stdout', action='store_true', help='Write a single table to standard output.')
+        parser.add_argument('--chunk-size', type=int, default=export.EXPORT_CHUNK_SIZE,
+                            help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        tables = options['tables'] or list(export.TABLES)
+        unknown = [table for table in tables if table not in export.TABLES]
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(unknown)}")
+        if options['to_stdout']:
+            if len(tables) != 1:
+                raise CommandError('--to-stdout exports exactly one table')
+            self.write(tables[0], sys.stdout.buffer, options)
+            return
+
+        os.makedirs(options['directory'], exist_ok=True)
+        for table in tables:
+            path = os.path.join(options['directory'], export.filename(table, options['format'], options['gzip']))
+            start = time()
+            with open(path, 'wb') as output:
+                size = self.write(table, output, options)
+            self.stdout.write(f'{path}: {size} bytes in {time() - start:.2f}s')
+
+    def write(self, table, output, options):
+        size = 0
+        for chunk in export.stream(table, options['format'], options['gzip'], options['chunk_size']):
+            output.write(chunk)
+            size += len(chunk)
+        return size
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.importer import IMPORTED, IMPORT_BATCH_SIZE, CatalogImporter, read_records
+
+
+class Command(BaseCommand):
+    help = ('Bulk import movies, series, actors or directors from a CSV or JSON Lines file (optionally gzipped). '
+            'Movie and series records name their languages, genres, directors and actors; CSV files separate '
+            'the names with "|".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=IMPORTED)
+        parser.add_argument('path', help='A .csv or .jsonl file, or the same with .gz.')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Format of the file (from its name by default).')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='Records validated and stored per transaction.')
+        parser.add_argument('--start', type=int, default=0,
+                            help='Number of the first record to import, to resume an interrupted import.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and store everything, then roll back.')
+        parser.add_argument('--verified', action='store_true', help='Mark new rows as verified.')
+
+    def handle(self, *args, **options):
+        importer = CatalogImporter(options['kind'], verified=options['verified'], batch_size=options['batch_size'])
+        try:
+            records = read_records(options['path'], options['format'])
+        except ValueError as error:
+            raise CommandError(error)
+        try:
+            result = importer.run(records, start=options['start'], dry_run=options['dry_run'],
+                                  progress=self.progress if options['verbosity'] > 1 else None)
+        except OSError as error:
+            raise CommandError(error)
+        except Exception as error:
+            if options['dry_run']:
+                raise
+            raise CommandError(f'Import stopped by {error!r}, the batches before it are stored. '
+                               f'Resume with --start {importer.result.next_start}') from error
+
+        self.stdout.write(f'records:   {result.read} (from {result.start})')
+        self.stdout.write(f'created:   {result.created}')
+        self.stdout.write(f'skipped:   {result.skipped} already stored')
+        self.stdout.write(f'invalid:   {len(result.errors)}')
+        self.stdout.write(f'rows/sec:  {result.rows_per_second:.0f} ({result.elapsed:.2f}s)')
+        for number, message in result.errors[:20]:
+            self.stderr.write(f'  record {number}: {message}')
+        if len(result.errors) > 20:
+            self.stderr.write(f'  ... and {len(result.errors) - 20} more')
+        if options['dry_run']:
+            self.stdout.write('Dry run, nothing was stored.')
+
+    def progress(self, result):
+        self.stdout.write(f'{result.next_start} records, {result.rows_per_second:.0f} rows/sec')
@@ -0,0 +1,50 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.overdue import OVERDUE_CHUNK_SIZE, REMINDER_BATCH_SIZE, OverdueReminders, overdue_loans
+
+
+class Command(BaseCommand):
+    help = ('List the overdue loans grouped by borrower, or with --send email every borrower a reminder '
+            'through the configured EMAIL_BACKEND. Runs in constant memory.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--send', action='store_true', help='Email the reminders.')
+        parser.add_argument('--dry-run', action='store_true', help='With --send, count the reminders only.')
+        parser.add_argument('--date', type=datetime.date.fromisoformat,
+                            help='Day the loans are overdue on, YYYY-MM-DD (today by default).')
+        parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE,
+                            help='Reminders handed to the email backend at a time.')
+        parser.add_argument('--chunk-size', type=int, default=OVERDUE_CHUNK_SIZE,
+                            help='Loans fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        today = options['date'] or datetime.date.today()
+        if not options['send']:
+            self.list(today, options['chunk_size'])
+            return
+
+        reminders = OverdueReminders(batch_size=options['batch_size'], chunk_size=options['chunk_size'])
+        try:
+            stats = reminders.run(today, dry_run=options['dry_run'])
+        except Exception as error:
+            stats = reminders.stats
+            raise CommandError(f'Sending stopped by {error!r} after {stats.sent} reminders '
+                               f'to {stats.borrowers} borrowers') from error
+
+        self.stdout.write(f'borrowers:   {stats.borrowers}')
+        self.stdout.write(f'loans:       {stats.loans}')
+        self.stdout.write(f'reminders:   {stats.sent}{" (dry run)" if options["dry_run"] else ""}')
+        self.stdout.write(f'no email:    {stats.unreachable}')
+        self.stdout.write(f'loans/sec:   {stats.loans_per_second:.0f} ({stats.elapsed:.2f}s)')
+
+    def list(self, today, chunk_size):
+        borrowers = loans = 0
+        for borrower, overdue in overdue_loans(today, chunk_size):
+            borrowers += 1
+            loans += len(overdue)
+            self.stdout.write(f'{borrower.username} <{borrower.email}>: {len(overdue)} overdue')
+            for loan in overdue:
+                self.stdout.write(f'  {loan.id}  {loan.due_back}  {(today - loan.due_back).days:>4}d  {loan.title}')
+        self.stdout.write(f'{loans} overdue loans, {borrowers} borrowers')
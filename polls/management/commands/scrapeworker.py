@@ -0,0 +1,33 @@
+import os
+import socket
+from time import sleep
+
+from django.core.management.base import BaseCommand
+
+from polls.scraper import claim_job, run_job, get_client
+
+
+class Command(BaseCommand):
+    help = 'Run queued IMDb scrape jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as the queue is empty instead of waiting for new jobs.')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to wait before polling an empty queue again.')
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        while True:
+            job = claim_job(worker)
+            if job is None:
+                if options['once']:
+                    return
+                sleep(options['interval'])
+                continue
+            self.stdout.write(f'Running {job}')
+            job = run_job(job)
+            self.stdout.write(
+                f'{job}: {job.titles_created} created, {job.titles_failed} failed in {job.elapsed:.1f}s')
+            for line in get_client().latency_report():
+                self.stdout.write(f'  {line}')
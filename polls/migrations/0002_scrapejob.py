@@ -0,0 +1,37 @@
+# Generated by Django 4.0.4 on 2026-10-18 08:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('polls', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('q', 'Queued'), ('r', 'Running'), ('d', 'Done'), ('f', 'Failed')], default='q', max_length=1)),
+                ('limit', models.PositiveIntegerField(blank=True, help_text='Only scrape the first N chart entries', null=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('titles_total', models.PositiveIntegerField(default=0)),
+                ('titles_done', models.PositiveIntegerField(default=0)),
+                ('titles_failed', models.PositiveIntegerField(default=0)),
+                ('titles_created', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
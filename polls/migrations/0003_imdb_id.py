@@ -0,0 +1,38 @@
+# Generated by Django 4.0.4 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0002_scrapejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='imdb_id',
+            field=models.CharField(blank=True, help_text='IMDb name id, e.g. nm0000151', max_length=12, null=True, unique=True, verbose_name='IMDb id'),
+        ),
+        migrations.AddField(
+            model_name='director',
+            name='imdb_id',
+            field=models.CharField(blank=True, help_text='IMDb name id, e.g. nm0000151', max_length=12, null=True, unique=True, verbose_name='IMDb id'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_id',
+            field=models.CharField(blank=True, help_text='IMDb title id, e.g. tt0111161', max_length=12, null=True, unique=True, verbose_name='IMDb id'),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='titles_skipped',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='imdb_id',
+            field=models.CharField(blank=True, help_text='IMDb title id, e.g. tt0111161', max_length=12, null=True, unique=True, verbose_name='IMDb id'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_imdb_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='actor',
+            name='Verified',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='director',
+            name='Verified',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='Verified',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='Verified',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='series',
+            name='Verified',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0004_verified_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='actor',
+            options={'ordering': ['full_name']},
+        ),
+        migrations.AlterModelOptions(
+            name='director',
+            options={'ordering': ['full_name']},
+        ),
+        migrations.AlterModelOptions(
+            name='movie',
+            options={'ordering': ['title']},
+        ),
+        migrations.AlterModelOptions(
+            name='series',
+            options={'ordering': ['title']},
+        ),
+    ]
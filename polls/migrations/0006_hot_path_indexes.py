@@ -0,0 +1,128 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_catalog_ordering'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='actor',
+            name='Verified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='director',
+            name='Verified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='Verified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='language',
+            name='name',
+            field=models.CharField(db_index=True, help_text="Enter the book's natural language (e.g. English, French, Japanese etc.)", max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='Verified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='movieseriesgenre',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='series',
+            name='Verified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='actor',
+            index=models.Index(fields=['full_name'], name='polls_actor_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='actor',
+            index=models.Index(condition=models.Q(('Verified', True)), fields=['full_name', 'id'], name='polls_actor_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='actor',
+            index=models.Index(condition=models.Q(('Verified', False)), fields=['full_name', 'id'], name='polls_actor_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='author_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'author', 'id'], name='book_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['status', 'due_back'], name='bookinstance_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['borrower', 'status', 'due_back'], name='bookinstance_borrower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(condition=models.Q(('status', 'o')), fields=['due_back'], name='bookinstance_on_loan_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='developer',
+            index=models.Index(fields=['company_name', 'id'], name='developer_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='director',
+            index=models.Index(fields=['full_name'], name='polls_director_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='director',
+            index=models.Index(condition=models.Q(('Verified', True)), fields=['full_name', 'id'], name='polls_director_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='director',
+            index=models.Index(condition=models.Q(('Verified', False)), fields=['full_name', 'id'], name='polls_director_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('Verified', True)), fields=['title', 'id'], name='game_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('Verified', False)), fields=['title', 'id'], name='game_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title'], name='polls_movie_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(condition=models.Q(('Verified', True)), fields=['title', 'id'], name='polls_movie_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(condition=models.Q(('Verified', False)), fields=['title', 'id'], name='polls_movie_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='series',
+            index=models.Index(fields=['title'], name='polls_series_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='series',
+            index=models.Index(condition=models.Q(('Verified', True)), fields=['title', 'id'], name='polls_series_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='series',
+            index=models.Index(condition=models.Q(('Verified', False)), fields=['title', 'id'], name='polls_series_pending_idx'),
+        ),
+    ]
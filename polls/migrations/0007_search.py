@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# The search definitions as they were when this migration was written, see ``polls.search``. Copied rather
+# than imported, so later changes to that module don't change what this migration does.
+FTS_TABLE = 'polls_search'
+SEARCH_CONFIG = 'english'
+# kind, model, fields the result is named after (weight A), other searched fields (weight B)
+SEARCHED = (
+    ('book', 'Book', ('title',), ('summary',)),
+    ('author', 'Author', ('first_name', 'last_name'), ()),
+    ('movie', 'Movie', ('title',), ('summary',)),
+    ('series', 'Series', ('title',), ('summary',)),
+    ('game', 'Game', ('title',), ('summary',)),
+    ('actor', 'Actor', ('full_name',), ()),
+    ('director', 'Director', ('full_name',), ()),
+)
+
+
+def fts_rowid(number, pk):
+    return pk * len(SEARCHED) + number
+
+
+def index_name(model):
+    return f'{model._meta.db_table}_search_idx'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        for kind, model, names, body in SEARCHED:
+            model = apps.get_model('polls', model)
+            vector = SearchVector(*names, config=SEARCH_CONFIG, weight='A')
+            if body:
+                vector = vector + SearchVector(*body, config=SEARCH_CONFIG, weight='B')
+            schema_editor.add_index(model, GinIndex(vector, name=index_name(model)))
+    elif vendor == 'sqlite':
+        schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                              f"kind UNINDEXED, object_id UNINDEXED, title, body, tokenize='porter unicode61')")
+        for number, (kind, model, names, body) in enumerate(SEARCHED):
+            model = apps.get_model('polls', model)
+            rows = [(fts_rowid(number, row[0]), kind, row[0], ' '.join(filter(None, row[1:len(names) + 1])),
+                     ' '.join(filter(None, row[len(names) + 1:])))
+                    for row in model.objects.values_list('pk', *names, *body).iterator()]
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, kind, object_id, title, body) '
+                                   f'VALUES (%s, %s, %s, %s, %s)', rows)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for kind, model, names, body in SEARCHED:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {index_name(apps.get_model("polls", model))}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+    """Full-text search, see ``polls.search``.
+
+    GIN indexes on PostgreSQL, an FTS5 table on SQLite, nothing elsewhere.
+    """
+
+    dependencies = [
+        ('polls', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# (table, column) of every autocomplete lookup. Kept here rather than read from polls.autocomplete, so this
+# migration does the same whatever later becomes of that module.
+PREFIX_INDEXED = (
+    ('polls_actor', 'full_name'),
+    ('polls_director', 'full_name'),
+    ('polls_language', 'name'),
+    ('polls_movieseriesgenre', 'name'),
+    ('polls_developer', 'company_name'),
+    ('polls_gamegenre', 'name'),
+    ('polls_gamemode', 'name'),
+    ('polls_author', 'last_name'),
+    ('polls_genre', 'name'),
+)
+CREATE_SQL = {
+    'sqlite': 'CREATE INDEX IF NOT EXISTS "{table}_{column}_prefix_idx" ON "{table}" ("{column}" COLLATE NOCASE)',
+    'postgresql': 'CREATE INDEX IF NOT EXISTS "{table}_{column}_prefix_idx" ON "{table}" '
+                  '((UPPER("{column}"::text)) text_pattern_ops)',
+}
+
+
+def create_prefix_indexes(apps, schema_editor):
+    sql = CREATE_SQL.get(schema_editor.connection.vendor)
+    if sql:
+        for table, column in PREFIX_INDEXED:
+            schema_editor.execute(sql.format(table=table, column=column))
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        for table, column in PREFIX_INDEXED:
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_{column}_prefix_idx"')
+
+
+class Migration(migrations.Migration):
+    """Case-insensitive prefix indexes for the autocomplete lookups, see ``polls.autocomplete``."""
+
+    dependencies = [
+        ('polls', '0007_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
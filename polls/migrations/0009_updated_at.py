@@ -0,0 +1,83 @@
+# Generated by Django 4.0.4 on 2026-10-18 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+PREFIX_INDEXED = (
+    ('polls_actor', 'full_name'),
+    ('polls_director', 'full_name'),
+    ('polls_language', 'name'),
+    ('polls_movieseriesgenre', 'name'),
+    ('polls_developer', 'company_name'),
+    ('polls_gamegenre', 'name'),
+    ('polls_gamemode', 'name'),
+    ('polls_author', 'last_name'),
+    ('polls_genre', 'name'),
+)
+
+
+def restore_prefix_indexes(apps, schema_editor):
+    # SQLite adds these columns by rebuilding the tables, which drops the indexes of migration 0008.
+    if schema_editor.connection.vendor == 'sqlite':
+        for table, column in PREFIX_INDEXED:
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{table}_{column}_prefix_idx" '
+                                  f'ON "{table}" ("{column}" COLLATE NOCASE)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='developer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='director',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_prefix_indexes, migrations.RunPython.noop),
+    ]
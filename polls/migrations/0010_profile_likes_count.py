@@ -0,0 +1,32 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:28
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_likes(apps, schema_editor):
+    Profile = apps.get_model('polls', 'Profile')
+    likes = (Profile.likes.through.objects.filter(profile_id=OuterRef('pk')).order_by()
+             .values('profile_id').annotate(count=Count('pk')).values('count'))
+    Profile.objects.update(likes_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-likes_count', 'id'], name='profile_likes_idx'),
+        ),
+    ]
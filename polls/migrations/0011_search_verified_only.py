@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# kind in the FTS5 table, table of the model
+MODERATED = (
+    ('movie', 'polls_movie'),
+    ('series', 'polls_series'),
+    ('game', 'polls_game'),
+    ('actor', 'polls_actor'),
+    ('director', 'polls_director'),
+)
+
+
+def remove_unverified(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for kind, table in MODERATED:
+        schema_editor.execute(
+            f'DELETE FROM polls_search WHERE kind = %s '
+            f'AND object_id IN (SELECT id FROM {table} WHERE NOT "Verified")', [kind])
+
+
+class Migration(migrations.Migration):
+    """Drop unverified rows from the SQLite search table, they are no longer indexed."""
+
+    dependencies = [
+        ('polls', '0010_profile_likes_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_unverified, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:48
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_heartbeats(apps, schema_editor):
+    # Jobs already running count as alive since they started, so stuck ones are claimed again after the timeout.
+    ScrapeJob = apps.get_model('polls', 'ScrapeJob')
+    ScrapeJob.objects.filter(status='r').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_search_verified_only'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(start_heartbeats, migrations.RunPython.noop),
+    ]
@@ -3,12 +3,40 @@ from datetime import date
 
 from django.contrib.auth.models import User
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone
 from django.urls import reverse  # Used to generate URLs by reversing the URL patterns
 
 
 # Create your models here.
 
+class VerifiedQuerySet(models.QuerySet):
+    """Queryset of models with a ``Verified`` flag."""
+
+    def verified(self):
+        return self.filter(Verified=True)
+
+    def pending(self):
+        """Objects waiting for a superuser to verify them."""
+        return self.filter(Verified=False)
+
+
+class BookInstanceQuerySet(models.QuerySet):
+    """Queryset of book copies."""
+
+    def on_loan(self):
+        return self.filter(status='o')
+
+    def overdue(self, today=None):
+        """Copies on loan past their due date, found on an index on (status, due_back)."""
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def for_listing(self):
+        """Copies with only what the loan lists show: status, due date, book title and borrower, in one query."""
+        return self.select_related('book', 'borrower').only(
+            'id', 'status', 'due_back', 'book__title', 'borrower__username')
+
+
 class Genre(models.Model):
     """Model representing a book genre."""
     name = models.CharField(max_length=200, help_text='Enter a book genre (e.g. Science Fiction)')
@@ -20,7 +48,7 @@ class Genre(models.Model):
 
 class Language(models.Model):
     """Model representing a Language (e.g. English, French, Japanese, etc.)"""
-    name = models.CharField(max_length=200,
+    name = models.CharField(max_length=200, db_index=True,
                             help_text="Enter the book's natural language (e.g. English, French, Japanese etc.)")
 
     def __str__(self):
@@ -59,9 +87,18 @@ class Game(models.Model):
     # language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
     summary = models.TextField(max_length=1000, help_text='Enter a brief description of the game')
     Verified = models.BooleanField(default=False)
+    # Set on every save, and by polls.signals when a row shown on the object's pages changes.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = VerifiedQuerySet.as_manager()
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            # One partial index per list, SQLite filters a boolean as a bare column and can't seek on it.
+            models.Index(fields=['title', 'id'], condition=models.Q(Verified=True), name='game_verified_idx'),
+            models.Index(fields=['title', 'id'], condition=models.Q(Verified=False), name='game_pending_idx'),
+        ]
 
     def __str__(self):
         """String for representing the Model object."""
@@ -73,12 +110,12 @@ class Game(models.Model):
 
     def Verify(self, *args, **kwargs):
         self.Verified = True
-        self.save(update_fields=['Verified'])
+        self.save(update_fields=['Verified', 'updated_at'])
         return self.Verified
 
     def Unverify(self, *args, **kwargs):
         self.Verified = False
-        self.save(update_fields=['Verified'])
+        self.save(update_fields=['Verified', 'updated_at'])
         return self.Verified
 
 
@@ -94,9 +131,11 @@ class Book(models.Model):
 
     genre = models.ManyToManyField(Genre, help_text='Select a genre for this book')
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['title', 'author']
+        indexes = [models.Index(fields=['title', 'author', 'id'], name='book_order_idx')]
 
     def __str__(self):
         """String for representing the Model object."""
@@ -122,6 +161,8 @@ class BookInstance(models.Model):
     due_back = models.DateField(null=True, blank=True)
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    objects = BookInstanceQuerySet.as_manager()
+
     @property
     def is_overdue(self):
         if self.due_back and date.today() > self.due_back:
@@ -145,6 +186,12 @@ class BookInstance(models.Model):
 
     class Meta:
         ordering = ['due_back']
+        indexes = [
+            models.Index(fields=['status', 'due_back'], name='bookinstance_status_idx'),
+            models.Index(fields=['borrower', 'status', 'due_back'], name='bookinstance_borrower_idx'),
+            # Books on loan are a small part of the library.
+            models.Index(fields=['due_back'], condition=models.Q(status='o'), name='bookinstance_on_loan_idx'),
+        ]
         permissions = (("can_mark_returned", "Set book as returned"),)
 
     def __str__(self):
@@ -158,9 +205,11 @@ class Author(models.Model):
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('Died', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [models.Index(fields=['last_name', 'first_name', 'id'], name='author_order_idx')]
 
     def get_absolute_url(self):
         """Returns the URL to access a particular author instance."""
@@ -175,9 +224,11 @@ class Developer(models.Model):
     """Model representing an Developer."""
     company_name = models.CharField(max_length=100)
     date_of_foundation = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['company_name']
+        indexes = [models.Index(fields=['company_name', 'id'], name='developer_order_idx')]
 
     def get_absolute_url(self):
         """Returns the URL to access a particular developer instance."""
@@ -196,6 +247,71 @@ class Profile(models.Model):
     profile_description = models.TextField(max_length=100, null=True, blank=True)
     signature = models.TextField(max_length=100, null=True, blank=True)
     likes = models.ManyToManyField(User, related_name="blog_posts")
+    # Kept equal to the number of likes by like()/unlike() and polls.signals.
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['-likes_count', 'id'], name='profile_likes_idx')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_values = dict(zip(field_names, values))
+        return instance
+
+    def changed_fields(self):
+        """Names of the fields that differ from what was loaded, every field if the profile is new."""
+        saved = getattr(self, '_saved_values', None)
+        fields = [field for field in self._meta.concrete_fields if not field.primary_key]
+        if self._state.adding or saved is None:
+            return [field.name for field in fields]
+        return [field.name for field in fields
+                if (field.attname in saved and getattr(self, field.attname) != saved[field.attname])
+                # A deferred field that has been set since.
+                or (field.attname not in saved and field.attname in self.__dict__)]
+
+    def save(self, *args, **kwargs):
+        """Only write the fields that changed, and nothing at all if none did.
+
+        Besides saving a query this keeps a stale instance from overwriting
+        ``likes_count``, which is updated in the database directly.
+        """
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed
+        super().save(*args, **kwargs)
+        written = kwargs.get('update_fields')
+        self._saved_values = {**getattr(self, '_saved_values', {}), **{
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+            if written is None or field.name in written or field.attname in written}}
+
+    def like(self, user):
+        """Add ``user``'s like, returns False if it was already there.
+
+        A single INSERT that the unique (profile, user) index turns into a no-op
+        for a repeated like, so concurrent requests can't count a like twice.
+        """
+        through = Profile.likes.through
+        quote = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(through._meta.db_table)} ({quote("profile_id")}, {quote("user_id")}) '
+                f'VALUES (%s, %s) ON CONFLICT DO NOTHING', [self.pk, user.pk])
+            added = cursor.rowcount == 1
+            if added:
+                Profile.objects.filter(pk=self.pk).update(likes_count=models.F('likes_count') + 1)
+        return added
+
+    def unlike(self, user):
+        """Remove ``user``'s like, returns False if there was none."""
+        with transaction.atomic():
+            removed, _ = Profile.likes.through.objects.filter(profile_id=self.pk, user_id=user.pk).delete()
+            if removed:
+                Profile.objects.filter(pk=self.pk, likes_count__gt=0).update(likes_count=models.F('likes_count') - 1)
+        return bool(removed)
+
     def WhenJoined(self):
         return self.user.date_joined
 
@@ -219,26 +335,42 @@ class Person(models.Model):
     # first_name = models.CharField(max_length=100)
     # last_name = models.CharField(max_length=100)
     full_name = models.CharField(max_length=100)
+    imdb_id = models.CharField('IMDb id', max_length=12, unique=True, null=True, blank=True,
+                               help_text='IMDb name id, e.g. nm0000151')
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField(null=True, blank=True)
     Verified = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = VerifiedQuerySet.as_manager()
 
     def verified(self, *args, **kwargs):
         self.Verified = True
-        self.save(update_fields=['Verified'])
+        self.save(update_fields=['Verified', 'updated_at'])
         return self.Verified
 
     def unverified(self, *args, **kwargs):
         self.Verified = False
-        self.save(update_fields=['Verified'])
+        self.save(update_fields=['Verified', 'updated_at'])
         return self.Verified
 
     class Meta:
         abstract = True
+        ordering = ['full_name']
+        indexes = [
+            # Looked up by name when the scraper adopts rows stored before IMDb ids were tracked.
+            models.Index(fields=['full_name'], name='%(app_label)s_%(class)s_name_idx'),
+            models.Index(fields=['full_name', 'id'], condition=models.Q(Verified=True),
+                         name='%(app_label)s_%(class)s_verified_idx'),
+            models.Index(fields=['full_name', 'id'], condition=models.Q(Verified=False),
+                         name='%(app_label)s_%(class)s_pending_idx'),
+        ]
 
 
 class MovieSeriesBase(models.Model):
     title = models.CharField(max_length=100)
+    imdb_id = models.CharField('IMDb id', max_length=12, unique=True, null=True, blank=True,
+                               help_text='IMDb title id, e.g. tt0111161')
     language = models.ManyToManyField('Language')
     actors = models.ManyToManyField('Actor')
     director = models.ManyToManyField('Director')
@@ -246,19 +378,30 @@ class MovieSeriesBase(models.Model):
     genre = models.ManyToManyField('MovieSeriesGenre')
     Verified = models.BooleanField(default=False)
     summary = models.TextField(max_length=1000, default="summary")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = VerifiedQuerySet.as_manager()
 
     def verified(self, *args, **kwargs):
         self.Verified = True
-        self.save(update_fields=['Verified'])
+        self.save(update_fields=['Verified', 'updated_at'])
         return self.Verified
 
     def unverified(self, *args, **kwargs):
         self.Verified = False
-        self.save(update_fields=['Verified'])
+        self.save(update_fields=['Verified', 'updated_at'])
         return self.Verified
 
     class Meta:
         abstract = True
+        ordering = ['title']
+        indexes = [
+            models.Index(fields=['title'], name='%(app_label)s_%(class)s_title_idx'),
+            models.Index(fields=['title', 'id'], condition=models.Q(Verified=True),
+                         name='%(app_label)s_%(class)s_verified_idx'),
+            models.Index(fields=['title', 'id'], condition=models.Q(Verified=False),
+                         name='%(app_label)s_%(class)s_pending_idx'),
+        ]
 
 
 class Actor(Person):
@@ -304,7 +447,54 @@ class Series(MovieSeriesBase):
 
 
 class MovieSeriesGenre(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
 
     def __str__(self):
         return self.name
+
+
+class ScrapeJob(models.Model):
+    """An IMDb import queued from the site and run by the ``scrapeworker`` command."""
+    JOB_STATUS = (
+        ('q', 'Queued'),
+        ('r', 'Running'),
+        ('d', 'Done'),
+        ('f', 'Failed'),
+    )
+
+    status = models.CharField(max_length=1, choices=JOB_STATUS, default='q')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    limit = models.PositiveIntegerField(null=True, blank=True, help_text='Only scrape the first N chart entries')
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Moved by the worker with every title, a running job whose worker died stops moving it.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    titles_total = models.PositiveIntegerField(default=0)
+    titles_done = models.PositiveIntegerField(default=0)
+    titles_failed = models.PositiveIntegerField(default=0)
+    titles_skipped = models.PositiveIntegerField(default=0)
+    titles_created = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'Scrape job {self.pk} ({self.get_status_display()})'
+
+    def get_absolute_url(self):
+        return reverse('scrape-job', args=[str(self.id)])
+
+    @property
+    def is_finished(self):
+        return self.status in ('d', 'f')
+
+    @property
+    def elapsed(self):
+        """Seconds spent running so far (or in total once finished)."""
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
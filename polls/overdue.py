@@ -0,0 +1,102 @@
+"""Overdue loans and the reminders sent to their borrowers.
+
+Overdue loans are found in SQL with ``BookInstance.objects.overdue()`` and
+read with ``values_list().iterator()`` in borrower order, so they can be
+grouped one borrower at a time and memory use does not depend on how many
+loans are out. Reminders are sent through the configured ``EMAIL_BACKEND``
+``REMINDER_BATCH_SIZE`` messages at a time, all over one connection. Used by
+the ``overdueloans`` command.
+"""
+from collections import namedtuple
+from datetime import date
+from itertools import groupby
+from time import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+from .models import BookInstance
+
+OVERDUE_CHUNK_SIZE = 2000
+REMINDER_BATCH_SIZE = 100
+
+Borrower = namedtuple('Borrower', 'id username email')
+OverdueLoan = namedtuple('OverdueLoan', 'id due_back title')
+
+
+def overdue_loans(today=None, chunk_size=OVERDUE_CHUNK_SIZE):
+    """(borrower, [overdue loans by due date]) of every borrower with overdue loans, one at a time."""
+    rows = (BookInstance.objects.overdue(today).filter(borrower__isnull=False)
+            .order_by('borrower_id', 'due_back', 'pk')
+            .values_list('borrower_id', 'borrower__username', 'borrower__email', 'pk', 'due_back', 'book__title')
+            .iterator(chunk_size=chunk_size))
+    for borrower, loans in groupby(rows, key=lambda row: row[:3]):
+        yield Borrower(*borrower), [OverdueLoan(*row[3:]) for row in loans]
+
+
+def reminder(borrower, loans, today=None):
+    """The reminder email of one borrower."""
+    today = today or date.today()
+    context = {
+        'borrower': borrower,
+        'loans': [(loan, (today - loan.due_back).days) for loan in loans],
+    }
+    subject = f'{len(loans)} overdue book{"s" if len(loans) != 1 else ""}'
+    return EmailMessage(subject, render_to_string('polls/overdue_reminder.txt', context), to=[borrower.email])
+
+
+class ReminderStats:
+    """Outcome of one reminder run."""
+
+    def __init__(self):
+        self.borrowers = 0
+        self.loans = 0
+        self.sent = 0
+        # Borrowers without an email address.
+        self.unreachable = 0
+        self.elapsed = 0.0
+
+    @property
+    def loans_per_second(self):
+        return self.loans / self.elapsed if self.elapsed else 0.0
+
+
+class OverdueReminders:
+    """Emails every borrower with overdue loans one reminder listing them."""
+
+    def __init__(self, batch_size=REMINDER_BATCH_SIZE, chunk_size=OVERDUE_CHUNK_SIZE, connection=None):
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.connection = connection
+        # The run in progress, or the last one.
+        self.stats = None
+
+    def run(self, today=None, dry_run=False):
+        """Send the reminders, or with ``dry_run`` only count them."""
+        stats = self.stats = ReminderStats()
+        began = time()
+        connection = self.connection or get_connection()
+        batch = []
+        if not dry_run:
+            connection.open()
+        try:
+            for borrower, loans in overdue_loans(today, self.chunk_size):
+                stats.borrowers += 1
+                stats.loans += len(loans)
+                if not borrower.email:
+                    stats.unreachable += 1
+                    continue
+                batch.append(reminder(borrower, loans, today))
+                if len(batch) == self.batch_size:
+                    self.send(connection, batch, dry_run)
+                    batch = []
+            self.send(connection, batch, dry_run)
+        finally:
+            if not dry_run:
+                connection.close()
+            stats.elapsed = time() - began
+        return stats
+
+    def send(self, connection, batch, dry_run):
+        if batch:
+            self.stats.sent += len(batch) if dry_run else connection.send_messages(batch) or 0
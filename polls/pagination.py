@@ -0,0 +1,203 @@
+"""Keyset (seek) pagination for the catalogue list views.
+
+Instead of ``OFFSET`` the next page is selected with a ``WHERE`` on the sort
+key of the last row shown, e.g. ``title > 'Heat' OR (title = 'Heat' AND id >
+42)``, so every page costs the same index range scan and no ``COUNT(*)`` is
+needed. Cursors are opaque strings holding the key of the first or last row of
+the current page.
+"""
+import base64
+import json
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from django.http import Http404
+
+ROWS_ESTIMATE = re.compile(r'rows=(\d+)')
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, values], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise Http404('Invalid cursor')
+    if direction not in ('next', 'previous') or not isinstance(values, list):
+        raise Http404('Invalid cursor')
+    return direction, values
+
+
+def estimate_count(queryset):
+    """Planner row estimate for ``queryset`` on PostgreSQL, None elsewhere."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    match = ROWS_ESTIMATE.search(queryset.order_by().explain())
+    return int(match.group(1)) if match else None
+
+
+class KeysetPaginator:
+    """Stands in for Django's ``Paginator`` in templates; ``count`` may be an estimate or None."""
+
+    def __init__(self, count):
+        self.count = count
+
+
+class KeysetPage:
+    """A page of rows; ``next_query`` and ``previous_query`` are the query strings of its neighbours."""
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None,
+                 next_query=None, previous_query=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_query = next_query
+        self.previous_query = previous_query
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin:
+    """Cursor based pagination for ``ListView``, keyed on the view's or model's ordering plus pk.
+
+    Pages are selected with ``?cursor=``. ``?page=N`` still uses offset pagination,
+    so old links keep working. ``count_mode`` is ``'approximate'`` (planner estimate,
+    PostgreSQL only), ``'exact'`` (``COUNT(*)``) or None.
+
+    Relations in the ordering are keyed on their id and NULLs sort last.
+    """
+    cursor_kwarg = 'cursor'
+    count_mode = 'approximate'
+
+    def get_keyset(self, queryset):
+        """[(field, attname, descending, nullable), ...] ending with the primary key."""
+        ordering = self.get_ordering() or queryset.query.order_by or queryset.model._meta.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        opts = queryset.model._meta
+        keyset = []
+        for name in ordering:
+            descending = name.startswith('-')
+            field = opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-'))
+            keyset.append((field, field.attname, descending, field.null))
+        if not any(field.primary_key for field, _, _, _ in keyset):
+            keyset.append((opts.pk, opts.pk.attname, False, False))
+        return keyset
+
+    @staticmethod
+    def _after(attname, descending, nullable, value):
+        """Rows strictly after ``value`` on one key column, NULLs last in ascending order."""
+        if value is None:
+            return Q(**{f'{attname}__isnull': False}) if descending else Q(pk__in=[])
+        condition = Q(**{f'{attname}__{"lt" if descending else "gt"}': value})
+        if nullable and not descending:
+            condition |= Q(**{f'{attname}__isnull': True})
+        return condition
+
+    @staticmethod
+    def _equal(attname, value):
+        return Q(**{f'{attname}__isnull': True}) if value is None else Q(**{attname: value})
+
+    def _seek(self, keyset, values):
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, attname, descending, nullable), value in zip(keyset, values):
+            condition |= equal & self._after(attname, descending, nullable, value)
+            equal &= self._equal(attname, value)
+        return condition
+
+    @staticmethod
+    def _order(keyset):
+        # NULLS FIRST/LAST only on nullable columns, SQLite cannot read them from an index.
+        order = []
+        for _, attname, descending, nullable in keyset:
+            if descending:
+                order.append(F(attname).desc(nulls_first=True) if nullable else F(attname).desc())
+            else:
+                order.append(F(attname).asc(nulls_last=True) if nullable else F(attname).asc())
+        return order
+
+    @staticmethod
+    def _reverse(keyset):
+        return [(field, attname, not descending, nullable) for field, attname, descending, nullable in keyset]
+
+    def _cursor(self, direction, keyset, row):
+        return encode_cursor(direction, [field.value_to_string(row) if getattr(row, attname) is not None
+                                         else None for field, attname, _, _ in keyset])
+
+    def _page_query(self, cursor):
+        """The query string of the request with ``cursor`` selecting the page, other parameters are kept."""
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query[self.cursor_kwarg] = cursor
+        return query.urlencode()
+
+    def _count(self, queryset):
+        if self.count_mode == 'exact':
+            return queryset.count()
+        if self.count_mode == 'approximate':
+            return estimate_count(queryset)
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.request.GET.get(self.page_kwarg):
+            return super().paginate_queryset(queryset, page_size)
+
+        keyset = self.get_keyset(queryset)
+        direction, values = 'next', None
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        if cursor:
+            direction, values = decode_cursor(cursor)
+            try:
+                values = [None if value is None else field.to_python(value)
+                          for (field, _, _, _), value in zip(keyset, values)]
+            except ValidationError:
+                raise Http404('Invalid cursor')
+            if len(values) != len(keyset):
+                raise Http404('Invalid cursor')
+
+        seek = keyset if direction == 'next' else self._reverse(keyset)
+        rows = queryset.order_by(*self._order(seek))
+        if values is not None:
+            rows = rows.filter(self._seek(seek, values))
+        rows = list(rows[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == 'previous':
+            rows.reverse()
+
+        # Going forward there is a next page if a row was left over and a previous one if
+        # we started from a cursor; going backward it is the other way round.
+        has_next, has_previous = more, values is not None
+        if direction == 'previous':
+            has_next, has_previous = has_previous, has_next
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._cursor('next', keyset, rows[-1])
+        if rows and has_previous:
+            previous_cursor = self._cursor('previous', keyset, rows[0])
+        page = KeysetPage(rows, KeysetPaginator(self._count(queryset)), next_cursor, previous_cursor,
+                          self._page_query(next_cursor), self._page_query(previous_cursor))
+        return page.paginator, page, rows, page.has_other_pages()
@@ -0,0 +1,5 @@
+"""IMDb scraper used to import movies, actors and directors."""
+from .cache import ResponseCache, CacheMiss
+from .client import ScraperClient, HostLimiter, TokenBucket, LatencyHistogram, get_client
+from .engine import ScrapeEngine, ScrapeResult
+from .jobs import claim_job, run_job
@@ -0,0 +1,46 @@
+"""Offline throughput benchmark for the scraper.
+
+The engine is run against a recorded corpus served by ``ReplayAdapter`` and
+the run is rolled back afterwards, so it can be repeated on the same database.
+"""
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from .client import ScraperClient
+from .engine import ScrapeEngine
+from .replay import DEFAULT_CORPUS, ReplayAdapter
+
+
+class Rollback(Exception):
+    pass
+
+
+def run_benchmark(corpus=DEFAULT_CORPUS, workers=None, latency=0.0, rate=10000):
+    """Import the corpus once and return a dict of timings and counts."""
+    client = ScraperClient(rate=rate, retries=0)
+    client.session.mount('https://', ReplayAdapter(corpus, latency))
+    engine = ScrapeEngine(max_workers=workers, cache=False, client=client)
+
+    try:
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            result = engine.run()
+            raise Rollback
+    except Rollback:
+        pass
+
+    titles = len(result.created) or 1
+    requests = sum(histogram.count for histogram in client.latency.values())
+    return {
+        'titles': len(result.created),
+        'failed': len(result.failed),
+        'elapsed': result.elapsed,
+        'titles_per_second': len(result.created) / result.elapsed if result.elapsed else 0.0,
+        'queries': len(queries),
+        'queries_per_title': len(queries) / titles,
+        'requests': requests,
+        'fetch_time': result.fetch_time,
+        'parse_time': result.parse_time,
+        'parse_time_per_title': result.parse_time / titles,
+        'store_time': result.store_time,
+        'latency': client.latency_report(),
+    }
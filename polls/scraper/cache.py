@@ -0,0 +1,141 @@
+"""On-disk cache for pages downloaded by the scraper.
+
+Every URL is stored as two files named after a hash of the URL: ``.body`` with
+the raw response and ``.json`` with the validators needed for revalidation.
+The body's mtime is bumped on every hit and the least recently used entries are
+removed once the directory grows past ``max_size`` bytes.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from time import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode for URLs that are not in the cache."""
+
+
+def cache_key(url):
+    """Hash of the URL without IMDb's ``ref_`` click tracking parameter."""
+    parts = urlsplit(url)
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query) if key != 'ref_'])
+    url = urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(self, directory, ttl=24 * 60 * 60, max_size=256 * 1024 * 1024, offline=False):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        key = cache_key(url)
+        return self.directory / f'{key}.body', self.directory / f'{key}.json'
+
+    def get(self, url):
+        """Return the cached entry for ``url`` as a dict, or None."""
+        body, meta = self._paths(url)
+        try:
+            entry = json.loads(meta.read_text())
+            entry['content'] = body.read_bytes()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return time() - entry['stored_at'] < self.ttl
+
+    def store(self, url, content, etag=None, last_modified=None):
+        self._write(self._paths(url)[0], content)
+        self._store_meta(url, etag, last_modified)
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += len(content)
+            if self._size > self.max_size:
+                self._evict()
+
+    def fetch(self, url, get):
+        """Return the body of ``url``, downloading it with ``get(url, headers)`` only when needed.
+
+        Stale entries are revalidated with If-None-Match/If-Modified-Since and
+        kept as they are when the server answers 304 Not Modified.
+        """
+        entry = self.get(url)
+        if entry and (self.offline or self.is_fresh(entry)):
+            self._touch(url)
+            return entry['content']
+        if self.offline:
+            raise CacheMiss(url)
+
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        response = get(url, headers=headers)
+        if response.status_code == 304 and entry:
+            self._store_meta(url, entry['etag'], entry['last_modified'])
+            self._touch(url)
+            return entry['content']
+        response.raise_for_status()
+        self.store(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content
+
+    def _store_meta(self, url, etag, last_modified):
+        self._write(self._paths(url)[1], json.dumps({
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored_at': time(),
+        }).encode())
+
+    def _touch(self, url):
+        try:
+            os.utime(self._paths(url)[0])
+        except OSError:
+            pass
+
+    def _write(self, path, data):
+        # Write to a temporary file first so readers in other threads never see half a page.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp, path)
+
+    def _entries(self):
+        entries = []
+        for body in self.directory.glob('*.body'):
+            try:
+                stat = body.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, body))
+        return entries
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, body in entries:
+            if self._size <= self.max_size:
+                break
+            for path in (body, body.with_suffix('.json')):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._size -= size
@@ -0,0 +1,145 @@
+"""HTTP client shared by every scraper fetch.
+
+One pooled ``requests.Session`` keeps connections to imdb.com alive between
+pages. Requests get connect/read timeouts, are retried with exponential
+backoff on connection errors, 429 and 5xx answers, are throttled by a token
+bucket and capped per host, and their latency is recorded per page kind.
+"""
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HostLimiter:
+    """Caps the number of requests in flight to any single host."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.limit))
+        with semaphore:
+            yield
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, with bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            sleep(wait)
+
+
+class LatencyHistogram:
+    """Counts of request latencies in fixed buckets (upper bounds in seconds)."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect_left(self.BUCKETS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        buckets = ', '.join(f'<={bound}s: {count}' for bound, count in zip(self.BUCKETS, self.counts) if count)
+        return f'{self.count} requests, {self.total:.2f}s total, {self.mean:.3f}s mean ({buckets})'
+
+
+def page_kind(url):
+    """Group IMDb URLs by page type: chart, title, releaseinfo or name."""
+    parts = urlsplit(url).path.strip('/').split('/')
+    if parts[0] == 'title' and parts[-1] == 'releaseinfo':
+        return 'releaseinfo'
+    return parts[0] or 'other'
+
+
+class ScraperClient:
+
+    def __init__(self, timeout=None, retries=None, backoff=None, rate=None, per_host_limit=None, pool_size=None):
+        self.timeout = timeout or settings.SCRAPER_TIMEOUT
+        self.bucket = TokenBucket(rate or settings.SCRAPER_RATE_LIMIT)
+        self.hosts = HostLimiter(per_host_limit or settings.SCRAPER_PER_HOST_LIMIT)
+        self.latency = {}
+        self._latency_lock = threading.Lock()
+
+        retry = Retry(
+            total=settings.SCRAPER_RETRIES if retries is None else retries,
+            backoff_factor=settings.SCRAPER_BACKOFF if backoff is None else backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET', 'HEAD'),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_size or settings.SCRAPER_MAX_WORKERS)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # The parsers expect English month names.
+        self.session.headers['Accept-Language'] = 'en-US,en;q=0.8'
+
+    def get(self, url, headers=None):
+        self.bucket.acquire()
+        with self.hosts.slot(url):
+            start = monotonic()
+            try:
+                return self.session.get(url, headers=headers, timeout=self.timeout)
+            finally:
+                self.histogram(page_kind(url)).observe(monotonic() - start)
+
+    def histogram(self, kind):
+        with self._latency_lock:
+            return self.latency.setdefault(kind, LatencyHistogram())
+
+    def latency_report(self):
+        return [f'{kind}: {histogram}' for kind, histogram in sorted(self.latency.items())]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process wide client, so every engine and worker thread shares one pool and rate limit."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ScraperClient()
+        return _client
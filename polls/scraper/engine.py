@@ -0,0 +1,287 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import time
+
+from django.conf import settings
+from django.db import transaction
+
+from polls import search
+from polls.models import Movie, Actor, Director, Language, MovieSeriesGenre
+from polls.stats import invalidate_catalog_stats
+from . import parsers
+from .cache import ResponseCache
+from .client import get_client
+from .resolver import EntityResolver
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeResult:
+    """Outcome of one engine run."""
+
+    def __init__(self):
+        self.total = 0
+        self.created = []
+        self.skipped = []
+        self.failed = []
+        # Wall time of each title task (fetch + parse), in seconds.
+        self.times = []
+        # Seconds spent downloading and parsing pages, summed over all worker threads.
+        self.fetch_time = 0.0
+        self.parse_time = 0.0
+        self.store_time = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def done(self):
+        """Number of chart entries fetched and parsed so far."""
+        return len(self.times)
+
+    @property
+    def seconds_per_title(self):
+        done = len(self.created)
+        return self.elapsed / done if done else 0.0
+
+
+class ScrapeEngine:
+    """Imports the IMDb Top chart using a bounded pool of fetch workers.
+
+    Title pages and name pages are downloaded and parsed concurrently through
+    the shared ``ScraperClient``, which rate limits and retries. Nothing is written
+    until every page has been fetched; the new rows are then stored in a single
+    transaction.
+    """
+
+    def __init__(self, max_workers=None, limit=None, cache=None, client=None):
+        """``cache`` defaults to the one configured in settings, pass False to disable it."""
+        self.max_workers = max_workers or settings.SCRAPER_MAX_WORKERS
+        self.client = client or get_client()
+        self.resolver = EntityResolver()
+        self._local = threading.local()
+        self.limit = limit
+        if cache is None and settings.SCRAPER_CACHE_DIR:
+            cache = ResponseCache(
+                settings.SCRAPER_CACHE_DIR,
+                ttl=settings.SCRAPER_CACHE_TTL,
+                max_size=settings.SCRAPER_CACHE_MAX_SIZE,
+                offline=settings.SCRAPER_OFFLINE,
+            )
+        self.cache = cache
+
+    def fetch(self, url):
+        start = time()
+        try:
+            if self.cache:
+                return self.cache.fetch(url, self.get)
+            # An error page left after the client's retries must not be parsed as the real one.
+            response = self.get(url)
+            response.raise_for_status()
+            return response.content
+        finally:
+            # Per thread, so _timed can tell fetching from parsing even when a parser fetches another page.
+            self._local.fetch_time = getattr(self._local, 'fetch_time', 0.0) + time() - start
+
+    def get(self, url, headers=None):
+        return self.client.get(url, headers=headers)
+
+    def run(self, progress=None):
+        """Import the chart and return a ``ScrapeResult``.
+
+        Chart entries whose IMDb id is already stored are skipped before any of
+        their pages is downloaded. ``progress`` is called with the result after
+        the chart is read, after every title and name page and before the rows
+        are stored, always from the calling thread.
+        """
+        start = time()
+        result = ScrapeResult()
+        chart = parsers.chart_scraping(self.fetch(parsers.CHART_URL))
+        known = self.resolver.known(Movie, [parsers.imdb_id(url) for url in chart], field='imdb_id')
+        urls = []
+        for url in chart:
+            if parsers.imdb_id(url) in known:
+                result.skipped.append(parsers.imdb_id(url))
+            else:
+                urls.append(url)
+        if self.limit:
+            urls = urls[:self.limit]
+        result.total = len(urls)
+        if progress:
+            progress(result)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._scrape_title, url): url for url in urls}
+            pages = {}
+            for future in as_completed(futures):
+                url = futures[future]
+                title, error, fetch_time, parse_time = future.result()
+                result.fetch_time += fetch_time
+                result.parse_time += parse_time
+                if error:
+                    result.failed.append((url, error))
+                else:
+                    title['imdb_id'] = parsers.imdb_id(url)
+                    result.times.append(fetch_time + parse_time)
+                    pages[url] = title
+                if progress:
+                    progress(result)
+            titles = self._adopt_titles(result, [pages[url] for url in urls if url in pages])
+            people = self._scrape_people(pool, titles, result, progress)
+
+        if progress:
+            progress(result)
+        stored = time()
+        self.store(titles, people)
+        # bulk_create sends no post_save signals, the search index is updated by store().
+        invalidate_catalog_stats()
+        result.store_time = time() - stored
+        result.created = [title['title'] for title in titles]
+        result.elapsed = time() - start
+        return result
+
+    def _timed(self, parse, url):
+        """Fetch and parse ``url``, returning (data, error, fetch seconds, parse seconds)."""
+        start = time()
+        fetched = getattr(self._local, 'fetch_time', 0.0)
+        data = error = None
+        try:
+            data = parse(self.fetch(url))
+        except Exception as exception:
+            logger.warning("Could not scrape %s: %r", url, exception)
+            error = exception
+        fetch_time = getattr(self._local, 'fetch_time', 0.0) - fetched
+        return data, error, fetch_time, time() - start - fetch_time
+
+    def _scrape_title(self, url):
+        return self._timed(lambda content: parsers.title_scraping(content, self.fetch), url)
+
+    def _scrape_person(self, url):
+        return self._timed(parsers.person_scraping, url)
+
+    def _adopt(self, model, field, ids_by_name):
+        """Give rows stored before IMDb ids were tracked the id matching their name.
+
+        Returns the ids that were adopted. This only costs an UPDATE the first
+        time an old row is seen again.
+        """
+        adopted = set()
+        rows = model.objects.filter(imdb_id__isnull=True, **{f'{field}__in': ids_by_name})
+        for name, pk in rows.values_list(field, 'pk'):
+            if ids_by_name[name] not in adopted:
+                model.objects.filter(pk=pk).update(imdb_id=ids_by_name[name])
+                adopted.add(ids_by_name[name])
+        if adopted:
+            self.resolver.known(model, adopted, field='imdb_id')
+        return adopted
+
+    def _adopt_titles(self, result, scraped):
+        """Drop scraped titles that match an old row by title, recording their id on it."""
+        adopted = self._adopt(Movie, 'title', {title['title']: title['imdb_id'] for title in scraped})
+        titles = []
+        for title in scraped:
+            if title['imdb_id'] in adopted:
+                result.skipped.append(title['imdb_id'])
+            else:
+                titles.append(title)
+        return titles
+
+    def _scrape_people(self, pool, titles, result, progress=None):
+        """Fetch the name pages of every actor and director not stored yet, calling ``progress`` after each."""
+        urls = []
+        for model, key in ((Actor, 'actors'), (Director, 'directors')):
+            people = {person_id: (name, url) for title in titles for person_id, name, url in title[key]}
+            known = self.resolver.known(model, people, field='imdb_id')
+            unknown = {name: person_id for person_id, (name, url) in people.items() if person_id not in known}
+            known |= self._adopt(model, 'full_name', unknown)
+            urls.extend(url for person_id, (name, url) in people.items()
+                        if person_id not in known and url not in urls)
+        futures = {pool.submit(self._scrape_person, url): url for url in urls}
+        people = {}
+        for future in as_completed(futures):
+            details, _, fetch_time, parse_time = future.result()
+            result.fetch_time += fetch_time
+            result.parse_time += parse_time
+            people[futures[future]] = details
+            if progress:
+                progress(result)
+        return people
+
+    @transaction.atomic
+    def store(self, titles, people):
+        """Insert the scraped titles with a fixed number of queries per batch."""
+        if not titles:
+            return
+        by_id = {title['imdb_id']: title for title in titles}
+        credits = {person_id: (name, people.get(url)) for title in titles for key in ('actors', 'directors')
+                   for person_id, name, url in title[key]}
+        # New rows, for the search index.
+        built = {Movie: [], Director: [], Actor: []}
+
+        def built_by(build):
+            def wrapper(key):
+                instance = build(key)
+                if instance is not None:
+                    built[type(instance)].append(instance)
+                return instance
+            return wrapper
+
+        def build_actor(person_id):
+            name, details = credits[person_id]
+            if details is None:
+                # The name page failed to download, don't store a half-empty person.
+                return None
+            return Actor(
+                full_name=name,
+                imdb_id=person_id,
+                specialisation=details['specialisation'],
+                date_of_birth=details['date_of_birth'],
+                date_of_death=details['date_of_death'],
+                Verified=True
+            )
+
+        def build_director(person_id):
+            name, details = credits[person_id]
+            if details is None:
+                return None
+            # to jest do zmiany
+            return Director(
+                full_name=name,
+                imdb_id=person_id,
+                date_of_birth=details['date_of_birth'],
+                date_of_death=details['date_of_death'],
+                Verified=True,
+                amount_of_films=10
+            )
+
+        def build_movie(title_id):
+            return Movie(
+                title=by_id[title_id]['title'],
+                imdb_id=title_id,
+                date_of_release=by_id[title_id]['date_of_release'],
+                running_time=by_id[title_id]['running_time'],
+                summary=by_id[title_id]['summary'],
+                Verified=True
+            )
+
+        resolve = self.resolver.resolve
+        languages = resolve(Language, [name for title in titles for name in title['languages']])
+        genres = resolve(MovieSeriesGenre, [name for title in titles for name in title['genres']])
+        directors = resolve(Director, [person_id for title in titles for person_id, _, _ in title['directors']],
+                            field='imdb_id', build=built_by(build_director))
+        actors = resolve(Actor, [person_id for title in titles for person_id, _, _ in title['actors']],
+                         field='imdb_id', build=built_by(build_actor))
+        movies = resolve(Movie, list(by_id), field='imdb_id', build=built_by(build_movie))
+
+        for field, key, pks in ((Movie.language.field, 'languages', languages),
+                                (Movie.genre.field, 'genres', genres)):
+            self.resolver.link(field, [(movies[title['imdb_id']], pks[name])
+                                       for title in titles for name in title[key]])
+        for field, key, pks in ((Movie.director.field, 'directors', directors),
+                                (Movie.actors.field, 'actors', actors)):
+            self.resolver.link(field, [(movies[title['imdb_id']], pks[person_id])
+                                       for title in titles for person_id, _, _ in title[key] if person_id in pks])
+        for model, pks in ((Movie, movies), (Director, directors), (Actor, actors)):
+            # The backend may not have set the pks of the new instances.
+            for instance in built[model]:
+                instance.pk = pks[instance.imdb_id]
+            search.index_objects(model, built[model])
@@ -0,0 +1,79 @@
+"""Database backed queue for scrape jobs.
+
+Jobs are claimed with a conditional UPDATE, so several workers can share one
+queue on SQLite or Postgres without a broker or row locks. A running job
+records a heartbeat with every title and name page and before it stores its
+rows; one whose worker died stops beating and is claimed again after
+``SCRAPE_JOB_TIMEOUT`` seconds.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from polls.models import ScrapeJob
+from .engine import ScrapeEngine
+
+logger = logging.getLogger(__name__)
+
+
+def claimable():
+    """Queued jobs, and running jobs whose worker has not been heard from for ``SCRAPE_JOB_TIMEOUT`` seconds."""
+    silent_since = timezone.now() - timedelta(seconds=settings.SCRAPE_JOB_TIMEOUT)
+    return Q(status='q') | Q(status='r', heartbeat_at__lt=silent_since)
+
+
+def claim_job(worker):
+    """Mark the oldest claimable job as running and return it, or None if there is none.
+
+    A job taken back from a dead worker starts again from the chart, the titles it stored are skipped.
+    """
+    candidates = ScrapeJob.objects.filter(claimable()).order_by('created_at').values_list('pk', flat=True)
+    for pk in candidates[:10]:
+        now = timezone.now()
+        claimed = ScrapeJob.objects.filter(claimable(), pk=pk).update(
+            status='r', worker=worker, started_at=now, heartbeat_at=now)
+        if claimed:
+            return ScrapeJob.objects.get(pk=pk)
+    return None
+
+
+def run_job(job, engine=None):
+    """Run a claimed job, recording progress on the row as titles complete.
+
+    Nothing is written once the job has been cancelled or claimed by another worker.
+    """
+    engine = engine or ScrapeEngine(limit=job.limit)
+    owned = ScrapeJob.objects.filter(pk=job.pk, status='r', worker=job.worker)
+
+    def progress(result):
+        owned.update(
+            titles_total=result.total,
+            titles_done=result.done,
+            titles_failed=len(result.failed),
+            titles_skipped=len(result.skipped),
+            heartbeat_at=timezone.now(),
+        )
+
+    try:
+        result = engine.run(progress=progress)
+    except Exception as error:
+        logger.exception("Scrape job %s failed", job.pk)
+        if not owned.exists():
+            return job
+        job.refresh_from_db()
+        job.status = 'f'
+        job.error = repr(error)
+    else:
+        if not owned.exists():
+            logger.warning("Scrape job %s was taken over or cancelled, its result is dropped", job.pk)
+            return job
+        job.refresh_from_db()
+        job.status = 'd'
+        job.titles_created = len(result.created)
+        job.titles_skipped = len(result.skipped)
+    job.finished_at = timezone.now()
+    job.save()
+    return job
@@ -0,0 +1,275 @@
+"""Parsers turning fetched IMDb pages into plain Python data.
+
+Nothing in here touches the network or the database, so the functions can run
+inside the engine's worker threads.
+
+Pages are never parsed whole. The JSON-LD and ``__NEXT_DATA__`` payloads that
+IMDb embeds are cut out of the raw HTML and decoded directly; only fields
+missing from them are read from the markup, and then through a
+``SoupStrainer`` that keeps just the elements we need. Elements are located by
+their ``data-testid``/``id`` attributes rather than generated class names.
+"""
+import html
+import json
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+IMDB_URL = "https://www.imdb.com"
+CHART_URL = IMDB_URL + "/chart/top"
+
+IMDB_ID = re.compile(r'/((?:tt|nm)\d+)')
+JSON_LD = re.compile(rb'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+NEXT_DATA = re.compile(rb'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+DURATION = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?')
+
+MONTHS = {"January": "01", "February": "02", "March": "03", "April": "04", "May": "05", "June": "06", "July": "07",
+          "August": "08", "September": "09", "October": "10", "November": "11", "December": "12"}
+
+CHART_ROWS = SoupStrainer('td', class_='posterColumn')
+TITLE_REGIONS = SoupStrainer(attrs={'data-testid': [
+    'hero-title-block__title', 'hero-title-block__metadata', 'genres', 'plot', 'title-pc-principal-credit',
+    'title-cast-item', 'title-details-releasedate', 'title-details-languages',
+]})
+PERSON_REGIONS = SoupStrainer(id=['name-overview-widget', 'name-born-info', 'name-death-info'])
+RELEASE_DATES = SoupStrainer('td', class_='release-date-item__date')
+
+
+def imdb_id(url):
+    """Return the title (``tt...``) or name (``nm...``) id in an IMDb URL."""
+    match = IMDB_ID.search(url)
+    return match.group(1) if match else None
+
+
+def credit(link):
+    """(imdb id, name, url) of a link to a name page."""
+    url = IMDB_URL + link['href']
+    return imdb_id(url), link.text, url
+
+
+def _as_bytes(content):
+    return content.encode() if isinstance(content, str) else content
+
+
+def json_ld(content):
+    """The first JSON-LD object embedded in the page, or an empty dict."""
+    match = JSON_LD.search(_as_bytes(content))
+    if not match:
+        return {}
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return {}
+
+
+def next_data(content):
+    """``props.pageProps`` of the page's ``__NEXT_DATA__`` payload, or an empty dict."""
+    match = NEXT_DATA.search(_as_bytes(content))
+    if not match:
+        return {}
+    try:
+        return dig(json.loads(match.group(1)), 'props', 'pageProps') or {}
+    except ValueError:
+        return {}
+
+
+def dig(data, *keys):
+    """Follow ``keys`` through nested dicts, returning None at the first gap."""
+    for key in keys:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _text(value):
+    return html.unescape(value) if isinstance(value, str) else value
+
+
+def _list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def get_date_actor_director(date_of_birth, date_of_death):
+    birth = [1, 1, 1]
+    if date_of_birth:
+        if date_of_birth.time:
+            date_of_birth = date_of_birth.time['datetime']
+            birth = date_of_birth.split("-")
+        else:
+            date_of_birth = None
+    if not date_of_birth or birth[0] == '0' or birth[1] == '0' or birth[2] == '0':
+        date_of_birth = None
+
+    death = [1, 1, 1]
+    if date_of_death:
+        if date_of_death.time:
+            date_of_death = date_of_death.time['datetime']
+            death = date_of_death.split("-")
+        else:
+            date_of_birth = None
+    if not date_of_death or birth[0] == '0' or death[1] == '0' or death[2] == '0':
+        date_of_death = None
+    return date_of_birth, date_of_death
+
+
+def chart_scraping(content):
+    """Return the title page URLs listed on the Top chart."""
+    items = json_ld(content).get('itemListElement')
+    if items:
+        return [IMDB_URL + '/title/{0}/'.format(imdb_id(dig(item, 'item', 'url'))) for item in items]
+    soup = BeautifulSoup(content, "lxml", parse_only=CHART_ROWS)
+    return [IMDB_URL + td.a['href'] for td in soup.find_all('td')]
+
+
+def actors_scraping(movie):
+    """Return (imdb id, name, url) for the cast of a title."""
+    actors = []
+    for actor_div in movie.find_all(attrs={'data-testid': 'title-cast-item'}):
+        actors.append(credit(actor_div.find('a', attrs={'data-testid': 'title-cast-item__actor'})))
+    return actors
+
+
+def directors_scraping(movie):
+    """Return (imdb id, name, url) for the directors of a title."""
+    # The first principal credit row lists the directors.
+    directors = movie.find(attrs={'data-testid': 'title-pc-principal-credit'})
+    return [credit(link) for link in directors.find_all('a', href=IMDB_ID)]
+
+
+def language_scraping(movie):
+    language = movie.find(attrs={'data-testid': 'title-details-languages'})
+    return [li.a.text for li in language.div.ul.find_all('li')]
+
+
+def movie_genres_scraping(movie):
+    genres = movie.find(attrs={'data-testid': 'genres'})
+    return [li.text for li in genres.find_all('li')]
+
+
+def running_time_scraping(movie):
+    metadata = movie.find(attrs={'data-testid': 'hero-title-block__metadata'})
+    # Year, certificate and runtime; titles without a certificate only have two entries.
+    return metadata.find_all('li')[-1].text
+
+
+def release_info_scraping(content):
+    """Return the first complete release date on a release info page."""
+    soup = BeautifulSoup(content, "lxml", parse_only=RELEASE_DATES)
+    for td in soup.find_all('td'):
+        date = td.text.replace("  ", "").split(" ")
+        if len(date) == 3:
+            return date[2] + "-" + MONTHS[date[1]] + "-" + date[0]
+    raise ValueError('No complete release date')
+
+
+def date_scraping(movie, fetch):
+    """Return the release date of a title as YYYY-MM-DD.
+
+    When the title page only shows a partial date the release info page is
+    downloaded with ``fetch``.
+    """
+    date = movie.find(attrs={'data-testid': 'title-details-releasedate'})
+    link = date.div.ul.li.a
+    release_date = link.text.split(" (", 1)[0].replace(",", "").split()
+    if len(release_date) == 3:
+        return release_date[2] + "-" + MONTHS[release_date[0]] + "-" + release_date[1]
+    return release_info_scraping(fetch(IMDB_URL + link['href']))
+
+
+def running_time(duration):
+    """Turn an ISO 8601 duration such as ``PT2H22M`` into the ``2h 22m`` shown on the site."""
+    match = DURATION.fullmatch(duration or '')
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes = match.groups()
+    return ' '.join(part for part in (hours and f'{int(hours)}h', minutes and f'{int(minutes)}m') if part)
+
+
+def _people(entries):
+    people = []
+    for entry in _list(entries):
+        url = urljoin(IMDB_URL, entry.get('url', ''))
+        if imdb_id(url):
+            people.append((imdb_id(url), _text(entry.get('name')), url))
+    return people
+
+
+def structured_title(content):
+    """Fields of a title page that its embedded JSON payloads provide."""
+    data = json_ld(content)
+    page = next_data(content)
+    title = {}
+    if data.get('name'):
+        title['title'] = _text(data['name'])
+    if data.get('datePublished'):
+        title['date_of_release'] = data['datePublished']
+    if running_time(data.get('duration')):
+        title['running_time'] = running_time(data['duration'])
+    if data.get('description'):
+        title['summary'] = _text(data['description'])
+    if data.get('genre'):
+        title['genres'] = [_text(genre) for genre in _list(data['genre'])]
+    if _people(data.get('director')):
+        title['directors'] = _people(data['director'])
+
+    languages = dig(page, 'mainColumnData', 'spokenLanguages', 'spokenLanguages')
+    if languages:
+        title['languages'] = [language['text'] for language in languages]
+    # JSON-LD only names the top billed actors, __NEXT_DATA__ has the whole cast.
+    cast = dig(page, 'mainColumnData', 'cast', 'edges')
+    if cast:
+        title['actors'] = [(dig(edge, 'node', 'name', 'id'), dig(edge, 'node', 'name', 'nameText', 'text'),
+                            IMDB_URL + '/name/{0}/'.format(dig(edge, 'node', 'name', 'id'))) for edge in cast]
+    elif _people(data.get('actor')):
+        title['actors'] = _people(data['actor'])
+    return title
+
+
+def title_scraping(content, fetch):
+    """Parse a title page into a dict of the fields stored on ``Movie``."""
+    title = structured_title(content)
+    fallbacks = {
+        'title': lambda movie: movie.find(attrs={'data-testid': 'hero-title-block__title'}).text,
+        'date_of_release': lambda movie: date_scraping(movie, fetch),
+        'running_time': running_time_scraping,
+        'summary': lambda movie: movie.find(attrs={'data-testid': 'plot'}).span.text,
+        'languages': language_scraping,
+        'genres': movie_genres_scraping,
+        'directors': directors_scraping,
+        'actors': actors_scraping,
+    }
+    missing = [key for key in fallbacks if key not in title]
+    if missing:
+        movie = BeautifulSoup(content, "lxml", parse_only=TITLE_REGIONS)
+        for key in missing:
+            title[key] = fallbacks[key](movie)
+    return title
+
+
+def person_scraping(content):
+    """Parse a name page into the fields stored on ``Actor``/``Director``."""
+    data = json_ld(content)
+    if data.get('@type') == 'Person':
+        job_titles = _list(data.get('jobTitle'))
+        return {
+            'specialisation': job_titles[0] if job_titles else '',
+            'date_of_birth': data.get('birthDate'),
+            'date_of_death': data.get('deathDate'),
+        }
+
+    soup = BeautifulSoup(content, "lxml", parse_only=PERSON_REGIONS)
+    person = soup.find(id='name-overview-widget')
+    specialisation = person.find_all('span', attrs={'class': 'itemprop'})
+    specialisation = specialisation[1].text.replace('\n', '') if len(specialisation) > 1 else ''
+    date_of_birth = soup.find(id='name-born-info')
+    date_of_death = soup.find(id='name-death-info')
+    date_of_birth, date_of_death = get_date_actor_director(date_of_birth, date_of_death)
+    return {
+        'specialisation': specialisation,
+        'date_of_birth': date_of_birth,
+        'date_of_death': date_of_death,
+    }
@@ -0,0 +1,73 @@
+"""Serve recorded IMDb pages to the scraper instead of imdb.com.
+
+A corpus is a directory of HTML files named after the page they were saved
+from: ``chart_top.html``, ``title_<tt id>.html``, ``releaseinfo_<tt id>.html``
+and ``name_<nm id>.html``. ``ReplayAdapter`` is a requests transport adapter,
+so mounting it on the ``ScraperClient`` session replays the corpus through the
+real client (pool, retries, rate limit and latency histograms included).
+"""
+from pathlib import Path
+from time import sleep
+from urllib.parse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+
+from .parsers import IMDB_URL
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'imdb'
+
+
+def page_name(url):
+    """File name of the recorded copy of ``url``."""
+    parts = urlsplit(url).path.strip('/').split('/')
+    if parts == ['chart', 'top']:
+        return 'chart_top.html'
+    if parts[0] == 'title' and parts[-1] == 'releaseinfo':
+        return 'releaseinfo_{0}.html'.format(parts[1])
+    return '{0}_{1}.html'.format(parts[0], parts[1])
+
+
+def page_url(name):
+    """URL a recorded file was saved from, the inverse of ``page_name``."""
+    kind, _, key = Path(name).stem.partition('_')
+    if kind == 'chart':
+        return IMDB_URL + '/chart/top'
+    if kind == 'releaseinfo':
+        return IMDB_URL + '/title/{0}/releaseinfo'.format(key)
+    return IMDB_URL + '/{0}/{1}/'.format(kind, key)
+
+
+def corpus_urls(corpus=DEFAULT_CORPUS):
+    return [page_url(path.name) for path in sorted(Path(corpus).glob('*.html'))]
+
+
+def read_page(url, corpus=DEFAULT_CORPUS):
+    return (Path(corpus) / page_name(url)).read_bytes()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answers requests from a corpus, optionally after ``latency`` seconds to mimic the network."""
+
+    def __init__(self, corpus=DEFAULT_CORPUS, latency=0.0):
+        super().__init__()
+        self.corpus = Path(corpus)
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            sleep(self.latency)
+        response = Response()
+        response.request = request
+        response.url = request.url
+        try:
+            response._content = read_page(request.url, self.corpus)
+            response.status_code = 200
+            response.headers['Content-Type'] = 'text/html;charset=UTF-8'
+        except (OSError, IndexError):
+            response._content = b''
+            response.status_code = 404
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,62 @@
+"""Set based lookup of scraped names.
+
+The resolver turns names into primary keys with one ``__in`` query per model,
+creates whatever is missing with ``bulk_create`` and remembers every name it
+has seen, so a whole import job only asks the database about each name once.
+"""
+
+
+class EntityResolver:
+
+    def __init__(self):
+        self._pks = {}
+
+    def _cache(self, model, field):
+        return self._pks.setdefault((model, field), {})
+
+    def known(self, model, names, field='name'):
+        """Return the subset of ``names`` that already has a row."""
+        cache = self._cache(model, field)
+        missing = {name for name in names if name not in cache}
+        if missing:
+            for name, pk in model.objects.filter(**{f'{field}__in': missing}).order_by().values_list(field, 'pk'):
+                cache.setdefault(name, pk)
+        return {name for name in names if name in cache}
+
+    def resolve(self, model, names, field='name', build=None):
+        """Map every name to a pk, inserting rows for the unknown ones.
+
+        ``build(name)`` returns the unsaved instance to insert, or None to skip
+        the name. By default only ``field`` is filled in.
+        """
+        names = list(dict.fromkeys(names))
+        cache = self._cache(model, field)
+        known = self.known(model, names, field)
+
+        new = []
+        for name in names:
+            if name in known:
+                continue
+            instance = build(name) if build else model(**{field: name})
+            if instance is not None:
+                new.append(instance)
+        if new:
+            model.objects.bulk_create(new)
+            if any(instance.pk is None for instance in new):
+                # The backend can't return ids from a bulk insert, read them back.
+                created = [getattr(instance, field) for instance in new]
+                cache.update(model.objects.filter(**{f'{field}__in': created}).order_by().values_list(field, 'pk'))
+            else:
+                cache.update((getattr(instance, field), instance.pk) for instance in new)
+        return {name: cache[name] for name in names if name in cache}
+
+    @staticmethod
+    def link(field, pairs):
+        """Insert (source pk, target pk) rows into the through table of a ManyToManyField."""
+        through = field.remote_field.through
+        source = field.m2m_field_name() + '_id'
+        target = field.m2m_reverse_field_name() + '_id'
+        through.objects.bulk_create(
+            [through(**{source: source_pk, target: target_pk}) for source_pk, target_pk in dict.fromkeys(pairs)],
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,149 @@
+"""Full-text search over the catalogue.
+
+On PostgreSQL every searched model has a GIN index on ``search_vector()`` of
+its fields, which the database keeps up to date, and each model is searched
+with one ranked query. On SQLite the same documents are copied into the FTS5 table
+``polls_search``, kept in sync by ``polls.signals`` and ``ScrapeEngine.store``,
+and everything is searched with a single query. Both are created by migration
+0007. Other databases fall back to ``icontains``.
+
+Movies, series, games and people waiting for a superuser to verify them are
+never found: PostgreSQL and the fallback only query verified rows, and only
+verified rows are copied into the SQLite table.
+"""
+import heapq
+from collections import namedtuple
+
+from django.db import connection
+from django.urls import reverse
+
+from .models import Book, Author, Movie, Series, Game, Actor, Director
+
+FTS_TABLE = 'polls_search'
+SEARCH_CONFIG = 'english'
+
+# kind, model, fields the result is named after (weight A), other searched fields (weight B)
+SEARCHED = (
+    ('book', Book, ('title',), ('summary',)),
+    ('author', Author, ('first_name', 'last_name'), ()),
+    ('movie', Movie, ('title',), ('summary',)),
+    ('series', Series, ('title',), ('summary',)),
+    ('game', Game, ('title',), ('summary',)),
+    ('actor', Actor, ('full_name',), ()),
+    ('director', Director, ('full_name',), ()),
+)
+KINDS = {model: (kind, names, body) for kind, model, names, body in SEARCHED}
+# Models only shown once a superuser has set their ``Verified`` flag.
+MODERATED = {Movie, Series, Game, Actor, Director}
+KIND_IDS = {kind: number for number, (kind, _, _, _) in enumerate(SEARCHED)}
+
+
+class SearchHit(namedtuple('SearchHit', 'kind pk title rank')):
+    """One search result, ``rank`` is higher for better matches."""
+
+    def get_absolute_url(self):
+        return reverse(f'{self.kind}-detail', args=[self.pk])
+
+
+def search_vector(names, body):
+    """The document indexed on PostgreSQL, the query must use exactly the same expression."""
+    from django.contrib.postgres.search import SearchVector
+
+    vector = SearchVector(*names, config=SEARCH_CONFIG, weight='A')
+    if body:
+        vector = vector + SearchVector(*body, config=SEARCH_CONFIG, weight='B')
+    return vector
+
+
+def searchable(model):
+    """The rows of ``model`` anyone may find."""
+    return model.objects.verified() if model in MODERATED else model.objects.all()
+
+
+def index_name(model):
+    return f'{model._meta.db_table}_search_idx'
+
+
+def fts_query(text):
+    """Quote every word of ``text`` as an FTS5 prefix term, so user input is never parsed as syntax."""
+    return ' '.join('"{0}"*'.format(word.replace('"', '""')) for word in text.split())
+
+
+def search(text, limit=10, offset=0):
+    """Return up to ``limit`` ``SearchHit``s for ``text``, best first."""
+    if not text.split():
+        return []
+    if connection.vendor == 'postgresql':
+        return _search_postgres(text, limit, offset)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(text, limit, offset)
+    return _search_fallback(text, limit, offset)
+
+
+def _search_postgres(text, limit, offset):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    hits = []
+    for kind, model, names, body in SEARCHED:
+        vector = search_vector(names, body)
+        rows = (searchable(model).annotate(document=vector, rank=SearchRank(vector, query))
+                .filter(document=query).order_by('-rank', 'pk')
+                .values_list('pk', 'rank', *names)[:offset + limit])
+        hits.append([SearchHit(kind, pk, ' '.join(filter(None, label)), rank) for pk, rank, *label in rows])
+    return list(heapq.merge(*hits, key=lambda hit: -hit.rank))[offset:offset + limit]
+
+
+def _search_sqlite(text, limit, offset):
+    with connection.cursor() as cursor:
+        # bm25() is lower for better matches. Names count ten times as much as the rest.
+        cursor.execute(
+            f'SELECT kind, object_id, title, -bm25({FTS_TABLE}, 0, 0, 10.0, 1.0) AS rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s ORDER BY rank DESC LIMIT %s OFFSET %s',
+            [fts_query(text), limit, offset])
+        return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+def _search_fallback(text, limit, offset):
+    from django.db.models import Q
+
+    hits = []
+    for kind, model, names, body in SEARCHED:
+        condition = Q()
+        for field in names + body:
+            condition |= Q(**{f'{field}__icontains': text})
+        rows = searchable(model).filter(condition).order_by('pk').values_list('pk', *names)[:offset + limit]
+        hits.extend(SearchHit(kind, pk, ' '.join(filter(None, label)), 0.0) for pk, *label in rows)
+    return hits[offset:offset + limit]
+
+
+def fts_rowid(kind, pk):
+    """FTS5 can't seek on its other columns, so rows are keyed on the object's pk and kind."""
+    return pk * len(SEARCHED) + KIND_IDS[kind]
+
+
+def index_objects(model, instances):
+    """Store the SQLite documents of ``instances``, replacing older copies. Unverified ones are removed."""
+    if connection.vendor != 'sqlite' or model not in KINDS:
+        return
+    kind, names, body = KINDS[model]
+    rows = []
+    hidden = []
+    for instance in instances:
+        if model in MODERATED and not instance.Verified:
+            hidden.append((fts_rowid(kind, instance.pk),))
+            continue
+        title = ' '.join(filter(None, (getattr(instance, field) for field in names)))
+        rows.append((fts_rowid(kind, instance.pk), kind, instance.pk, title,
+                     ' '.join(filter(None, (getattr(instance, field) for field in body)))))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, kind, object_id, title, body) '
+                           f'VALUES (%s, %s, %s, %s, %s)', rows)
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', hidden)
+
+
+def remove_from_index(model, pk):
+    if connection.vendor != 'sqlite' or model not in KINDS:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [fts_rowid(KINDS[model][0], pk)])
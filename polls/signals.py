@@ -1,8 +1,14 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed, post_migrate
 from django.dispatch import receiver
 
+from . import autocomplete, detail_cache, search
 from .models import Profile
+from .stats import COUNTED_MODELS, invalidate_catalog_stats
 
 
 @receiver(post_save, sender=User)
@@ -12,5 +18,101 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+def save_user_profile(sender, instance, created, **kwargs):
+    # Only a profile already loaded through the user can have been changed with it. Logins save last_login
+    # and never load it, and Profile.save() writes nothing if no field changed.
+    if not created and User.profile.is_cached(instance):
+        instance.profile.save()
+
+
+def recount_likes(profile_pks):
+    likes = (Profile.likes.through.objects.filter(profile_id=OuterRef('pk')).order_by()
+             .values('profile_id').annotate(count=Count('pk')).values('count'))
+    Profile.objects.filter(pk__in=profile_pks).update(likes_count=Coalesce(Subquery(likes), 0))
+
+
+@receiver(m2m_changed, sender=Profile.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    # Likes changed through the relation manager (e.g. in the admin) rather than Profile.like().
+    if reverse and action == 'pre_clear':
+        instance._liked_profiles = list(sender.objects.filter(user_id=instance.pk).values_list('profile_id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recount_likes([instance.pk])
+        elif action == 'post_clear':
+            recount_likes(instance.__dict__.pop('_liked_profiles', []))
+        else:
+            recount_likes(pk_set)
+
+
+@receiver(pre_delete, sender=User)
+def forget_likes(sender, instance, **kwargs):
+    # The user's likes are deleted by the database cascade, which sends no signals. A count that drifted
+    # to 0 stays there rather than breaking the CHECK constraint and with it the deletion.
+    Profile.objects.filter(likes=instance, likes_count__gt=0).update(likes_count=F('likes_count') - 1)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def reset_catalog_stats(sender, **kwargs):
+    if sender in COUNTED_MODELS:
+        invalidate_catalog_stats()
+
+
+@receiver(post_save)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if sender not in search.KINDS:
+        return
+    _, names, body = search.KINDS[sender]
+    # Verifying a row makes it searchable, unverifying it hides it again.
+    if update_fields is None or set(update_fields) & {*names, *body, 'Verified'}:
+        search.index_objects(sender, [instance])
+
+
+@receiver(post_delete)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_from_index(sender, instance.pk)
+
+
+@receiver(pre_save)
+@receiver(pre_delete)
+def remember_detail_pages(sender, instance, **kwargs):
+    # Pages showing the row as it was, e.g. the developer a game is moved away from.
+    if sender in detail_cache.TRACKED_MODELS and instance.pk is not None:
+        instance._detail_pages = detail_cache.pages_showing(instance)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def touch_detail_pages(sender, instance, **kwargs):
+    if sender in detail_cache.TRACKED_MODELS:
+        pages = instance.__dict__.pop('_detail_pages', set()) | detail_cache.pages_showing(instance)
+        # The row's own updated_at was just set by the save, or the row is gone.
+        detail_cache.touch(pages - {(sender, instance.pk)})
+
+
+@receiver(m2m_changed)
+def touch_linked_detail_pages(sender, instance, action, model, pk_set, **kwargs):
+    if type(instance) not in detail_cache.PAGE_MODELS and model not in detail_cache.PAGE_MODELS:
+        return
+    if action in ('post_add', 'post_remove'):
+        detail_cache.touch(detail_cache.linked_pages(sender, instance, model, pk_set))
+    elif action == 'pre_clear':
+        instance._linked_detail_pages = detail_cache.linked_pages(sender, instance, model)
+    elif action == 'post_clear':
+        detail_cache.touch(instance.__dict__.pop('_linked_detail_pages', set()))
+
+
+@receiver(post_migrate)
+def restore_prefix_indexes(sender, using, **kwargs):
+    # A migration that rebuilds a table on SQLite drops the raw SQL indexes of migration 0008.
+    if sender.name != 'polls':
+        return
+    connection = connections[using]
+    if ('polls', '0008_autocomplete_indexes') not in MigrationRecorder(connection).applied_migrations():
+        return
+    with connection.cursor() as cursor:
+        for model, field in autocomplete.AUTOCOMPLETE.values():
+            sql = autocomplete.prefix_index_sql(connection.vendor, model, field)
+            if sql:
+                cursor.execute(sql)
@@ -0,0 +1,76 @@
+// Typeahead for the AutocompleteSelect widgets: the <select> only holds the chosen
+// options, new ones are looked up by prefix and added as they are picked.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control';
+        input.placeholder = 'Type to search';
+        input.setAttribute('autocomplete', 'off');
+        var results = document.createElement('ul');
+        results.className = 'list-group';
+        select.parentNode.insertBefore(input, select);
+        select.parentNode.insertBefore(results, select);
+
+        var timer = null;
+        var request = 0;
+
+        function choose(item) {
+            var option = Array.prototype.find.call(select.options, function (option) {
+                return option.value === String(item.id);
+            });
+            if (!option) {
+                option = new Option(item.text, item.id);
+                if (!select.multiple) {
+                    // Keep the empty choice, drop the previous one.
+                    Array.prototype.slice.call(select.options).forEach(function (old) {
+                        if (old.value) {
+                            old.remove();
+                        }
+                    });
+                }
+                select.add(option);
+            }
+            option.selected = true;
+            input.value = '';
+            results.innerHTML = '';
+        }
+
+        function show(items) {
+            results.innerHTML = '';
+            items.forEach(function (item) {
+                var li = document.createElement('li');
+                li.className = 'list-group-item list-group-item-action';
+                li.textContent = item.text;
+                li.addEventListener('mousedown', function (event) {
+                    event.preventDefault();
+                    choose(item);
+                });
+                results.appendChild(li);
+            });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            var term = input.value.trim();
+            if (!term) {
+                results.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(function () {
+                var current = ++request;
+                fetch(select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(term))
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        // Answers can arrive out of order, only show the latest.
+                        if (current === request) {
+                            show(data.results);
+                        }
+                    });
+            }, 200);
+        });
+        input.addEventListener('blur', function () {
+            results.innerHTML = '';
+        });
+    });
+});
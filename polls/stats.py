@@ -0,0 +1,50 @@
+"""Catalogue counters shown on the home page.
+
+All counters come from a single query of scalar subqueries and are cached for
+``CATALOG_STATS_TTL`` seconds. Saving or deleting any counted model drops the
+cached copy (see ``polls.signals``).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Book, BookInstance, Author, Movie, Series, Game, Actor, Director
+
+CACHE_KEY = 'polls:catalog-stats'
+
+COUNTERS = (
+    ('num_books', Book, ''),
+    ('num_instances', BookInstance, ''),
+    ('num_instances_available', BookInstance, "WHERE status = 'a'"),
+    ('num_authors', Author, ''),
+    ('num_movies', Movie, ''),
+    ('num_series', Series, ''),
+    ('num_games', Game, ''),
+    ('num_actors', Actor, ''),
+    ('num_directors', Director, ''),
+)
+
+COUNTED_MODELS = {model for _, model, _ in COUNTERS}
+
+
+def _count_catalog():
+    quote = connection.ops.quote_name
+    columns = ', '.join(f'(SELECT COUNT(*) FROM {quote(model._meta.db_table)} {where})'
+                        for _, model, where in COUNTERS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {columns}')
+        row = cursor.fetchone()
+    return {name: count for (name, _, _), count in zip(COUNTERS, row)}
+
+
+def catalog_stats():
+    """Return a dict of catalogue counters, e.g. ``{'num_books': 10, ...}``."""
+    stats = cache.get(CACHE_KEY)
+    if stats is None:
+        stats = _count_catalog()
+        cache.set(CACHE_KEY, stats, settings.CATALOG_STATS_TTL)
+    return stats
+
+
+def invalidate_catalog_stats():
+    cache.delete(CACHE_KEY)
@@ -0,0 +1,137 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from polls.importer import CatalogImporter, read_records
+from polls.models import Movie, Actor, Director, Language, MovieSeriesGenre
+from polls.search import search
+
+
+def movie_records(count, offset=0):
+    return [{
+        'title': 'Movie {0:03}'.format(number),
+        'imdb_id': 'tt{0:07}'.format(number),
+        'date_of_release': '2000-01-01',
+        'running_time': '100',
+        'languages': 'English|French' if number % 2 else 'English',
+        'genres': 'Drama',
+        'directors': 'Director {0}'.format(number % 3),
+        'actors': 'Robert De Niro|Actor {0}'.format(number),
+    } for number in range(offset, offset + count)]
+
+
+class CatalogImporterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.de_niro = Actor.objects.create(full_name='Robert De Niro', specialisation='actor', Verified=True)
+
+    def test_titles_are_stored_with_their_links(self):
+        result = CatalogImporter('movie', verified=True).run(movie_records(4))
+        self.assertEqual((result.read, result.created, result.skipped, result.errors), (4, 4, 0, []))
+
+        movie = Movie.objects.get(imdb_id='tt0000001')
+        self.assertTrue(movie.Verified)
+        self.assertEqual(sorted(movie.language.values_list('name', flat=True)), ['English', 'French'])
+        self.assertEqual(list(movie.director.values_list('full_name', flat=True)), ['Director 1'])
+        self.assertEqual(sorted(movie.actors.values_list('full_name', flat=True)), ['Actor 1', 'Robert De Niro'])
+        self.assertEqual(Actor.objects.filter(full_name='Robert De Niro').count(), 1)
+        self.assertEqual(Language.objects.count(), 2)
+        self.assertEqual(MovieSeriesGenre.objects.count(), 1)
+        self.assertEqual(Director.objects.count(), 3)
+        self.assertTrue(Actor.objects.get(full_name='Actor 3').Verified)
+        self.assertEqual(search('Movie 002')[0].pk, Movie.objects.get(imdb_id='tt0000002').pk)
+
+    def test_queries_do_not_depend_on_the_number_of_records(self):
+        def queries(records):
+            # Dry runs, so both start from the same rows.
+            with CaptureQueriesContext(connection) as captured:
+                CatalogImporter('movie').run(records, dry_run=True)
+            return len(captured)
+
+        self.assertEqual(queries(movie_records(5)), queries(movie_records(50)))
+
+    def test_stored_and_repeated_records_are_skipped(self):
+        CatalogImporter('movie').run(movie_records(3))
+        records = movie_records(5) + movie_records(1, offset=4)
+        result = CatalogImporter('movie').run(records, start=0)
+        self.assertEqual((result.created, result.skipped), (2, 4))
+        self.assertEqual(Movie.objects.count(), 5)
+
+    def test_invalid_records_are_reported(self):
+        records = movie_records(3)
+        records[1]['date_of_release'] = 'yesterday'
+        records[2]['running_time'] = ''
+        result = CatalogImporter('movie').run(records)
+        self.assertEqual(result.created, 1)
+        self.assertEqual([number for number, _ in result.errors], [1, 2])
+        self.assertIn('date_of_release', result.errors[0][1])
+        self.assertIn('running_time', result.errors[1][1])
+
+        result = CatalogImporter('actor').run(['{"full_name": "Al Pacino"', '[]'])
+        self.assertEqual([message.split(':')[0] for _, message in result.errors],
+                         ['Invalid JSON', 'Expected a JSON object'])
+
+    def test_resume_and_dry_run(self):
+        importer = CatalogImporter('movie', batch_size=4)
+        result = importer.run(movie_records(10), start=6)
+        self.assertEqual((result.read, result.next_start), (4, 10))
+        self.assertFalse(Movie.objects.filter(imdb_id='tt0000005').exists())
+
+        result = CatalogImporter('movie', batch_size=4).run(movie_records(10), dry_run=True)
+        self.assertEqual(result.created, 6)
+        self.assertEqual(Movie.objects.count(), 4)
+
+    def test_failed_batch_keeps_earlier_batches(self):
+        records = movie_records(4)
+        importer = CatalogImporter('movie', batch_size=2)
+        store = importer.store
+
+        def failing_store(batch, first, result):
+            if first == 2:
+                raise RuntimeError('connection lost')
+            store(batch, first, result)
+
+        importer.store = failing_store
+        with self.assertRaises(RuntimeError):
+            importer.run(records)
+        self.assertEqual(importer.result.next_start, 2)
+        self.assertEqual(Movie.objects.count(), 2)
+
+
+class ImportCatalogCommandTest(TestCase):
+
+    def test_csv_and_gzipped_jsonl(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'movies.csv')
+            with open(path, 'w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=list(movie_records(1)[0]))
+                writer.writeheader()
+                writer.writerows(movie_records(3))
+            out = StringIO()
+            call_command('importcatalog', 'movie', path, stdout=out, stderr=StringIO())
+            self.assertIn('created:   3', out.getvalue())
+            self.assertIn('rows/sec', out.getvalue())
+
+            path = os.path.join(directory, 'actors.jsonl.gz')
+            with gzip.open(path, 'wt') as file:
+                for name in ('Al Pacino', 'Val Kilmer'):
+                    file.write(json.dumps({'full_name': name, 'specialisation': 'actor'}) + '\n')
+            call_command('importcatalog', 'actor', path, stdout=StringIO())
+            self.assertEqual(sorted(Actor.objects.values_list('full_name', flat=True)),
+                             ['Actor 0', 'Actor 1', 'Actor 2', 'Al Pacino', 'Robert De Niro', 'Val Kilmer'])
+
+    def test_unknown_format(self):
+        with self.assertRaises(CommandError):
+            call_command('importcatalog', 'movie', 'movies.xml', stdout=StringIO())
+        with self.assertRaises(ValueError):
+            read_records('movies.txt')
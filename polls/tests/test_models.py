@@ -1,6 +1,9 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-from polls.models import Author
+from polls.management.commands.benchlogin import run_login_benchmark
+
+from polls.models import Author, Profile
 
 
 class AuthorModelTest(TestCase):
@@ -50,3 +53,51 @@ class AuthorModelTest(TestCase):
         author = Author.objects.get(id=1)
         # This will also fail if the urlconf is not defined.
         self.assertEqual(author.get_absolute_url(), '/catalog/author/1')
+
+
+class ProfileModelTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def test_signup_inserts_the_profile_once(self):
+        with self.assertNumQueries(2):
+            User.objects.create_user(username='testuser2', password='1X<ISRUkw+tuK')
+        self.assertEqual(Profile.objects.filter(user__username='testuser2').count(), 1)
+
+    def test_only_changed_fields_are_written(self):
+        profile = Profile.objects.get(user=self.user)
+        with self.assertNumQueries(0):
+            profile.save()
+        self.assertEqual(profile.changed_fields(), [])
+
+        profile.signature = 'Bob'
+        self.assertEqual(profile.changed_fields(), ['signature'])
+        # Liked in the meantime, the stale count in memory must not be written back.
+        Profile.objects.filter(pk=profile.pk).update(likes_count=5)
+        with self.assertNumQueries(1):
+            profile.save()
+        profile.refresh_from_db()
+        self.assertEqual((profile.signature, profile.likes_count), ('Bob', 5))
+
+        deferred = Profile.objects.only('pk').get(pk=profile.pk)
+        deferred.gender = 'Male'
+        self.assertEqual(deferred.changed_fields(), ['gender'])
+
+    def test_user_saves_leave_the_profile_alone(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+        User.objects.bulk_create([User(username='bulk{0}'.format(number)) for number in range(3)])
+        self.assertFalse(Profile.objects.filter(user__username__startswith='bulk').exists())
+
+        # A profile changed through its user is still saved with it.
+        user.profile.signature = 'Bob'
+        user.save()
+        self.assertEqual(Profile.objects.get(user=user).signature, 'Bob')
+
+    def test_login_benchmark(self):
+        result = run_login_benchmark(users=3, repeat=1)
+        # The profile is no longer loaded and written on every login.
+        self.assertEqual(result['before'][1] - result['after'][1], 2)
@@ -0,0 +1,456 @@
+import datetime
+import os
+import tempfile
+import threading
+from time import monotonic
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Movie, Actor, Director, Language, MovieSeriesGenre, ScrapeJob
+from polls.scraper import ScrapeEngine, HostLimiter, ResponseCache, CacheMiss, claim_job, run_job
+from polls.scraper import ScraperClient, TokenBucket, LatencyHistogram
+from polls.scraper import parsers
+from polls.scraper.benchmark import run_benchmark
+from polls.scraper.replay import ReplayAdapter, read_page, corpus_urls
+from polls.scraper.resolver import EntityResolver
+from polls.search import search
+
+class FakeResponse:
+
+    def __init__(self, content=b'', status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ConnectionError(self.status_code)
+
+
+class ParsersTest(TestCase):
+
+    def no_fetch(self, url):
+        self.fail('Unexpected fetch of {0}'.format(url))
+
+    def test_title_prefers_embedded_json(self):
+        content = read_page('https://www.imdb.com/title/tt0468569/')
+        # Keep only the <head>, so every field has to come from the JSON payloads.
+        head = content[:content.index(b'</head>')]
+        title = parsers.title_scraping(head, self.no_fetch)
+
+        self.assertEqual(title['title'], 'The Dark Knight')
+        self.assertEqual(title['date_of_release'], '2008-07-18')
+        self.assertEqual(title['running_time'], '2h 32m')
+        self.assertEqual(title['languages'], ['English', 'Mandarin'])
+        self.assertEqual(title['directors'][0][:2], ('nm0634240', 'Christopher Nolan'))
+        # The whole cast comes from __NEXT_DATA__, JSON-LD only lists the top billed actors.
+        self.assertEqual([actor[0] for actor in title['actors']], ['nm0000288', 'nm0005132', 'nm0000151'])
+
+    def test_title_falls_back_to_markup(self):
+        title = parsers.title_scraping(read_page('https://www.imdb.com/title/tt0068646/'), read_page)
+
+        self.assertEqual(title['title'], 'The Godfather')
+        self.assertEqual(title['date_of_release'], '1972-03-24')
+        self.assertEqual(title['running_time'], '2h 55m')
+        self.assertEqual(title['genres'], ['Crime', 'Drama'])
+        self.assertEqual(title['directors'],
+                         [('nm0000338', 'Francis Ford Coppola', 'https://www.imdb.com/name/nm0000338/?ref_=tt_ov_dr')])
+        self.assertEqual(len(title['actors']), 2)
+
+    def test_person_from_json_ld_and_markup(self):
+        ledger = parsers.person_scraping(read_page('https://www.imdb.com/name/nm0005132/'))
+        brando = parsers.person_scraping(read_page('https://www.imdb.com/name/nm0000008/'))
+
+        self.assertEqual(ledger, {'specialisation': 'Actor', 'date_of_birth': '1979-04-04',
+                                  'date_of_death': '2008-01-22'})
+        self.assertEqual(brando, {'specialisation': 'Actor', 'date_of_birth': '1924-04-03',
+                                  'date_of_death': '2004-07-01'})
+
+    def test_chart(self):
+        urls = parsers.chart_scraping(read_page('https://www.imdb.com/chart/top'))
+        self.assertEqual([parsers.imdb_id(url) for url in urls], ['tt0111161', 'tt0068646', 'tt0468569'])
+
+    def test_running_time(self):
+        self.assertEqual(parsers.running_time('PT2H22M'), '2h 22m')
+        self.assertEqual(parsers.running_time('PT45M'), '45m')
+        self.assertIsNone(parsers.running_time('P1D'))
+
+
+@override_settings(SCRAPER_CACHE_DIR='')
+class ScrapeEngineTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ScrapeEngine, 'fetch', side_effect=read_page)
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_imports_whole_chart(self):
+        result = ScrapeEngine(max_workers=4).run()
+
+        self.assertEqual(len(result.created), 3)
+        self.assertEqual(len(result.times), 3)
+        self.assertEqual(result.failed, [])
+        movie = Movie.objects.get(title='The Godfather')
+        self.assertEqual(str(movie.date_of_release), '1972-03-24')
+        self.assertEqual(movie.running_time, '2h 55m')
+        self.assertEqual(sorted(movie.language.values_list('name', flat=True)), ['English', 'Italian', 'Latin'])
+        self.assertEqual(list(movie.director.values_list('full_name', flat=True)), ['Francis Ford Coppola'])
+        self.assertEqual(movie.actors.count(), 2)
+
+    def test_imported_rows_are_searchable(self):
+        # bulk_create sends no signals, the engine updates the search index itself.
+        ScrapeEngine().run()
+
+        self.assertEqual([hit.title for hit in search('godfather')], ['The Godfather'])
+        self.assertEqual([hit.kind for hit in search('morgan freeman')], ['actor'])
+
+    def test_people_are_fetched_once(self):
+        ScrapeEngine(max_workers=4).run()
+
+        # Morgan Freeman is credited on two titles.
+        self.assertEqual(Actor.objects.filter(full_name='Morgan Freeman').count(), 1)
+        self.assertEqual(Director.objects.count(), 3)
+        self.assertEqual(Language.objects.filter(name='English').count(), 1)
+        self.assertEqual(MovieSeriesGenre.objects.filter(name='Drama').count(), 1)
+        name_fetches = [call.args[0] for call in self.fetch.call_args_list if '/name/' in call.args[0]]
+        self.assertEqual(len(name_fetches), len(set(name_fetches)))
+
+    def test_known_titles_are_skipped(self):
+        ScrapeEngine().run()
+        self.fetch.reset_mock()
+        result = ScrapeEngine().run()
+
+        self.assertEqual(result.created, [])
+        self.assertEqual(result.skipped, ['tt0111161', 'tt0068646', 'tt0468569'])
+        self.assertEqual(Movie.objects.count(), 3)
+        # An up to date catalogue only costs the chart request.
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_stores_imdb_ids(self):
+        ScrapeEngine().run()
+
+        self.assertEqual(Movie.objects.get(imdb_id='tt0111161').title, 'The Shawshank Redemption')
+        self.assertEqual(Actor.objects.get(imdb_id='nm0000151').full_name, 'Morgan Freeman')
+        self.assertEqual(Director.objects.get(imdb_id='nm0634240').full_name, 'Christopher Nolan')
+
+    def test_rows_without_imdb_id_are_adopted(self):
+        Movie.objects.create(title='The Godfather', date_of_release='1972-03-24')
+        freeman = Actor.objects.create(full_name='Morgan Freeman', specialisation='Actor')
+        result = ScrapeEngine().run()
+
+        self.assertEqual(Movie.objects.filter(title='The Godfather').get().imdb_id, 'tt0068646')
+        self.assertIn('tt0068646', result.skipped)
+        freeman.refresh_from_db()
+        self.assertEqual(freeman.imdb_id, 'nm0000151')
+        self.assertEqual(Actor.objects.filter(full_name='Morgan Freeman').count(), 1)
+        self.assertFalse(any('nm0000151' in call.args[0] for call in self.fetch.call_args_list))
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        with CaptureQueriesContext(connection) as one:
+            ScrapeEngine(limit=1).run()
+        Movie.objects.all().delete()
+        Actor.objects.all().delete()
+        Director.objects.all().delete()
+        with CaptureQueriesContext(connection) as three:
+            ScrapeEngine(limit=3).run()
+        self.assertEqual(len(one), len(three))
+
+    def test_progress_is_reported_until_rows_are_stored(self):
+        calls = []
+
+        def progress(result):
+            calls.append((result.done, Movie.objects.count()))
+
+        ScrapeEngine(max_workers=4).run(progress=progress)
+        names = sum('/name/' in call.args[0] for call in self.fetch.call_args_list)
+        # After the last title, after every name page and once more before storing.
+        self.assertEqual(calls[-names - 2:], [(3, 0)] * (names + 2))
+        self.assertEqual(calls[-names - 3][0], 2)
+
+    def test_failed_title_does_not_stop_import(self):
+        def broken(url):
+            if 'tt0468569' in url:
+                raise ConnectionError('boom')
+            return read_page(url)
+
+        self.fetch.side_effect = broken
+        with self.assertLogs('polls.scraper', 'WARNING'):
+            result = ScrapeEngine().run()
+
+        self.assertEqual(len(result.created), 2)
+        self.assertEqual(len(result.failed), 1)
+
+
+class EntityResolverTest(TestCase):
+
+    def test_resolves_names_with_one_query_per_model(self):
+        Language.objects.create(name='English')
+        resolver = EntityResolver()
+        names = ['English'] + ['Language {0}'.format(number) for number in range(20)]
+
+        with self.assertNumQueries(2):
+            pks = resolver.resolve(Language, names + ['English'])
+        self.assertEqual(len(pks), 21)
+        self.assertEqual(Language.objects.count(), 21)
+        self.assertEqual(pks['English'], Language.objects.get(name='English').pk)
+
+        # Everything is cached for the rest of the job.
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve(Language, names), pks)
+
+    def test_link_inserts_through_rows_in_bulk(self):
+        movie = Movie.objects.create(title='Heat', date_of_release='1995-12-15')
+        genres = EntityResolver().resolve(MovieSeriesGenre, ['Crime', 'Drama', 'Thriller'])
+
+        with self.assertNumQueries(1):
+            EntityResolver.link(Movie.genre.field, [(movie.pk, pk) for pk in genres.values()])
+        self.assertEqual(movie.genre.count(), 3)
+
+
+class HostLimiterTest(TestCase):
+
+    def test_limits_requests_per_host(self):
+        limiter = HostLimiter(2)
+        active = []
+        peak = []
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def worker():
+            with limiter.slot('https://www.imdb.com/title/tt0111161/'):
+                with lock:
+                    active.append(1)
+                    peak.append(len(active))
+                release.wait(0.05)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 2)
+
+
+class ScraperClientTest(TestCase):
+
+    def test_token_bucket_throttles_after_burst(self):
+        bucket = TokenBucket(rate=50, capacity=5)
+        start = monotonic()
+        for _ in range(10):
+            bucket.acquire()
+        # 5 tokens are available at once, the other 5 arrive at 50 per second.
+        self.assertGreaterEqual(monotonic() - start, 0.09)
+
+    def test_histogram_buckets(self):
+        histogram = LatencyHistogram()
+        for seconds in (0.01, 0.2, 0.2, 30):
+            histogram.observe(seconds)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.counts[0], 1)
+        self.assertEqual(histogram.counts[LatencyHistogram.BUCKETS.index(0.25)], 2)
+        self.assertEqual(histogram.counts[-1], 1)
+
+    def test_error_responses_are_not_parsed_without_cache(self):
+        client = mock.Mock(get=mock.Mock(return_value=FakeResponse(b'<html>Service Unavailable</html>', 503)))
+        with self.assertRaises(ConnectionError):
+            ScrapeEngine(cache=False, client=client).fetch('https://www.imdb.com/title/tt0111161/')
+
+    def test_get_uses_pooled_session_with_timeout(self):
+        client = ScraperClient(rate=1000, timeout=(1, 2))
+        with mock.patch.object(client.session, 'get', return_value=FakeResponse(b'ok')) as get:
+            client.get('https://www.imdb.com/title/tt0111161/releaseinfo')
+            client.get('https://www.imdb.com/name/nm0000151/')
+
+        self.assertEqual(get.call_args.kwargs['timeout'], (1, 2))
+        self.assertEqual(client.latency['releaseinfo'].count, 1)
+        self.assertEqual(client.latency['name'].count, 1)
+        adapter = client.session.get_adapter('https://www.imdb.com/')
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+
+
+@override_settings(SCRAPER_CACHE_DIR='')
+class ScrapeJobTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ScrapeEngine, 'fetch', side_effect=read_page)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin = User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+
+    def test_claim_takes_oldest_queued_job_once(self):
+        first = ScrapeJob.objects.create()
+        ScrapeJob.objects.create()
+
+        job = claim_job('worker-1')
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual(job.status, 'r')
+        self.assertEqual(job.worker, 'worker-1')
+        self.assertNotEqual(claim_job('worker-2').pk, first.pk)
+        self.assertIsNone(claim_job('worker-3'))
+
+    def test_run_records_progress(self):
+        ScrapeJob.objects.create(limit=2)
+
+        job = run_job(claim_job('worker-1'))
+        self.assertEqual(job.status, 'd')
+        self.assertEqual(job.titles_total, 2)
+        self.assertEqual(job.titles_done, 2)
+        self.assertEqual(job.titles_created, 2)
+        self.assertEqual(Movie.objects.count(), 2)
+        self.assertIsNotNone(job.finished_at)
+
+        # The next job only has the remaining chart entry left to fetch.
+        ScrapeJob.objects.create()
+        job = run_job(claim_job('worker-1'))
+        self.assertEqual(job.titles_skipped, 2)
+        self.assertEqual(job.titles_created, 1)
+
+    def test_failed_run_is_marked_failed(self):
+        ScrapeJob.objects.create()
+        with mock.patch.object(ScrapeEngine, 'fetch', side_effect=ConnectionError('offline')):
+            with self.assertLogs('polls.scraper', 'ERROR'):
+                job = run_job(claim_job('worker-1'))
+        self.assertEqual(job.status, 'f')
+        self.assertIn('offline', job.error)
+
+    def test_job_of_a_dead_worker_is_claimed_again(self):
+        ScrapeJob.objects.create(limit=2)
+        job = claim_job('worker-1')
+        # worker-1 dies: the job stays running and the view keeps following it.
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        self.client.post(reverse('scrape-movies'))
+        self.assertEqual(ScrapeJob.objects.count(), 1)
+        self.assertIsNone(claim_job('worker-2'))
+
+        silent = timezone.now() - datetime.timedelta(seconds=settings.SCRAPE_JOB_TIMEOUT + 1)
+        ScrapeJob.objects.filter(pk=job.pk).update(heartbeat_at=silent)
+        reclaimed = claim_job('worker-2')
+        self.assertEqual((reclaimed.pk, reclaimed.worker), (job.pk, 'worker-2'))
+        self.assertEqual(run_job(reclaimed).status, 'd')
+        # A late result from the first worker is dropped.
+        with self.assertLogs('polls.scraper', 'WARNING'):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.titles_created), ('d', 'worker-2', 2))
+
+        self.client.post(reverse('scrape-movies'))
+        self.assertEqual(ScrapeJob.objects.filter(status='q').count(), 1)
+
+    def test_admin_cancels_running_job(self):
+        ScrapeJob.objects.create()
+        job = claim_job('worker-1')
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        self.client.post(reverse('admin:polls_scrapejob_changelist'),
+                         {'action': 'cancel', '_selected_action': [job.pk]})
+        with self.assertLogs('polls.scraper', 'WARNING'):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.titles_created), ('f', 'Cancelled by admin', 0))
+        self.assertIsNone(claim_job('worker-2'))
+
+    def test_view_enqueues_without_scraping(self):
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('scrape-movies'), {'limit': 5})
+
+        job = ScrapeJob.objects.get()
+        self.assertRedirects(response, job.get_absolute_url(), fetch_redirect_response=False)
+        self.assertEqual(job.status, 'q')
+        self.assertEqual(job.limit, 5)
+        self.assertEqual(Movie.objects.count(), 0)
+
+        # A second request follows the pending job instead of queueing another.
+        self.client.post(reverse('scrape-movies'))
+        self.assertEqual(ScrapeJob.objects.count(), 1)
+
+    def test_status_endpoint(self):
+        job = ScrapeJob.objects.create(titles_total=250, titles_done=10)
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('scrape-job-status', args=[job.pk]))
+
+        self.assertEqual(response.json()['titles_done'], 10)
+        self.assertFalse(response.json()['finished'])
+
+
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.get = mock.Mock(return_value=FakeResponse(b'<html>page</html>', headers={'ETag': '"v1"'}))
+
+    def test_fresh_entry_is_served_from_disk(self):
+        cache = ResponseCache(self.directory)
+        self.assertEqual(cache.fetch('https://www.imdb.com/name/nm0000151/?ref_=tt_cl_t_1', self.get),
+                         b'<html>page</html>')
+        self.assertEqual(cache.fetch('https://www.imdb.com/name/nm0000151/?ref_=tt_cl_t_3', self.get),
+                         b'<html>page</html>')
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_stale_entry_is_revalidated(self):
+        cache = ResponseCache(self.directory, ttl=0)
+        cache.fetch('https://www.imdb.com/chart/top', self.get)
+        self.get.return_value = FakeResponse(status_code=304)
+
+        self.assertEqual(cache.fetch('https://www.imdb.com/chart/top', self.get), b'<html>page</html>')
+        self.assertEqual(self.get.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(self.directory, max_size=40)
+        for stamp, url in enumerate(['https://www.imdb.com/a', 'https://www.imdb.com/b']):
+            cache.store(url, b'x' * 15)
+            os.utime(cache._paths(url)[0], (1000 + stamp, 1000 + stamp))
+        # Reading "a" makes "b" the least recently used entry.
+        cache.fetch('https://www.imdb.com/a', self.get)
+        cache.store('https://www.imdb.com/c', b'x' * 15)
+
+        self.assertIsNotNone(cache.get('https://www.imdb.com/a'))
+        self.assertIsNone(cache.get('https://www.imdb.com/b'))
+        self.assertIsNotNone(cache.get('https://www.imdb.com/c'))
+
+    def test_offline_mode_never_downloads(self):
+        cache = ResponseCache(self.directory, offline=True)
+        with self.assertRaises(CacheMiss):
+            cache.fetch('https://www.imdb.com/chart/top', self.get)
+        self.get.assert_not_called()
+
+    def test_engine_replays_recorded_pages_offline(self):
+        cache = ResponseCache(self.directory, offline=True)
+        for url in corpus_urls():
+            cache.store(url, read_page(url))
+
+        with mock.patch.object(ScraperClient, 'get') as get:
+            result = ScrapeEngine(cache=cache).run()
+        get.assert_not_called()
+        self.assertEqual(len(result.created), 3)
+
+
+class BenchmarkTest(TestCase):
+
+    def test_replay_adapter_serves_corpus(self):
+        client = ScraperClient(rate=1000)
+        client.session.mount('https://', ReplayAdapter())
+
+        response = client.get('https://www.imdb.com/name/nm0000151/?ref_=tt_cl_t_2')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Morgan Freeman', response.content)
+        self.assertEqual(client.get('https://www.imdb.com/name/nm9999999/').status_code, 404)
+
+    def test_benchmark_reports_and_rolls_back(self):
+        report = run_benchmark(workers=4)
+
+        self.assertEqual(report['titles'], 3)
+        self.assertEqual(report['failed'], 0)
+        self.assertEqual(report['requests'], len(corpus_urls()))
+        self.assertGreater(report['titles_per_second'], 0)
+        self.assertLess(report['queries_per_title'], 10)
+        self.assertEqual(Movie.objects.count(), 0)
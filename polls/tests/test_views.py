@@ -1,13 +1,38 @@
+import csv
 import datetime
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
 
 from django.contrib.auth.models import Permission  # Required to grant the permission needed to set a book as returned.
 from django.contrib.auth.models import User  # Required to assign User as a borrower
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+from polls import api, detail_cache, pagination
 from polls.models import Author
-from polls.models import BookInstance, Book, Genre, Language
+from polls.models import BookInstance, Book, Genre, Language, Profile
+from polls.models import Movie, Series, Actor, Director, Game, Developer, MovieSeriesGenre
+
+
+class QueryBudgetMixin:
+    """Assert that a page renders within a fixed number of queries."""
+
+    def assertQueryBudget(self, budget, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), budget, 'Too many queries for {0}:\n{1}'.format(
+            url, '\n'.join(query['sql'] for query in queries)))
+        return response
 
 
 class AuthorListViewTest(TestCase):
@@ -183,6 +208,7 @@ class LoanedBookInstancesByUserListViewTest(TestCase):
                 self.assertTrue(last_date <= copy.due_back)
 
 
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
 class RenewBookInstancesViewTest(TestCase):
 
     def setUp(self):
@@ -347,3 +373,889 @@ class AuthorCreateViewTest(TestCase):
         # Manually check redirect because we don't know what author was created
         self.assertEqual(response.status_code, 302)
         self.assertTrue(response.url.startswith('/catalog/author/'))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class IndexViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG', author=author)
+        BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='a')
+        BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='o')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_use_one_cached_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual(response.context['num_instances'], 2)
+        self.assertEqual(response.context['num_instances_available'], 1)
+        self.assertEqual(response.context['num_authors'], 1)
+        self.assertEqual(response.context['num_movies'], 0)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('index'))
+
+    def test_counters_are_invalidated_on_save_and_delete(self):
+        self.client.get(reverse('index'))
+        movie = Movie.objects.create(title='Heat', date_of_release='1995-12-15')
+        self.assertEqual(self.client.get(reverse('index')).context['num_movies'], 1)
+        movie.delete()
+        self.assertEqual(self.client.get(reverse('index')).context['num_movies'], 0)
+
+    def test_visits_are_counted_without_session(self):
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 1)
+        self.assertNotIn('sessionid', response.cookies)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class VerifiedListViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(15):
+            Movie.objects.create(title='Movie {0:02}'.format(number), date_of_release='2000-01-01',
+                                 Verified=number >= 3)
+        developer = Developer.objects.create(company_name='Studio')
+        for number in range(13):
+            Game.objects.create(title='Game {0:02}'.format(number), developer=developer, summary='summary',
+                                Verified=number % 2 == 0)
+        User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+
+    def test_pages_hold_only_verified_rows(self):
+        response = self.client.get(reverse('movies'))
+        self.assertEqual(len(response.context['movie_list']), 10)
+        self.assertTrue(all(movie.Verified for movie in response.context['movie_list']))
+        self.assertNotIn('pending_list', response.context)
+
+        response = self.client.get(reverse('movies') + '?page=2')
+        self.assertEqual(len(response.context['movie_list']), 2)
+
+    def test_superuser_gets_separate_pending_page(self):
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('movies'))
+        self.assertEqual([movie.title for movie in response.context['pending_list']],
+                         ['Movie 00', 'Movie 01', 'Movie 02'])
+        self.assertEqual(len(response.context['movie_list']), 10)
+
+    def test_turning_the_page_keeps_the_pending_page(self):
+        for number in range(10):
+            Movie.objects.create(title='Pending {0:02}'.format(number), date_of_release='2000-01-01')
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('movies'), {'pending_page': 2})
+        next_query = response.context['page_obj'].next_query
+        self.assertContains(response, '?{0}"'.format(next_query.replace('&', '&amp;')))
+        response = self.client.get(reverse('movies') + '?' + next_query)
+        self.assertEqual(len(response.context['movie_list']), 2)
+        self.assertEqual(response.context['pending_page_obj'].number, 2)
+
+    def test_game_list_is_paginated(self):
+        response = self.client.get(reverse('games'))
+        self.assertEqual(len(response.context['game_list']), 7)
+        self.assertTrue(all(game.Verified for game in response.context['game_list']))
+
+    def test_game_list_query_count_does_not_depend_on_rows(self):
+        # The page of games with their developer, which is also the page state for conditional requests.
+        # Keyset pages need no COUNT(*).
+        with self.assertNumQueries(1):
+            self.client.get(reverse('games'))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class KeysetPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Repeated names so the primary key has to break ties.
+        for number in range(23):
+            Author.objects.create(first_name='Christian', last_name='Surname {0}'.format(number % 7))
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                   author=Author.objects.first())
+        cls.borrower = User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+        for number in range(13):
+            due_back = timezone.localtime() + datetime.timedelta(days=number % 4) if number % 3 else None
+            BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', due_back=due_back,
+                                        borrower=cls.borrower, status='o')
+
+    def walk(self, url, name):
+        """Follow next cursors to the end, then previous cursors back to the start."""
+        pages = []
+        response = self.client.get(url)
+        while True:
+            pages.append(list(response.context[name]))
+            if not response.context['page_obj'].has_next():
+                break
+            response = self.client.get(url + '?cursor=' + response.context['page_obj'].next_cursor)
+        backwards = [list(response.context[name])]
+        while response.context['page_obj'].has_previous():
+            response = self.client.get(url + '?cursor=' + response.context['page_obj'].previous_cursor)
+            backwards.insert(0, list(response.context[name]))
+        self.assertEqual(backwards, pages)
+        return pages
+
+    def test_cursors_visit_every_author_once_in_order(self):
+        pages = self.walk(reverse('authors'), 'author_list')
+        self.assertEqual([len(page) for page in pages], [10, 10, 3])
+        self.assertEqual([author for page in pages for author in page],
+                         list(Author.objects.order_by('last_name', 'first_name', 'pk')))
+
+    def test_nullable_ordering_field(self):
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        pages = self.walk(reverse('my-borrowed'), 'bookinstance_list')
+        books = [bookinstance for page in pages for bookinstance in page]
+        self.assertEqual(len(set(books)), 13)
+        due = [bookinstance.due_back for bookinstance in books]
+        self.assertEqual(due[-5:], [None] * 5)
+        self.assertEqual(due[:-5], sorted(due[:-5]))
+
+    def test_page_number_still_works(self):
+        response = self.client.get(reverse('authors') + '?page=3')
+        self.assertEqual(len(response.context['author_list']), 3)
+        self.assertEqual(response.context['page_obj'].number, 3)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('authors') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_links_are_rendered(self):
+        response = self.client.get(reverse('authors'))
+        self.assertContains(response, '?cursor=' + response.context['page_obj'].next_cursor)
+        self.assertNotContains(response, 'Page 1 of')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DetailQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Detail pages take the same number of queries however many related rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(name='English')
+        cls.movie = Movie.objects.create(title='Movie', date_of_release='2000-01-01', Verified=True)
+        cls.series = Series.objects.create(title='Series', date_of_release='2000-01-01', number_of_seasons='2')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                       author=cls.author, language=cls.language)
+        cls.developer = Developer.objects.create(company_name='Studio')
+
+    def add_related(self, start, stop):
+        for number in range(start, stop):
+            actor = Actor.objects.create(full_name='Actor {0}'.format(number), specialisation='actor')
+            director = Director.objects.create(full_name='Director {0}'.format(number), amount_of_films='1')
+            for title in (self.movie, self.series):
+                title.actors.add(actor)
+                title.director.add(director)
+                title.language.add(self.language)
+            book = Book.objects.create(title='Book {0}'.format(number), summary='summary',
+                                       isbn='ISBN{0}'.format(number), author=self.author)
+            for _ in range(2):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+                BookInstance.objects.create(book=self.book, imprint='Imprint', status='o',
+                                            due_back=datetime.date.today())
+            Game.objects.create(title='Game {0}'.format(number), developer=self.developer, summary='summary',
+                                Verified=True)
+
+    def assertConstantQueries(self, budget, url):
+        self.add_related(0, 1)
+        self.assertQueryBudget(budget, url)
+        self.add_related(1, 11)
+        return self.assertQueryBudget(budget, url)
+
+    def test_movie_detail(self):
+        # The page state, the movie, then its directors, actors, genres and languages.
+        response = self.assertConstantQueries(6, self.movie.get_absolute_url())
+        self.assertContains(response, 'Actor 9')
+
+    def test_series_detail(self):
+        response = self.assertConstantQueries(6, self.series.get_absolute_url())
+        self.assertContains(response, 'Director 9')
+
+    def test_book_detail(self):
+        # The page state, the book with its author and language, then its genres and copies.
+        response = self.assertConstantQueries(4, self.book.get_absolute_url())
+        self.assertEqual(len(response.context['book'].bookinstance_set.all()), 22)
+
+    def test_author_detail(self):
+        # The page state, the author, then the books with their number of copies.
+        response = self.assertConstantQueries(3, self.author.get_absolute_url())
+        self.assertContains(response, 'Book 0</a> (2)')
+
+    def test_developer_detail(self):
+        Game.objects.create(title='Unverified game', developer=self.developer, summary='summary')
+        response = self.assertConstantQueries(3, reverse('developer-detail', args=[self.developer.pk]))
+        self.assertNotContains(response, 'Unverified game')
+
+
+class ExplainQueriesTest(TestCase):
+
+    def test_catalogue_queries_use_indexes(self):
+        User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+        Movie.objects.create(title='Movie', date_of_release='2000-01-01', Verified=True)
+        Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        out = StringIO()
+        # --fail raises CommandError if any query reads a whole table.
+        call_command('explainqueries', '--fail', stdout=out)
+        self.assertIn('movie-detail:', out.getvalue())
+        self.assertNotIn('skipped', out.getvalue())
+
+    @override_settings(ALLOWED_HOSTS=['young-falls-06895.herokuapp.com'])
+    def test_login_redirects_without_a_superuser(self):
+        out = StringIO()
+        call_command('explainqueries', stdout=out)
+        self.assertIn('my-borrowed: skipped', out.getvalue())
+        self.assertIn('all-borrowed: skipped', out.getvalue())
+        self.assertIn('books:', out.getvalue())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class SearchViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(title='The Godfather', date_of_release='1972-03-24',
+                                         summary='The aging patriarch of a crime dynasty.', Verified=True)
+        Movie.objects.create(title='Heat', date_of_release='1995-12-15',
+                             summary='A group of thieves, and a detective obsessed with godfather films.',
+                             Verified=True)
+        Actor.objects.create(full_name='Al Pacino', specialisation='actor', Verified=True)
+        Author.objects.create(first_name='Mario', last_name='Puzo')
+        for number in range(12):
+            Book.objects.create(title='Crime story {0}'.format(number), summary='summary', isbn=str(number))
+
+    def search(self, query, page=1):
+        response = self.client.get(reverse('search'), {'q': query, 'page': page})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_title_matches_rank_first(self):
+        response = self.search('godfather')
+        self.assertEqual([hit.title for hit in response.context['hits']], ['The Godfather', 'Heat'])
+        self.assertContains(response, self.movie.get_absolute_url())
+
+    def test_people_and_prefixes(self):
+        self.assertEqual([hit.kind for hit in self.search('pacin').context['hits']], ['actor'])
+        self.assertEqual([hit.title for hit in self.search('mario puzo').context['hits']], ['Mario Puzo'])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.movie.title = 'The Godfather Part II'
+        self.movie.save()
+        self.assertEqual(self.search('part').context['hits'][0].title, 'The Godfather Part II')
+        self.movie.delete()
+        self.assertEqual([hit.title for hit in self.search('godfather').context['hits']], ['Heat'])
+
+    def test_unverified_rows_are_not_found(self):
+        movie = Movie.objects.create(title='The Irishman', date_of_release='2019-11-01', summary='summary')
+        self.assertEqual(self.search('irishman').context['hits'], [])
+        movie.verified()
+        self.assertEqual([hit.title for hit in self.search('irishman').context['hits']], ['The Irishman'])
+        movie.unverified()
+        self.assertEqual(self.search('irishman').context['hits'], [])
+
+    def test_pages(self):
+        response = self.search('crime')
+        self.assertEqual(len(response.context['hits']), 10)
+        self.assertTrue(response.context['has_next'])
+        response = self.search('crime', page=2)
+        self.assertEqual(len(response.context['hits']), 3)
+        self.assertFalse(response.context['has_next'])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"godfather OR ( NEAR').context['hits'], [])
+        self.assertEqual(self.search('').context['hits'], [])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AutocompleteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(25):
+            Actor.objects.create(full_name='Al Actor {0:02}'.format(number), specialisation='actor', Verified=True)
+        Actor.objects.create(full_name='Robert De Niro', specialisation='actor', Verified=True)
+        Actor.objects.create(full_name='Robert Pending', specialisation='actor')
+        cls.movie = Movie.objects.create(title='Heat', date_of_release='1995-12-15')
+        cls.movie.actors.add(Actor.objects.get(full_name='Robert De Niro'))
+        User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def setUp(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def test_prefix_is_case_insensitive_and_bounded(self):
+        response = self.client.get(reverse('autocomplete', args=['actor']), {'q': 'al a'})
+        results = response.json()['results']
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results[0]['text'], 'Al Actor 00')
+
+        response = self.client.get(reverse('autocomplete', args=['actor']), {'q': 'robert'})
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Robert De Niro'])
+
+    def test_empty_term_and_unknown_kind(self):
+        response = self.client.get(reverse('autocomplete', args=['actor']), {'q': ' '})
+        self.assertEqual(response.json(), {'results': []})
+        response = self.client.get(reverse('autocomplete', args=['user']), {'q': 'a'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_unverified_objects_are_offered_to_superusers_only(self):
+        url = reverse('autocomplete', args=['actor'])
+        self.client.logout()
+        self.assertEqual(self.client.get(url, {'q': 'r'}).status_code, 302)
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        response = self.client.get(url, {'q': 'r'})
+        self.assertEqual([result['text'] for result in response.json()['results']],
+                         ['Robert De Niro', 'Robert Pending'])
+
+    def test_lookup_uses_an_index(self):
+        lookup = Actor.objects.filter(full_name__istartswith='al').order_by('full_name', 'pk')[:20]
+        self.assertIn('polls_actor_full_name_prefix_idx', lookup.explain())
+
+    def test_indexes_dropped_by_a_table_rebuild_come_back_on_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX polls_actor_full_name_prefix_idx')
+        call_command('migrate', verbosity=0)
+        lookup = Actor.objects.filter(full_name__istartswith='al').order_by('full_name', 'pk')[:20]
+        self.assertIn('polls_actor_full_name_prefix_idx', lookup.explain())
+
+    def test_form_renders_only_selected_options(self):
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('movie-update', args=[self.movie.pk]))
+        self.assertContains(response, 'Robert De Niro')
+        self.assertNotContains(response, 'Al Actor')
+        self.assertContains(response, reverse('autocomplete', args=['actor']))
+
+    def test_picked_options_are_saved(self):
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        actor = Actor.objects.get(full_name='Al Actor 07')
+        director = Director.objects.create(full_name='Michael Mann', amount_of_films='1')
+        language = Language.objects.create(name='English')
+        genre = MovieSeriesGenre.objects.create(name='Crime')
+        response = self.client.post(reverse('movie-update', args=[self.movie.pk]), {
+            'title': 'Heat', 'actors': [actor.pk], 'director': [director.pk], 'date_of_release': '1995-12-15',
+            'language': [language.pk], 'genre': [genre.pk], 'running_time': '170', 'summary': 'summary',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(self.movie.actors.all()), [actor])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DetailCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(title='Heat', date_of_release='1995-12-15', summary='summary')
+        cls.actor = Actor.objects.create(full_name='Robert De Niro', specialisation='actor')
+        cls.movie.actors.add(cls.actor)
+        User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_page_only_queries_page_state(self):
+        url = self.movie.get_absolute_url()
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # updated_at of the movie, for both the ETag and the fragment key.
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('SELECT "polls_movie"."updated_at" FROM'))
+        self.assertContains(response, 'Robert De Niro')
+        self.assertNotContains(response, 'DELETE MOVIE')
+
+    def test_superuser_controls_are_not_cached(self):
+        url = self.movie.get_absolute_url()
+        self.client.get(url)
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        self.assertContains(self.client.get(url), reverse('movie-delete', args=[self.movie.pk]))
+        self.client.logout()
+        self.assertNotContains(self.client.get(url), reverse('movie-delete', args=[self.movie.pk]))
+
+    def test_related_changes_are_shown(self):
+        url = self.movie.get_absolute_url()
+        self.client.get(url)
+        self.actor.full_name = 'Al Pacino'
+        self.actor.save()
+        self.assertContains(self.client.get(url), 'Al Pacino')
+
+        director = Director.objects.create(full_name='Michael Mann', amount_of_films='1')
+        director.movie_set.add(self.movie)
+        self.assertContains(self.client.get(url), 'Michael Mann')
+        self.movie.actors.clear()
+        self.assertNotContains(self.client.get(url), 'Al Pacino')
+
+    def test_moved_and_deleted_objects(self):
+        first = Developer.objects.create(company_name='First')
+        second = Developer.objects.create(company_name='Second')
+        game = Game.objects.create(title='Quake', developer=first, summary='summary', Verified=True)
+        self.assertContains(self.client.get(first.get_absolute_url()), 'Quake')
+        game.developer = second
+        game.save()
+        self.assertNotContains(self.client.get(first.get_absolute_url()), 'Quake')
+        self.assertContains(self.client.get(second.get_absolute_url()), 'Quake')
+
+        url = self.movie.get_absolute_url()
+        self.client.get(url)
+        self.movie.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_new_copy_updates_author_page(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='summary', isbn='ABCDEFG', author=author)
+        self.assertContains(self.client.get(author.get_absolute_url()), 'Book Title</a> (0)')
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        self.assertContains(self.client.get(author.get_absolute_url()), 'Book Title</a> (1)')
+
+    def test_shared_cache_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                  'LOCATION': directory}}
+            with override_settings(CACHES=shared):
+                url = self.movie.get_absolute_url()
+                self.client.get(url)
+                # Another process, with its own connection to the same cache, sees the fragment.
+                updated_at = Movie.objects.get(pk=self.movie.pk).updated_at
+                other = FileBasedCache(directory, {})
+                self.assertIn('Robert De Niro', other.get(detail_cache.fragment_key(Movie, self.movie.pk, updated_at)))
+
+    def test_writes_without_signals_are_shown_with_their_etag(self):
+        url = self.movie.get_absolute_url()
+        response = self.client.get(url)
+        # As by another worker, or a management command, whose cache this process can't see.
+        Movie.objects.filter(pk=self.movie.pk).update(title='Ronin', updated_at=timezone.now())
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(changed, 'Ronin')
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=changed['ETag']).status_code, 304)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.developer = Developer.objects.create(company_name='id Software')
+        cls.game = Game.objects.create(title='Quake', developer=cls.developer, summary='summary', Verified=True)
+        cls.movie = Movie.objects.create(title='Heat', date_of_release='1995-12-15', summary='summary')
+        cls.actor = Actor.objects.create(full_name='Robert De Niro', specialisation='actor')
+        cls.movie.actors.add(cls.actor)
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in (reverse('games'), self.game.get_absolute_url(), reverse('developers')):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # A list page only has an ETag, its rows are not all of the table.
+            self.assertEqual('Last-Modified' in response, url == self.game.get_absolute_url())
+            self.assertIn('no-cache', response['Cache-Control'])
+            # Only the page state is read, nothing is rendered.
+            with self.assertNumQueries(1):
+                self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+    def test_list_etag_comes_from_the_page(self):
+        url = reverse('games')
+        Game.objects.bulk_create([Game(title=f'Game {number:02}', developer=self.developer, summary='summary',
+                                       Verified=True) for number in range(12)])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # The page query is shared by the ETag and the response, the table is never aggregated.
+        self.assertFalse([query for query in queries if 'MAX(' in query['sql'].upper()])
+        self.assertEqual(len([query for query in queries if 'FROM "polls_game"' in query['sql']]), 1)
+
+        # Rows past the page do not change it, a row leaving it does.
+        self.game.summary = 'changed'
+        self.game.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        Game.objects.filter(title='Game 00').delete()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_changed_and_deleted_rows(self):
+        url = reverse('games')
+        response = self.client.get(url)
+        self.game.title = 'Doom'
+        self.game.save()
+        self.assertContains(self.revalidate(url, response), 'Doom')
+
+        response = self.client.get(url)
+        Game.objects.create(title='Hexen', summary='summary', Verified=True)
+        response = self.client.get(url)
+        Game.objects.get(title='Hexen').delete()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_verifying_changes_the_page(self):
+        url = self.movie.get_absolute_url()
+        response = self.client.get(url)
+        self.movie.verified()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_related_changes_change_the_page(self):
+        url = self.movie.get_absolute_url()
+        response = self.client.get(url)
+        self.actor.full_name = 'Al Pacino'
+        self.actor.save()
+        self.assertContains(self.revalidate(url, response), 'Al Pacino')
+
+        response = self.client.get(url)
+        self.movie.actors.clear()
+        self.assertNotContains(self.revalidate(url, response), 'Al Pacino')
+
+        # The game list shows the developer of each game.
+        url = reverse('games')
+        response = self.client.get(url)
+        self.developer.company_name = 'Raven Software'
+        self.developer.save()
+        self.assertContains(self.revalidate(url, response), 'Raven Software')
+
+    def test_pending_list_is_part_of_the_page(self):
+        User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        url = reverse('games')
+        response = self.client.get(url)
+        Game.objects.create(title='Hexen', summary='summary')
+        self.assertContains(self.revalidate(url, response), 'Hexen')
+
+    def test_etag_depends_on_user(self):
+        url = self.game.get_absolute_url()
+        response = self.client.get(url)
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.assertContains(self.revalidate(url, response), 'testuser1')
+
+    def test_missing_object(self):
+        self.assertEqual(self.client.get(reverse('game-detail', args=[0])).status_code, 404)
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.actors = [Actor.objects.create(full_name='Actor {0:02}'.format(number), specialisation='actor',
+                                           Verified=True) for number in range(5)]
+        for number in range(12):
+            movie = Movie.objects.create(title='Movie {0:02}'.format(number), date_of_release='2000-01-01',
+                                         running_time='100', Verified=True)
+            movie.actors.add(*cls.actors[:number % 5 + 1])
+        Movie.objects.create(title='Unverified', date_of_release='2000-01-01')
+
+    def test_pages_follow_the_cursor(self):
+        url = reverse('api-list', args=['movies'])
+        response = self.client.get(url, {'fields': 'title,date_of_release', 'page_size': 5})
+        titles = []
+        while True:
+            data = response.json()
+            self.assertEqual(set(data['results'][0]), {'id', 'title', 'date_of_release'})
+            titles.extend(row['title'] for row in data['results'])
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(titles, ['Movie {0:02}'.format(number) for number in range(12)])
+
+    def test_relations_are_embedded_in_constant_queries(self):
+        url = reverse('api-list', args=['movies'])
+        # The page, then one query per embedded relation.
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'fields': 'title,actors,genre'})
+        movie = response.json()['results'][2]
+        self.assertEqual(movie['actors'], [{'id': actor.pk, 'full_name': actor.full_name}
+                                           for actor in self.actors[:3]])
+        self.assertEqual(movie['genre'], [])
+
+    def test_detail(self):
+        movie = Movie.objects.get(title='Movie 01')
+        response = self.client.get(reverse('api-detail', args=['movies', movie.pk]), {'fields': 'title,actors'})
+        self.assertEqual(response.json(), {'id': movie.pk, 'title': 'Movie 01', 'actors': [
+            {'id': actor.pk, 'full_name': actor.full_name} for actor in self.actors[:2]]})
+        unverified = Movie.objects.get(title='Unverified')
+        self.assertEqual(self.client.get(reverse('api-detail', args=['movies', unverified.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api-detail', args=['movies', 'abc'])).status_code, 404)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(reverse('api-list', args=['users'])).status_code, 404)
+        response = self.client.get(reverse('api-list', args=['movies']), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api-list', args=['movies']), {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 404)
+        for resource, value in (('movies', 'abc'), ('movies', [1]), ('movies', None), ('bookinstances', 'abc')):
+            cursor = pagination.encode_cursor('next', [value])
+            response = self.client.get(reverse('api-list', args=[resource]), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, (resource, value))
+
+    def test_unverified_related_rows_are_not_embedded(self):
+        movie = Movie.objects.get(title='Movie 00')
+        movie.actors.add(Actor.objects.create(full_name='Unverified actor', specialisation='actor'))
+        response = self.client.get(reverse('api-detail', args=['movies', movie.pk]), {'fields': 'actors'})
+        self.assertEqual([actor['full_name'] for actor in response.json()['actors']], ['Actor 00'])
+
+    def test_export_streams_every_row(self):
+        response = self.client.get(reverse('api-export', args=['movies']), {'fields': 'title,actors'})
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(len(rows[4]['actors']), 5)
+
+    def test_export_reads_in_batches(self):
+        chunks = list(api.export(api.RESOURCES['actors'], ['id', 'full_name'], [], batch_size=2))
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual([row['full_name'] for row in json.loads(''.join(chunks))],
+                         [actor.full_name for actor in self.actors])
+
+
+class ExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(title='Heat', date_of_release='1995-12-15', running_time='170')
+        cls.actors = [Actor.objects.create(full_name=name, specialisation='actor')
+                      for name in ('Robert De Niro', 'Al Pacino')]
+        cls.movie.actors.add(*cls.actors)
+        User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def download(self, table, **params):
+        response = self.client.get(reverse('export', args=[table]), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_superuser_only(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('export', args=['movies'])).status_code, 302)
+
+    def test_csv_and_jsonl(self):
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        movies = list(csv.DictReader(StringIO(self.download('movies').decode())))
+        self.assertEqual(len(movies), 1)
+        self.assertEqual((movies[0]['title'], movies[0]['date_of_release']), ('Heat', '1995-12-15'))
+
+        links = [json.loads(line) for line in self.download('movies-actors', format='jsonl').splitlines()]
+        self.assertEqual(links, [{'movie_id': self.movie.pk, 'actor_id': actor.pk} for actor in self.actors])
+
+    def test_gzip(self):
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        actors = gzip.decompress(self.download('actors', gzip=1)).decode().splitlines()
+        self.assertEqual(len(actors), 3)
+        self.assertTrue(actors[0].startswith('id,full_name,'))
+
+    def test_unknown_table_or_format(self):
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('export', args=['users'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export', args=['movies']), {'format': 'xml'}).status_code, 404)
+
+    def test_command_writes_a_file_per_table(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('exportcatalog', 'actors', 'movies-actors', format='jsonl', gzip=True,
+                         directory=directory, chunk_size=1, stdout=StringIO())
+            self.assertEqual(sorted(os.listdir(directory)), ['actors.jsonl.gz', 'movies-actors.jsonl.gz'])
+            with gzip.open(os.path.join(directory, 'actors.jsonl.gz'), 'rt') as lines:
+                self.assertEqual([json.loads(line)['full_name'] for line in lines],
+                                 [actor.full_name for actor in self.actors])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ProfileLikesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username='user{0}'.format(number), password='1X<ISRUkw+tuK')
+                     for number in range(3)]
+        cls.profiles = [user.profile for user in cls.users]
+
+    def like(self, profile, action=None):
+        data = {'profile_id': profile.pk}
+        if action:
+            data['action'] = action
+        return self.client.post(reverse('like_profile', args=[profile.pk]), data)
+
+    def test_like_and_unlike_keep_the_count(self):
+        self.client.login(username='user0', password='1X<ISRUkw+tuK')
+        profile = self.profiles[1]
+        # Session and user, the profile, then the INSERT and the counter UPDATE in a savepoint.
+        with self.assertNumQueries(7):
+            self.like(profile, 'like')
+        self.like(profile, 'like')
+        profile.refresh_from_db()
+        self.assertEqual(profile.likes_count, 1)
+        self.assertEqual(profile.likes.count(), 1)
+
+        self.like(profile, 'unlike')
+        self.like(profile, 'unlike')
+        profile.refresh_from_db()
+        self.assertEqual((profile.likes_count, profile.likes.count()), (0, 0))
+
+        self.like(profile)
+        profile.refresh_from_db()
+        self.assertEqual(profile.likes_count, 1)
+        self.like(profile)
+        profile.refresh_from_db()
+        self.assertEqual(profile.likes_count, 0)
+
+    def test_anonymous_users_cannot_like(self):
+        response = self.like(self.profiles[1], 'like')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.profiles[1].likes.count(), 0)
+
+    def test_profile_page(self):
+        self.profiles[1].like(self.users[0])
+        self.profiles[1].like(self.users[2])
+        self.client.login(username='user0', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('profile-page', args=[self.profiles[1].pk]))
+        self.assertEqual(response.context['page_user'].likes_count, 2)
+        self.assertTrue(response.context['liked'])
+        self.assertContains(response, 'value="unlike"')
+
+    def test_relation_changes_and_deleted_users_are_counted(self):
+        profile = self.profiles[0]
+        profile.likes.add(self.users[1], self.users[2])
+        profile.refresh_from_db()
+        self.assertEqual(profile.likes_count, 2)
+        self.users[1].blog_posts.clear()
+        profile.refresh_from_db()
+        self.assertEqual(profile.likes_count, 1)
+        self.users[2].delete()
+        profile.refresh_from_db()
+        self.assertEqual(profile.likes_count, 0)
+
+    def test_drifted_count_does_not_go_negative(self):
+        profile = self.profiles[0]
+        profile.like(self.users[1])
+        profile.like(self.users[2])
+        Profile.objects.filter(pk=profile.pk).update(likes_count=0)
+        self.users[1].delete()
+        self.assertTrue(profile.unlike(self.users[2]))
+        profile.refresh_from_db()
+        self.assertEqual((profile.likes_count, profile.likes.count()), (0, 0))
+
+    def test_leaderboard(self):
+        for user in self.users:
+            self.profiles[2].like(user)
+        self.profiles[0].like(self.users[1])
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profile-leaderboard'))
+        self.assertEqual(list(response.context['profiles']), [self.profiles[2], self.profiles[0]])
+        self.assertContains(response, 'user2</a> (3)')
+        plan = Profile.objects.filter(likes_count__gt=0).order_by('-likes_count', 'id')[:20].explain()
+        self.assertIn('profile_likes_idx', plan)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class LoanDeskTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.borrower = User.objects.create_user(username='borrower', password='1X<ISRUkw+tuK')
+        cls.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG', author=author)
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+        cls.loans = [BookInstance.objects.create(book=cls.book, imprint='Imprint', due_back=due_back,
+                                                 borrower=cls.borrower, status='o') for _ in range(3)]
+        cls.available = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+
+    def setUp(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+
+    def post(self, copies, action, renewal_date=''):
+        return self.client.post(reverse('loan-desk'), {
+            'copies': '\n'.join(str(copy.pk) for copy in copies), 'action': action, 'renewal_date': renewal_date})
+
+    def test_librarians_only(self):
+        response = self.client.get(reverse('loan-desk'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].initial['renewal_date'],
+                         datetime.date.today() + datetime.timedelta(weeks=3))
+        self.client.login(username='borrower', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('loan-desk')).status_code, 403)
+
+    def test_return(self):
+        response = self.post(self.loans[:2], 'return')
+        self.assertEqual(response.context['changed'], 2)
+        returned = BookInstance.objects.get(pk=self.loans[0].pk)
+        self.assertEqual((returned.status, returned.borrower, returned.due_back), ('a', None, None))
+        self.assertEqual(BookInstance.objects.get(pk=self.loans[2].pk).status, 'o')
+
+    def test_renewal_only_changes_loans(self):
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        response = self.post(self.loans + [self.available], 'renew', renewal_date)
+        self.assertEqual(response.context['changed'], 3)
+        self.assertEqual(set(BookInstance.objects.filter(status='o').values_list('due_back', flat=True)),
+                         {renewal_date})
+        self.assertIsNone(BookInstance.objects.get(pk=self.available.pk).due_back)
+
+    def test_maintenance_touches_the_book_page(self):
+        before = Book.objects.get(pk=self.book.pk).updated_at
+        self.post([self.available], 'maintenance')
+        self.assertEqual(BookInstance.objects.get(pk=self.available.pk).status, 'm')
+        self.assertGreater(Book.objects.get(pk=self.book.pk).updated_at, before)
+
+    def test_invalid_batches_change_nothing(self):
+        response = self.post(self.loans, 'renew', datetime.date.today() - datetime.timedelta(days=1))
+        self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal in past')
+        response = self.post(self.loans, 'renew', datetime.date.today() + datetime.timedelta(weeks=5))
+        self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
+        response = self.post(self.loans, 'renew')
+        self.assertFormError(response, 'form', 'renewal_date', 'A renewal needs a date')
+        response = self.client.post(reverse('loan-desk'), {
+            'copies': f'{self.loans[0].pk}\nnot-an-id\n00000000-0000-0000-0000-000000000000', 'action': 'return'})
+        self.assertIn('Not a copy id: not-an-id', response.context['form'].errors['copies'][0])
+        self.assertEqual(BookInstance.objects.filter(status='o').count(), 3)
+
+    def test_queries_do_not_depend_on_the_batch_size(self):
+        def queries(copies):
+            with CaptureQueriesContext(connection) as captured:
+                self.post(copies, 'return')
+            return len(captured)
+
+        BookInstance.objects.bulk_create(
+            BookInstance(book=self.book, imprint='Imprint', borrower=self.borrower, status='o') for _ in range(50))
+        self.assertEqual(queries(self.loans[:1]), queries(list(BookInstance.objects.filter(status='o'))))
+
+    def test_admin_actions(self):
+        self.librarian.is_staff = True
+        self.librarian.save()
+        self.librarian.user_permissions.add(*Permission.objects.filter(codename__in=['view_bookinstance',
+                                                                                      'change_bookinstance']))
+        response = self.client.post(reverse('admin:polls_bookinstance_changelist'), {
+            'action': 'mark_returned', '_selected_action': [str(copy.pk) for copy in self.loans[:2]]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(BookInstance.objects.filter(status='a').count(), 3)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class LoanListQueryTest(QueryBudgetMixin, TestCase):
+    """The loan lists take the book and borrower of every row from the same query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD', is_staff=True)
+        cls.librarian.user_permissions.add(*Permission.objects.filter(
+            codename__in=['can_mark_returned', 'view_bookinstance', 'change_bookinstance']))
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        books = [Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'{number}', author=author)
+                 for number in range(10)]
+        borrowers = [User.objects.create_user(username=f'borrower{number}') for number in range(5)] + [cls.librarian]
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+        BookInstance.objects.bulk_create(
+            BookInstance(book=books[number % 10], imprint='Imprint', due_back=due_back, status='o',
+                         borrower=borrowers[number % 6]) for number in range(60))
+
+    def setUp(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+
+    def test_all_borrowed(self):
+        # Session, user, permissions (2) and the page.
+        response = self.assertQueryBudget(5, reverse('all-borrowed'))
+        self.assertContains(response, 'borrower1')
+
+    def test_my_borrowed(self):
+        response = self.assertQueryBudget(5, reverse('my-borrowed'))
+        self.assertEqual(len(response.context['bookinstance_list']), 10)
+
+    def test_admin_change_list(self):
+        # Two counts for the result and total sizes.
+        response = self.assertQueryBudget(7, reverse('admin:polls_bookinstance_changelist'))
+        self.assertContains(response, 'Book 3')
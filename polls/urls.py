@@ -5,12 +5,19 @@ from .views import SignUpView, UserEditView, PasswordsChangeView, ProfilePageVie
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
+    path('autocomplete/<slug:kind>/', views.autocomplete, name='autocomplete'),
+    path('api/<slug:resource>/', views.api_list, name='api-list'),
+    path('api/<slug:resource>/export/', views.api_export, name='api-export'),
+    path('api/<slug:resource>/<str:pk>/', views.api_detail, name='api-detail'),
+    path('export/<slug:table>/', views.export_table, name='export'),
     path('books/', views.BookListView.as_view(), name='books'),
     path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
     path('authors/', views.AuthorListView.as_view(), name='authors'),
     path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
     path(r'borrowed/', views.LoanedBooksAllListView.as_view(), name='all-borrowed'),
+    path('borrowed/desk/', views.loan_desk, name='loan-desk'),
 
     path("signup/", SignUpView.as_view(), name="signup"),
     path("edit_user/", UserEditView.as_view(), name="edit_user"),
@@ -18,6 +25,7 @@ urlpatterns = [
 
     path("profile/<int:pk>", ProfilePageView.as_view(), name="profile-page"),
     path("like/<int:pk>", LikeView, name="like_profile"),
+    path("profiles/top/", views.most_liked_profiles, name="profile-leaderboard"),
 
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
     path('author/create/', views.AuthorCreate.as_view(), name='author-create'),
@@ -58,6 +66,8 @@ urlpatterns = [
     # path('scrape/', views.scrape, name='scrape'),
     # path('scrape/', views.scrape_actors, name='scrape'),
     path('scrapemovies/', views.scrape_movies, name='scrape-movies'),
+    path('scrapemovies/<int:pk>', views.scrape_job, name='scrape-job'),
+    path('scrapemovies/<int:pk>/status', views.scrape_job_status, name='scrape-job-status'),
 
     path('series/', views.SeriesListView.as_view(), name='series'),
     path('series/<int:pk>', views.SeriesDetailView.as_view(), name='series-detail'),
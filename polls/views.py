@@ -1,98 +1,226 @@
 import datetime
-from time import time
 
-import requests
-from bs4 import BeautifulSoup
-from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.decorators import login_required, permission_required, user_passes_test
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.views import PasswordChangeView
-from django.http import HttpResponseRedirect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Count, Prefetch
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.urls import reverse_lazy
 from django.views import generic
+from django.views.decorators.http import require_POST
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
 from polls.forms import RenewBookForm, MovieForm, SeriesForm, ActorForm, DirectorForm, UserProfileEditForm
+from polls.forms import ScrapeJobForm, BookForm, LoanDeskForm
 from polls.models import Author
-from .forms import GameForm, EditUserForm, PasswordChangingForm
+from .forms import GameForm, GameUpdateForm, EditUserForm, PasswordChangingForm
 from .models import Book, BookInstance
 from .models import Game, Developer, Profile
-from .models import Movie, Series, Actor, Director, Language, MovieSeriesGenre
+from .models import Movie, Series, Actor, Director, ScrapeJob
+from . import api, export, loans
+from .autocomplete import AUTOCOMPLETE, lookup
+from .conditional import ConditionalGetMixin
+from .detail_cache import CachedDetailMixin
+from .pagination import KeysetPaginationMixin
+from .search import search as search_catalog
+from .stats import catalog_stats
 
 
 def index(request):
     """View function for home page of site."""
 
-    # Generate counts of some of the main objects
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
+    # Counts of the main objects, one cached query for all of them.
+    context = dict(catalog_stats())
 
-    # Available books (status = 'a')
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
+    # Number of visits to this view, kept in a signed cookie so a page view doesn't write the session.
+    num_visits = request.get_signed_cookie('num_visits', default=0, salt='index')
+    try:
+        num_visits = int(num_visits)
+    except ValueError:
+        num_visits = 0
+    context['num_visits'] = num_visits
 
-    # The 'all()' is implied by default.
-    num_authors = Author.objects.count()
+    # Render the HTML template index.html with the data in the context variable.
+    response = render(request, 'index.html', context=context)
+    response.set_signed_cookie('num_visits', num_visits + 1, salt='index', max_age=365 * 24 * 60 * 60)
+    return response
 
-    # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
 
+def search(request):
+    """Ranked full-text search over books, authors, movies, series, games and people."""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    page_size = 10
+    # One row more than shown tells whether there is a next page, without counting the matches.
+    hits = search_catalog(query, limit=page_size + 1, offset=(page - 1) * page_size)
     context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_authors': num_authors,
-        'num_visits': num_visits,
+        'query': query,
+        'hits': hits[:page_size],
+        'page': page,
+        'has_next': len(hits) > page_size,
     }
+    return render(request, 'polls/search.html', context)
 
-    # Render the HTML template index.html with the data in the context variable.
-    return render(request, 'index.html', context=context)
+
+@login_required
+def autocomplete(request, kind):
+    """JSON prefix search for the autocomplete widgets, ``?q=`` is matched case-insensitively.
+
+    Objects waiting to be verified are only offered to superusers.
+    """
+    if kind not in AUTOCOMPLETE:
+        raise Http404
+    term = request.GET.get('q', '').strip()
+    matches = lookup(kind, term, verified_only=not request.user.is_superuser) if term else []
+    results = [{'id': obj.pk, 'text': str(obj)} for obj in matches]
+    return JsonResponse({'results': results})
+
+
+def _api_resource(resource):
+    if resource not in api.RESOURCES:
+        raise Http404
+    return api.RESOURCES[resource]
+
+
+def api_list(request, resource):
+    """A page of a catalogue resource as JSON, ``?fields=``, ``?page_size=`` and ``?cursor=`` select it."""
+    resource = _api_resource(resource)
+    columns, relations = api.selected_fields(resource, request.GET.get('fields'))
+    try:
+        size = min(max(int(request.GET.get('page_size', api.API_PAGE_SIZE)), 1), api.API_MAX_PAGE_SIZE)
+    except ValueError:
+        size = api.API_PAGE_SIZE
+    rows, next_cursor = api.page(resource, columns, relations, request.GET.get('cursor'), size)
+    next_url = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        next_url = request.build_absolute_uri('?' + query.urlencode())
+    return JsonResponse({'results': rows, 'next': next_url})
+
+
+def api_detail(request, resource, pk):
+    resource = _api_resource(resource)
+    columns, relations = api.selected_fields(resource, request.GET.get('fields'))
+    try:
+        rows = list(api.queryset(resource).filter(pk=pk).values(*columns))
+    except (ValueError, ValidationError):
+        raise Http404
+    if not rows:
+        raise Http404
+    return JsonResponse(api.embed(resource, rows, relations)[0])
+
+
+def api_export(request, resource):
+    """Every public row of a resource as one JSON array, streamed in batches."""
+    resource = _api_resource(resource)
+    columns, relations = api.selected_fields(resource, request.GET.get('fields'))
+    return StreamingHttpResponse(api.export(resource, columns, relations), content_type='application/json')
+
+
+@user_passes_test(lambda user: user.is_superuser)
+def export_table(request, table):
+    """Download one catalogue table, ``?format=csv|jsonl`` and ``?gzip=1``, streamed in constant memory."""
+    if table not in export.TABLES:
+        raise Http404
+    format = request.GET.get('format', 'csv')
+    if format not in export.FORMATS:
+        raise Http404
+    compress = bool(request.GET.get('gzip'))
+    content_type = 'application/gzip' if compress else ('text/csv' if format == 'csv' else 'application/x-ndjson')
+    response = StreamingHttpResponse(export.stream(table, format, compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(table, format, compress)}"'
+    return response
+
+
+class VerifiedListMixin:
+    """List verified objects, and show superusers a separately paginated list of objects to verify.
+
+    Both lists are filtered and paginated by the database, so a page always holds
+    ``paginate_by`` rows of its kind. The pending page is picked with ``?pending_page=``.
+    """
+    select_related = ()
+
+    def get_queryset(self):
+        return self.model.objects.verified().select_related(*self.select_related)
+
+    def get_pending_queryset(self):
+        return self.model.objects.pending().select_related(*self.select_related)
+
+    def get_pending_page(self):
+        """The page of objects to verify, for superusers only."""
+        if not self.request.user.is_superuser:
+            return None
+        if not hasattr(self, '_pending_page'):
+            paginator = Paginator(self.get_pending_queryset(), self.paginate_by)
+            self._pending_page = paginator.get_page(self.request.GET.get('pending_page'))
+        return self._pending_page
+
+    def get_context_data(self, *args, **kwargs):
+        context = super().get_context_data(*args, **kwargs)
+        pending_page = self.get_pending_page()
+        if pending_page is not None:
+            context['pending_list'] = pending_page.object_list
+            context['pending_page_obj'] = pending_page
+        return context
 
 
-class BookListView(generic.ListView):
+class BookListView(ConditionalGetMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     paginate_by = 10
 
 
-class BookDetailView(generic.DetailView):
+class BookDetailView(ConditionalGetMixin, CachedDetailMixin, generic.DetailView):
     model = Book
+    fragment_template_name = 'polls/book_detail_content.html'
+    queryset = Book.objects.select_related('author', 'language').prefetch_related('genre', 'bookinstance_set')
 
 
 # @method_decorator(login_required, name='dispatch')
-class AuthorListView(generic.ListView):
+class AuthorListView(ConditionalGetMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based list view for a list of authors."""
     model = Author
     paginate_by = 10
 
 
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(ConditionalGetMixin, CachedDetailMixin, generic.DetailView):
     """Generic class-based detail view for an author."""
     model = Author
+    fragment_template_name = 'polls/author_detail_content.html'
+    queryset = Author.objects.prefetch_related(
+        Prefetch('book_set', queryset=Book.objects.annotate(copies=Count('bookinstance'))))
 
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class LoanedBooksByUserListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based view listing books on loan to current user."""
     model = BookInstance
     template_name = 'polls/bookinstance_list_borrowed_user.html'
     paginate_by = 10
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return (BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o')
+                .for_listing().order_by('due_back'))
 
 
-class LoanedBooksAllListView(PermissionRequiredMixin, generic.ListView):
+class LoanedBooksAllListView(PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based view listing all books on loan. Only visible to users with can_mark_returned permission."""
     model = BookInstance
-    permission_required = 'catalog.can_mark_returned'
+    permission_required = 'polls.can_mark_returned'
     template_name = 'polls/bookinstance_list_borrowed_all.html'
     paginate_by = 10
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(status__exact='o').for_listing().order_by('due_back')
 
 
 class SignUpView(generic.CreateView):
@@ -102,7 +230,7 @@ class SignUpView(generic.CreateView):
 
 
 @login_required
-@permission_required('catalog.can_mark_returned', raise_exception=True)
+@permission_required('polls.can_mark_returned', raise_exception=True)
 def renew_book_librarian(request, pk):
     """View function for renewing a specific BookInstance by librarian."""
     book_instance = get_object_or_404(BookInstance, pk=pk)
@@ -135,6 +263,24 @@ def renew_book_librarian(request, pk):
     return render(request, 'polls/book_renew_librarian.html', context)
 
 
+@login_required
+@permission_required('polls.can_mark_returned', raise_exception=True)
+def loan_desk(request):
+    """View function for renewing, returning or sending to maintenance many copies at once."""
+    changed = None
+    if request.method == 'POST':
+        form = LoanDeskForm(request.POST)
+        if form.is_valid():
+            data = form.cleaned_data
+            changed = loans.apply(BookInstance.objects.filter(pk__in=data['copies']),
+                                  data['action'], data['renewal_date'])
+            form = LoanDeskForm(initial={'action': data['action'], 'renewal_date': data['renewal_date']})
+    else:
+        form = LoanDeskForm(initial={'renewal_date': loans.default_renewal_date()})
+
+    return render(request, 'polls/loan_desk.html', {'form': form, 'changed': changed})
+
+
 class AuthorCreate(CreateView):
     model = Author
     fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
@@ -153,13 +299,13 @@ class AuthorDelete(DeleteView):
 
 class BookCreate(CreateView):
     model = Book
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    form_class = BookForm
     template_name = "polls/book_form.html"
 
 
 class BookUpdate(UpdateView):
     model = Book
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    form_class = BookForm
 
 
 class BookDelete(DeleteView):
@@ -174,16 +320,18 @@ class GameCreate(CreateView):
     template_name = "polls/Game/game_form.html"
 
 
-class GameDetailView(generic.DetailView):
+class GameDetailView(ConditionalGetMixin, CachedDetailMixin, generic.DetailView):
     """Generic class-based detail view for a game."""
     model = Game
+    queryset = Game.objects.select_related('developer').prefetch_related('genre', 'mode')
     template_name = 'polls/Game/game_detail.html'
+    fragment_template_name = 'polls/Game/game_detail_content.html'
 
 
 class GameUpdate(UserPassesTestMixin, UpdateView):
     model = Game
     template_name = "polls/Game/game_form.html"
-    fields = ['title', 'developer', 'date_of_release', 'genre', 'mode', 'summary', 'Verified']
+    form_class = GameUpdateForm
 
     def test_func(self):
         return self.request.user.is_superuser
@@ -208,17 +356,12 @@ class GameDelete(UserPassesTestMixin, DeleteView):
         return redirect('index')
 
 
-class GameListView(generic.ListView):
+class GameListView(ConditionalGetMixin, VerifiedListMixin, KeysetPaginationMixin, generic.ListView):
     model = Game
     paginate_by = 10
+    select_related = ['developer']
     template_name = "polls/Game/game_list.html"
 
-    def get_context_data(self, *args, **kwargs):
-        game_list = Game.objects.order_by('title')
-        context = super(GameListView, self).get_context_data(*args, **kwargs)
-        context["game_list"] = game_list
-        return context
-
 
 class GameVerify(UserPassesTestMixin, generic.DetailView):
     model = Game
@@ -247,10 +390,17 @@ class GameUnverify(UserPassesTestMixin, generic.DetailView):
         return redirect('index')
 
 
-class DeveloperDetailView(generic.DetailView):
+class DeveloperDetailView(ConditionalGetMixin, CachedDetailMixin, generic.DetailView):
     """Generic class-based detail view for a developer."""
     model = Developer
+    queryset = Developer.objects.prefetch_related(
+        Prefetch('game_set', queryset=Game.objects.verified(), to_attr='verified_games'))
     template_name = 'polls/Game/developer_detail.html'
+    fragment_template_name = 'polls/Game/developer_detail_content.html'
+
+    def needs_object(self):
+        # Every signed in user gets the edit links.
+        return self.request.user.is_authenticated
 
 
 class DeveloperDelete(UserPassesTestMixin, DeleteView):
@@ -283,7 +433,7 @@ class DeveloperUpdate(UserPassesTestMixin, UpdateView):
         return redirect('index')
 
 
-class DeveloperListView(generic.ListView):
+class DeveloperListView(ConditionalGetMixin, KeysetPaginationMixin, generic.ListView):
     model = Developer
     paginate_by = 10
     template_name = "polls/Game/developer_list.html"
@@ -318,7 +468,8 @@ class UserProfileEditView(UserPassesTestMixin, generic.UpdateView):
     template_name = "polls/Game/edit_profile.html"
 
     def get_object(self):
-        return self.request.user.profile
+        # Users created in bulk have no profile until they first edit it.
+        return Profile.objects.get_or_create(user=self.request.user)[0]
 
     def test_func(self):
         return self.request.user.is_authenticated
@@ -329,44 +480,57 @@ class UserProfileEditView(UserPassesTestMixin, generic.UpdateView):
 class ProfilePageView(generic.DetailView):
     model = Profile
     template_name = "polls/Profile/user_profile.html"
+    queryset = Profile.objects.select_related('user')
 
     def get_context_data(self, *args, **kwargs):
         #users = Profile.objects.all()
         context = super(ProfilePageView, self).get_context_data(*args, **kwargs)
 
-        page_user = get_object_or_404(Profile, id=self.kwargs['pk'])
+        page_user = self.object
 
         liked = False
-        if page_user.likes.filter(id=self.request.user.id).exists():
-            liked = True
+        if self.request.user.is_authenticated:
+            liked = page_user.likes.filter(id=self.request.user.id).exists()
 
         context["page_user"] = page_user
         context["liked"] = liked
         return context
 
+
+@login_required
+@require_POST
 def LikeView(request, pk):
-   profile = get_object_or_404(Profile, id=request.POST.get('profile_id'))
-   liked = False
-   if profile.likes.filter(id=request.user.id).exists():
-       profile.likes.remove(request.user)
-       liked = False
-   else:
-       profile.likes.add(request.user)
-       liked = True
+    profile = get_object_or_404(Profile.objects.only('pk'), id=request.POST.get('profile_id'))
+    # The form says which way to go, so a repeated request can't undo the first one.
+    action = request.POST.get('action')
+    if action == 'like':
+        profile.like(request.user)
+    elif action == 'unlike':
+        profile.unlike(request.user)
+    elif not profile.like(request.user):
+        # No action given: toggle, the like was already there.
+        profile.unlike(request.user)
+
+    return HttpResponseRedirect(reverse('profile-page', args=[str(pk)]))
 
-   return HttpResponseRedirect(reverse('profile-page', args=[str(pk)]))
 
+def most_liked_profiles(request):
+    """Profiles with the most likes, read in order from an index on ``likes_count``."""
+    profiles = Profile.objects.filter(likes_count__gt=0).select_related('user').order_by('-likes_count', 'id')[:20]
+    return render(request, "polls/Profile/leaderboard.html", {'profiles': profiles})
 
 
-class MovieListView(generic.ListView):
+class MovieListView(ConditionalGetMixin, VerifiedListMixin, KeysetPaginationMixin, generic.ListView):
     template_name = "polls/movie/movie_list.html"
     model = Movie
     paginate_by = 10
 
 
-class MovieDetailView(generic.DetailView):
+class MovieDetailView(ConditionalGetMixin, CachedDetailMixin, generic.DetailView):
     template_name = "polls/movie/movie_detail.html"
+    fragment_template_name = "polls/movie/movie_detail_content.html"
     model = Movie
+    queryset = Movie.objects.prefetch_related('director', 'actors', 'genre', 'language')
 
 
 class MovieDelete(UserPassesTestMixin, DeleteView):
@@ -436,15 +600,17 @@ class MovieUnverify(UserPassesTestMixin, generic.DetailView):
         return redirect('index')
 
 
-class SeriesListView(generic.ListView):
+class SeriesListView(ConditionalGetMixin, VerifiedListMixin, KeysetPaginationMixin, generic.ListView):
     template_name = "polls/movie/series_list.html"
     model = Series
     paginate_by = 10
 
 
-class SeriesDetailView(generic.DetailView):
+class SeriesDetailView(ConditionalGetMixin, CachedDetailMixin, generic.DetailView):
     template_name = "polls/movie/series_detail.html"
+    fragment_template_name = "polls/movie/series_detail_content.html"
     model = Series
+    queryset = Series.objects.prefetch_related('director', 'actors', 'genre', 'language')
 
 
 class SeriesDelete(UserPassesTestMixin, DeleteView):
@@ -514,14 +680,15 @@ class SeriesUnverify(UserPassesTestMixin, generic.DetailView):
         return redirect('index')
 
 
-class ActorListView(generic.ListView):
+class ActorListView(ConditionalGetMixin, VerifiedListMixin, KeysetPaginationMixin, generic.ListView):
     template_name = "polls/movie/actor_list.html"
     model = Actor
     paginate_by = 10
 
 
-class ActorDetailView(generic.DetailView):
+class ActorDetailView(ConditionalGetMixin, CachedDetailMixin, generic.DetailView):
     template_name = "polls/movie/actor_detail.html"
+    fragment_template_name = "polls/movie/actor_detail_content.html"
     model = Actor
 
 
@@ -593,14 +760,15 @@ class ActorUnverify(UserPassesTestMixin, generic.DetailView):
         return redirect('index')
 
 
-class DirectorListView(generic.ListView):
+class DirectorListView(ConditionalGetMixin, VerifiedListMixin, KeysetPaginationMixin, generic.ListView):
     template_name = "polls/movie/director_list.html"
     model = Director
     paginate_by = 10
 
 
-class DirectorDetailView(generic.DetailView):
+class DirectorDetailView(ConditionalGetMixin, CachedDetailMixin, generic.DetailView):
     template_name = "polls/movie/director_detail.html"
+    fragment_template_name = "polls/movie/director_detail_content.html"
     model = Director
 
 
@@ -671,230 +839,54 @@ class DirectorUnverify(UserPassesTestMixin, generic.DetailView):
         return redirect('index')
 
 
-def get_date_actor_director(date_of_birth, date_of_death):
-    birth = [1, 1, 1]
-    if date_of_birth:
-        if date_of_birth.time:
-            date_of_birth = date_of_birth.time['datetime']
-            birth = date_of_birth.split("-")
-        else:
-            date_of_birth = None
-    if not date_of_birth or birth[0] == '0' or birth[1] == '0' or birth[2] == '0':
-        date_of_birth = None
-
-    death = [1, 1, 1]
-    if date_of_death:
-        if date_of_death.time:
-            date_of_death = date_of_death.time['datetime']
-            death = date_of_death.split("-")
-        else:
-            date_of_birth = None
-    if not date_of_death or birth[0] == '0' or death[1] == '0' or death[2] == '0':
-        date_of_death = None
-    return date_of_birth, date_of_death
-
-
-def actors_scraping(movie):
-    pk_list = []
-    actors = movie.find_all('div', attrs={'data-testid': 'title-cast-item'})
-
-    for actor_div in actors:
-        name = actor_div.find('a', attrs={'data-testid': 'title-cast-item__actor'}).text
-        # name = name.split()
-        # first_name = name[0]
-        # last_name = name[1]
-        actor = Actor.objects.filter(full_name=name).first()
-        if actor:
-            director_pk = actor.pk
-            pk_list.append(director_pk)
-        else:
-            link = actor_div.find('a', attrs={'data-testid': 'title-cast-item__actor'})
-            url = "https://www.imdb.com" + link['href']
-            response = requests.get(url)
-            soup = BeautifulSoup(response.content, "html.parser")
-            actor = soup.find('div', attrs={'id': 'name-overview-widget'})
-
-            # specialisation = actor.a.span.text.replace('\n', '')
-            specialisation = actor.find_all('span', attrs={'class': 'itemprop'})[1].text.replace('\n', '')
-            date_of_birth = soup.find('div', attrs={'id': 'name-born-info'})
-            date_of_death = soup.find('div', attrs={'id': 'name-death-info'})
-            date_of_birth, date_of_death = get_date_actor_director(date_of_birth, date_of_death)
-
-            actor_instance = Actor.objects.create(
-                full_name=name,
-                specialisation=specialisation,
-                date_of_birth=date_of_birth,
-                date_of_death=date_of_death,
-                Verified=True
-            )
-            pk_list.append(actor_instance.pk)
-    return pk_list
-
-
-def language_scraping(movie):
-    languages_pk = []
-    languages = []
-    # language = movie.find_all('section')[11]
-    # try:
-    # language = language.find('div', attrs={'class': 'sc-f65f65be-0 ktSkVi'})
-    # language = language.find('ul', attrs={'class': 'ipc-metadata-list ipc-metadata-list--dividers-all ipc-metadata-list--base'})
-    language = movie.find('li', attrs={'data-testid': 'title-details-languages'})
-    languages = language.div.ul.find_all('li')
-    # except AttributeError:
-    #  pass
-    for li in languages:
-        language = Language.objects.filter(name=li.a.text).first()
-        if language:
-            language_pk = language.pk
-            languages_pk.append(language_pk)
-        else:
-            language_instance = Language.objects.create(name=li.a.text)
-            languages_pk.append(language_instance.pk)
-    return languages_pk
-
-
-def date_scraping(movie, months):
-    # language_release_date = movie.find_all('section')[11]
-    # language_release_date = language_release_date.find_all('li')
-    date = movie.find('li', attrs={'data-testid': 'title-details-releasedate'})
-    link = date.div.ul.li.a
-    release_date = link.text.split(" (", 1)[0].split(" ")
-    if len(release_date) == 3:
-        release_date = " ".join(release_date)
-        release_date = release_date.replace(",", "")
-        release_date = release_date.split()
-        release_date = release_date[2] + "-" + months[release_date[0]] + "-" + release_date[1]
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def scrape_movies(request):
+    """Queue an IMDb import for the scrapeworker command and show recent imports."""
+    if request.method == 'POST':
+        form = ScrapeJobForm(request.POST)
+        if form.is_valid():
+            # Only one import at a time, a second request just follows the running one.
+            job = ScrapeJob.objects.filter(status__in=('q', 'r')).first()
+            if job is None:
+                job = form.save(commit=False)
+                job.requested_by = request.user
+                job.save()
+            return HttpResponseRedirect(job.get_absolute_url())
     else:
-        link = link['href']
-        url = "https://www.imdb.com" + link
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, "html.parser")
-        release_dates = soup.find_all('tr', attrs={'class': 'ipl-zebra-list__item release-date-item'})
-        for date in release_dates:
-            date = date.find('td', attrs={'class': 'release-date-item__date'}).text
-            date = date.replace("  ", "")
-            date = date.split(" ")
-            if len(date) == 3:
-                release_date = date
-                break
-        release_date = release_date[2] + "-" + months[release_date[1]] + "-" + release_date[0]
-        # if len(release_date[0]) == 1:
-            # release_date[0] = '0' + release_date[0]
-
-    return release_date
-
-
-def directors_scraping(movie):
-    pk_list = []
-    directors = movie.find('div', attrs={'class': 'sc-fa02f843-0 fjLeDR'}).ul.li.div.ul
-    try:
-        directors = directors.find_all('li')
-    except AttributeError:
-        directors = directors.li
-    for li in directors:
-        name = li.a.text
-        # name = name.split()
-        # first_name = name[0]
-        # last_name = name[1]
-        director = Director.objects.filter(full_name=name).first()
-        if director:
-            director_pk = director.pk
-            pk_list.append(director_pk)
-        else:
-            link = li.a['href']
-            url = "https://www.imdb.com" + link
-            response = requests.get(url)
-            soup = BeautifulSoup(response.content, "html.parser")
-            director = soup.find('div', attrs={'id': 'name-overview-widget'})
-            # name = director.h1.span.text
-            # name = name.split()
-            # first_name = name[0]
-            # last_name = name[1]
-            date_of_birth = director.find('div', attrs={'id': 'name-born-info'})
-            date_of_death = director.find('div', attrs={'id': 'name-death-info'})
-            # to jest do zmiany
-            amount_of_films = 10
-            date_of_birth, date_of_death = get_date_actor_director(date_of_birth, date_of_death)
-
-            director_instance = Director.objects.create(
-                full_name=name,
-                date_of_birth=date_of_birth,
-                date_of_death=date_of_death,
-                Verified=True,
-                amount_of_films=amount_of_films
-            )
-            pk_list.append(director_instance.pk)
-    return pk_list
-
-
-def movie_genres_scraping(movie):
-    pk_list = []
-    # genres = movie.find('div', attrs={'class': 'sc-388740f9-0 hJjREK'})
-    # genres = genres.ul
-    # genres = movie.find('ul', attrs={'class': 'ipc-metadata-list ipc-metadata-list--dividers-all sc-388740f9-1 IjgYL ipc-metadata-list--base'})
-    genres = movie.find('div', attrs={'data-testid': 'genres'})
-    genres = genres.find_all('li')
-    for name in genres:
-        name = name.text
-        genre = MovieSeriesGenre.objects.filter(name=name).first()
-        if genre:
-            pk_list.append(genre.pk)
-        else:
-            genre_instance = MovieSeriesGenre.objects.create(name=name)
-            pk_list.append(genre_instance.pk)
-    return pk_list
+        form = ScrapeJobForm()
+
+    context = {
+        'form': form,
+        'jobs': ScrapeJob.objects.all()[:10],
+    }
+    return render(request, "polls/movie/scrape_movies.html", context)
+
+
+def scrape_job_progress(job):
+    return {
+        'status': job.get_status_display(),
+        'finished': job.is_finished,
+        'titles_total': job.titles_total,
+        'titles_done': job.titles_done,
+        'titles_failed': job.titles_failed,
+        'titles_skipped': job.titles_skipped,
+        'titles_created': job.titles_created,
+        'elapsed': round(job.elapsed, 1),
+        'error': job.error,
+    }
 
 
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
-def scrape_movies(request):
-    times = []
-    counter = 0
-    months = {"January": "01", "February": "02", "March": "03", "April": "04", "May": "05", "June": "06", "July": "07",
-              "August": "08", "September": "09", "October": "10", "November": "11", "December": "12"}
-    url = "https://www.imdb.com/chart/top"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, "lxml")
-    table = soup.find('table', {'class': 'chart full-width'})
-    movies_data = table.tbody.find_all('tr')
-    movies = []
-    for tr in movies_data:
-        start = time()
-        link = tr.td.a
-        url = "https://www.imdb.com" + link['href']
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, "lxml")
-        movie = soup.find('div', attrs={
-            'class': 'ipc-page-content-container ipc-page-content-container--full sc-b1984961-0 kXDasd'})
-        # movie = soup.find('div', attrs={'class': 'ipc-page-grid ipc-page-grid--bias-left'})
-        title = movie.find('div', attrs={'class': 'sc-94726ce4-2 khmuXj'}).h1.text
-        test = Movie.objects.filter(title=title).first()
-        if test:
-            continue
-        counter += 1
-        languages_pk = language_scraping(movie.find('div', attrs={'class': 'ipc-page-grid ipc-page-grid--bias-left'}))
-        release_date = date_scraping(movie.find('div', attrs={'class': 'ipc-page-grid ipc-page-grid--bias-left'}),
-                                     months)
-        genres_pk = movie_genres_scraping(movie)
-        running_time = movie.find('div', attrs={'class': 'sc-94726ce4-3 eSKKHi'}).ul.find_all('li')
-        running_time = running_time[2].text
-        summary = movie.find('span', attrs={'class': 'sc-16ede01-1 kgphFu'}).text
-        directors_pk = directors_scraping(movie)
-        actors_pk = actors_scraping(movie.find('div', attrs={'class': 'ipc-page-grid ipc-page-grid--bias-left'}))
-
-        movie_object = Movie.objects.create(
-            title=title,
-            date_of_release=release_date,
-            running_time=running_time,
-            summary=summary,
-            Verified=True
-        )
-        movie_object.director.set(directors_pk)
-        movie_object.language.set(languages_pk)
-        movie_object.genre.set(genres_pk)
-        movie_object.actors.set(actors_pk)
-        end = time()
-        times.append(end - start)
-        if counter == 1:
-            break
-    return render(request, "polls/movie/scrape_movies.html", {'movies': movies, 'times': times})
+def scrape_job(request, pk):
+    """Status page of a single import, polls ``scrape_job_status`` until the job finishes."""
+    job = get_object_or_404(ScrapeJob, pk=pk)
+    return render(request, "polls/movie/scrape_job.html", {'job': job, 'progress': scrape_job_progress(job)})
+
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def scrape_job_status(request, pk):
+    job = get_object_or_404(ScrapeJob, pk=pk)
+    return JsonResponse(scrape_job_progress(job))